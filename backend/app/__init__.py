@@ -4,6 +4,7 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_mail import Mail
+from sqlalchemy import event
 from config import Config
 
 # Initialize extensions
@@ -12,6 +13,16 @@ migrate = Migrate()
 jwt = JWTManager()
 mail = Mail()
 
+def _sqlite_pragmas(journal_mode):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute(f'PRAGMA journal_mode={journal_mode}')
+        if journal_mode.upper() == 'WAL':
+            # NORMAL keeps a WAL database consistent with far fewer fsyncs than FULL
+            cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+    return set_pragmas
+
 def create_app(config_class=Config):
     app = Flask(__name__)
     app.config.from_object(config_class)
@@ -23,6 +34,20 @@ def create_app(config_class=Config):
     mail.init_app(app)
     CORS(app)
     
+    # WAL lets readers carry on while bulk writes (e.g. product imports) commit
+    journal_mode = app.config.get('SQLITE_JOURNAL_MODE')
+    if journal_mode and app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        with app.app_context():
+            event.listen(db.engine, 'connect', _sqlite_pragmas(journal_mode))
+    
+    # Cache for the public catalog endpoints, invalidated on commit
+    from app.utils.cache import init_response_cache
+    init_response_cache(app)
+    
+    # Lesson progress heartbeats, written to the database in batches
+    from app.services.progress_buffer import init_progress_buffer
+    init_progress_buffer(app)
+    
     # Import models to ensure they are registered with SQLAlchemy
     from app.models import user, marketplace, education, entertainment, admin
     
@@ -33,6 +58,7 @@ def create_app(config_class=Config):
     from app.routes.entertainment import entertainment_bp
     from app.routes.admin import admin_bp
     from app.routes.user import user_bp
+    from app.routes.webhooks import webhooks_bp
     
     app.register_blueprint(auth_bp, url_prefix='/api/auth')
     app.register_blueprint(marketplace_bp, url_prefix='/api/marketplace')
@@ -40,5 +66,6 @@ def create_app(config_class=Config):
     app.register_blueprint(entertainment_bp, url_prefix='/api/entertainment')
     app.register_blueprint(admin_bp, url_prefix='/api/admin')
     app.register_blueprint(user_bp, url_prefix='/api/user')
+    app.register_blueprint(webhooks_bp, url_prefix='/api/webhooks')
     
     return app
\ No newline at end of file
@@ -1,13 +1,19 @@
 from .user import User
-from .marketplace import Product, Cart, CartItem, Order, OrderItem, Wishlist
-from .education import Course, Enrollment, Quiz, Question, Answer, QuizAttempt
+from .marketplace import (
+    Product, Cart, CartItem, StockReservation, Order, OrderItem, PaymentEvent,
+    SellerDailySales, ProductCopurchase, ProductNeighbor, Wishlist
+)
+from .education import (
+    Course, Enrollment, CourseReview, Quiz, Question, Answer, QuizAttempt, QuizStats, QuestionStats
+)
 from .entertainment import Music, Video, Game, Playlist
 from .admin import AdminLog
 
 __all__ = [
     'User',
-    'Product', 'Cart', 'CartItem', 'Order', 'OrderItem', 'Wishlist',
-    'Course', 'Enrollment', 'Quiz', 'Question', 'Answer', 'QuizAttempt',
+    'Product', 'Cart', 'CartItem', 'StockReservation', 'Order', 'OrderItem', 'PaymentEvent',
+    'SellerDailySales', 'ProductCopurchase', 'ProductNeighbor', 'Wishlist',
+    'Course', 'Enrollment', 'CourseReview', 'Quiz', 'Question', 'Answer', 'QuizAttempt', 'QuizStats', 'QuestionStats',
     'Music', 'Video', 'Game', 'Playlist',
     'AdminLog'
 ]
\ No newline at end of file
@@ -24,6 +24,11 @@ class AdminLog(db.Model):
     # Relationships
     admin = db.relationship('User', backref='admin_actions')
     
+    # Composite index backing keyset pagination of the audit log
+    __table_args__ = (
+        db.Index('ix_admin_logs_created_at_id', 'created_at', 'id'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -1,6 +1,15 @@
 from datetime import datetime
 from decimal import Decimal
+from sqlalchemy import case, event, inspect, update
+from sqlalchemy.orm import Session
 from app import db
+from app.utils.fields import serialize, nested
+
+# Bayesian prior for ranking courses by rating: a course's score starts at
+# RATING_PRIOR_MEAN and moves towards its own average as ratings come in,
+# so a single 5-star review does not outrank hundreds of 4.8s
+RATING_PRIOR_MEAN = 3.0
+RATING_PRIOR_WEIGHT = 10
 
 class Course(db.Model):
     __tablename__ = 'courses'
@@ -31,6 +40,15 @@ class Course(db.Model):
     # Instructor
     instructor_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     
+    # Kept in step with the enrollments table (flask reconcile-counters repairs drift)
+    enrollment_count = db.Column(db.Integer, default=0, nullable=False)
+    
+    # Rating aggregates, kept in step with course_reviews like the counters above
+    rating_total = db.Column(db.Integer, default=0, nullable=False)
+    rating_count = db.Column(db.Integer, default=0, nullable=False)
+    average_rating = db.Column(db.Float, default=0.0, nullable=False)
+    rating_score = db.Column(db.Float, default=RATING_PRIOR_MEAN, nullable=False)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -39,39 +57,47 @@ class Course(db.Model):
     # Relationships
     enrollments = db.relationship('Enrollment', backref='course', lazy='dynamic')
     quizzes = db.relationship('Quiz', backref='course', lazy='dynamic')
+    reviews = db.relationship('CourseReview', backref='course', lazy='dynamic')
+    
+    # Keyset pagination of the course catalog; updated_at versions list ETags
+    __table_args__ = (
+        db.Index('ix_courses_published_created_at_id', 'is_published', 'created_at', 'id'),
+        db.Index('ix_courses_published_rating_score_id', 'is_published', 'rating_score', 'id'),
+        db.Index('ix_courses_updated_at', 'updated_at'),
+    )
     
     def get_enrollment_count(self):
-        return self.enrollments.count()
+        return self.enrollment_count or 0
     
     def get_average_rating(self):
-        # TODO: Implement rating system
-        return 0.0
-    
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'short_description': self.short_description,
-            'price': float(self.price),
-            'category': self.category,
-            'level': self.level,
-            'duration_hours': self.duration_hours,
-            'thumbnail': self.thumbnail,
-            'video_url': self.video_url,
-            'video_duration': self.video_duration,
-            'curriculum': self.curriculum or [],
-            'requirements': self.requirements or [],
-            'learning_outcomes': self.learning_outcomes or [],
-            'is_published': self.is_published,
-            'is_featured': self.is_featured,
-            'instructor_id': self.instructor_id,
-            'instructor': self.instructor.get_full_name() if self.instructor else None,
-            'enrollment_count': self.get_enrollment_count(),
-            'average_rating': self.get_average_rating(),
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'published_at': self.published_at.isoformat() if self.published_at else None
-        }
+        return round(self.average_rating or 0.0, 2)
+    
+    def to_dict(self, fields=None):
+        return serialize(fields, {
+            'id': lambda: self.id,
+            'title': lambda: self.title,
+            'description': lambda: self.description,
+            'short_description': lambda: self.short_description,
+            'price': lambda: float(self.price),
+            'category': lambda: self.category,
+            'level': lambda: self.level,
+            'duration_hours': lambda: self.duration_hours,
+            'thumbnail': lambda: self.thumbnail,
+            'video_url': lambda: self.video_url,
+            'video_duration': lambda: self.video_duration,
+            'curriculum': lambda: self.curriculum or [],
+            'requirements': lambda: self.requirements or [],
+            'learning_outcomes': lambda: self.learning_outcomes or [],
+            'is_published': lambda: self.is_published,
+            'is_featured': lambda: self.is_featured,
+            'instructor_id': lambda: self.instructor_id,
+            'instructor': lambda: self.instructor.get_full_name() if self.instructor else None,
+            'enrollment_count': lambda: self.get_enrollment_count(),
+            'average_rating': lambda: self.get_average_rating(),
+            'rating_count': lambda: self.rating_count or 0,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'published_at': lambda: self.published_at.isoformat() if self.published_at else None
+        })
 
 class Enrollment(db.Model):
     __tablename__ = 'enrollments'
@@ -93,21 +119,55 @@ class Enrollment(db.Model):
     # Ensure unique student-course combination
     __table_args__ = (db.UniqueConstraint('student_id', 'course_id', name='unique_student_course'),)
     
+    # Columns behind computed to_dict fields, for sparse fieldset projections
+    _field_columns = {'is_completed': ('progress',)}
+    
     def is_completed(self):
         return self.progress >= 100.0
     
+    def to_dict(self, fields=None):
+        return serialize(fields, {
+            'id': lambda: self.id,
+            'student_id': lambda: self.student_id,
+            'course_id': lambda: self.course_id,
+            'course': nested(lambda f: self.course.to_dict(f) if self.course else None),
+            'enrolled_at': lambda: self.enrolled_at.isoformat() if self.enrolled_at else None,
+            'progress': lambda: self.progress,
+            'completed_at': lambda: self.completed_at.isoformat() if self.completed_at else None,
+            'certificate_issued': lambda: self.certificate_issued,
+            'amount_paid': lambda: float(self.amount_paid) if self.amount_paid else None,
+            'is_completed': lambda: self.is_completed()
+        })
+
+class CourseReview(db.Model):
+    __tablename__ = 'course_reviews'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    course_id = db.Column(db.Integer, db.ForeignKey('courses.id'), nullable=False)
+    student_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    rating = db.Column(db.Integer, nullable=False)  # 1 to 5
+    comment = db.Column(db.Text)
+    
+    # Timestamps
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    # One review per student and course; newest-first listing per course
+    __table_args__ = (
+        db.UniqueConstraint('course_id', 'student_id', name='unique_course_review'),
+        db.Index('ix_course_reviews_course_created_at_id', 'course_id', 'created_at', 'id'),
+        db.Index('ix_course_reviews_updated_at', 'updated_at'),
+    )
+    
     def to_dict(self):
         return {
             'id': self.id,
-            'student_id': self.student_id,
             'course_id': self.course_id,
-            'course': self.course.to_dict() if self.course else None,
-            'enrolled_at': self.enrolled_at.isoformat() if self.enrolled_at else None,
-            'progress': self.progress,
-            'completed_at': self.completed_at.isoformat() if self.completed_at else None,
-            'certificate_issued': self.certificate_issued,
-            'amount_paid': float(self.amount_paid) if self.amount_paid else None,
-            'is_completed': self.is_completed()
+            'student_id': self.student_id,
+            'rating': self.rating,
+            'comment': self.comment,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
 
 class Quiz(db.Model):
@@ -124,6 +184,9 @@ class Quiz(db.Model):
     passing_score = db.Column(db.Float, default=70.0)
     is_published = db.Column(db.Boolean, default=False)
     
+    # Kept in step with the questions table (flask reconcile-counters repairs drift)
+    question_count = db.Column(db.Integer, default=0, nullable=False)
+    
     # Timestamps
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -133,7 +196,7 @@ class Quiz(db.Model):
     attempts = db.relationship('QuizAttempt', backref='quiz', lazy='dynamic')
     
     def get_question_count(self):
-        return self.questions.count()
+        return self.question_count or 0
     
     def to_dict(self):
         return {
@@ -226,24 +289,18 @@ class QuizAttempt(db.Model):
     # Answers given (stored as JSON)
     answers = db.Column(db.JSON)
     
-    def calculate_score(self):
-        """Calculate score based on answers"""
+    # Attempts of one quiz in id order, for re-grading in chunks
+    __table_args__ = (db.Index('ix_quiz_attempts_quiz_id_id', 'quiz_id', 'id'),)
+    
+    def calculate_score(self, answer_key=None):
+        """Calculate score based on answers, against the quiz's cached answer key unless one is given"""
+        from app.services.quiz_grading import get_answer_key, grade_answers
         if not self.answers:
             return 0, 0, 0.0
         
-        total_score = 0
-        max_possible = 0
-        
-        for question_id, answer_data in self.answers.items():
-            question = Question.query.get(int(question_id))
-            if question:
-                max_possible += question.points
-                correct_answer = question.get_correct_answer()
-                if correct_answer and answer_data.get('answer_id') == correct_answer.id:
-                    total_score += question.points
-        
-        percentage = (total_score / max_possible * 100) if max_possible > 0 else 0
-        return total_score, max_possible, percentage
+        if answer_key is None:
+            answer_key = get_answer_key(self.quiz or Quiz.query.get(self.quiz_id))
+        return grade_answers(answer_key, self.answers)
     
     def to_dict(self):
         return {
@@ -258,4 +315,135 @@ class QuizAttempt(db.Model):
             'started_at': self.started_at.isoformat() if self.started_at else None,
             'completed_at': self.completed_at.isoformat() if self.completed_at else None,
             'time_taken': self.time_taken
-        }
\ No newline at end of file
+        }
+
+class QuizStats(db.Model):
+    """Item analysis of a quiz's attempts, maintained by flask refresh-quiz-stats"""
+    __tablename__ = 'quiz_stats'
+    
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), primary_key=True)
+    attempt_count = db.Column(db.Integer, default=0, nullable=False)
+    mean_percentage = db.Column(db.Float)
+    
+    # Attempts up to this id are included; Quiz.updated_at when computed
+    last_attempt_id = db.Column(db.Integer, default=0, nullable=False)
+    quiz_version = db.Column(db.DateTime)
+    
+    # Running sum behind mean_percentage
+    percentage_sum = db.Column(db.Float, default=0.0, nullable=False)
+    
+    computed_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'quiz_id': self.quiz_id,
+            'attempt_count': self.attempt_count,
+            'mean_percentage': self.mean_percentage,
+            'computed_at': self.computed_at.isoformat() if self.computed_at else None
+        }
+
+class QuestionStats(db.Model):
+    """Difficulty, discrimination and answer frequencies of one question"""
+    __tablename__ = 'question_stats'
+    
+    question_id = db.Column(db.Integer, db.ForeignKey('questions.id'), primary_key=True)
+    quiz_id = db.Column(db.Integer, db.ForeignKey('quizzes.id'), nullable=False, index=True)
+    
+    responses = db.Column(db.Integer, default=0, nullable=False)
+    correct = db.Column(db.Integer, default=0, nullable=False)
+    difficulty = db.Column(db.Float)  # share of responses that were correct (p-value)
+    discrimination = db.Column(db.Float)  # point-biserial correlation with the attempt percentage
+    answer_counts = db.Column(db.JSON)  # {answer_id: times chosen}
+    
+    # Running sums over responses (x: correct, y: attempt percentage) behind discrimination
+    sum_y = db.Column(db.Float, default=0.0, nullable=False)
+    sum_y2 = db.Column(db.Float, default=0.0, nullable=False)
+    sum_xy = db.Column(db.Float, default=0.0, nullable=False)
+    
+    def to_dict(self):
+        return {
+            'question_id': self.question_id,
+            'responses': self.responses,
+            'correct': self.correct,
+            'difficulty': self.difficulty,
+            'discrimination': self.discrimination,
+            'answer_counts': self.answer_counts or {}
+        }
+
+@event.listens_for(Session, 'before_flush')
+def _touch_edited_quizzes(session, flush_context, instances):
+    """Bump Quiz.updated_at when its questions or answers change, so answer keys cached on it are refreshed"""
+    quizzes = set()
+    for obj in list(session.new) + list(session.dirty) + list(session.deleted):
+        if isinstance(obj, Answer):
+            obj = obj.question
+        if isinstance(obj, Question) and obj.quiz is not None:
+            quizzes.add(obj.quiz)
+    
+    now = datetime.utcnow()
+    for quiz in quizzes:
+        quiz.updated_at = now
+
+def _adjust_counter(connection, table, counter, row_id, delta, **values):
+    connection.execute(
+        update(table).where(table.c.id == row_id).values({counter: table.c[counter] + delta, **values})
+    )
+
+# Counters change in the same transaction as the rows they count. Enrollments
+# leave Course.updated_at alone: it versions the course's content, and
+# course ETags include the count separately.
+@event.listens_for(Enrollment, 'after_insert')
+def _count_new_enrollment(mapper, connection, target):
+    courses = Course.__table__
+    _adjust_counter(connection, courses, 'enrollment_count', target.course_id, 1, updated_at=courses.c.updated_at)
+
+@event.listens_for(Enrollment, 'after_delete')
+def _count_removed_enrollment(mapper, connection, target):
+    courses = Course.__table__
+    _adjust_counter(connection, courses, 'enrollment_count', target.course_id, -1, updated_at=courses.c.updated_at)
+
+@event.listens_for(Question, 'after_insert')
+def _count_new_question(mapper, connection, target):
+    _adjust_counter(connection, Quiz.__table__, 'question_count', target.quiz_id, 1)
+
+@event.listens_for(Question, 'after_delete')
+def _count_removed_question(mapper, connection, target):
+    _adjust_counter(connection, Quiz.__table__, 'question_count', target.quiz_id, -1)
+
+def rating_aggregates(total, count):
+    """(average_rating, rating_score) column expressions for a course with ``total`` over ``count`` ratings"""
+    average = case((count > 0, total * 1.0 / count), else_=0.0)
+    score = (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + total) * 1.0 / (RATING_PRIOR_WEIGHT + count)
+    return average, score
+
+def _adjust_rating(connection, course_id, total_delta, count_delta):
+    courses = Course.__table__
+    total = courses.c.rating_total + total_delta
+    count = courses.c.rating_count + count_delta
+    average, score = rating_aggregates(total, count)
+    # Derived columns first: MySQL evaluates SET left to right on the new values
+    connection.execute(
+        update(courses).where(courses.c.id == course_id).ordered_values(
+            (courses.c.average_rating, average),
+            (courses.c.rating_score, score),
+            (courses.c.rating_total, total),
+            (courses.c.rating_count, count),
+            (courses.c.updated_at, courses.c.updated_at)
+        )
+    )
+
+# Ratings are folded into the course row as they are given, edited or
+# removed, so listings and the rating sort never aggregate course_reviews
+@event.listens_for(CourseReview, 'after_insert')
+def _add_rating(mapper, connection, target):
+    _adjust_rating(connection, target.course_id, target.rating, 1)
+
+@event.listens_for(CourseReview, 'after_update')
+def _change_rating(mapper, connection, target):
+    history = inspect(target).attrs.rating.history
+    if history.deleted and history.deleted[0] is not None:
+        _adjust_rating(connection, target.course_id, target.rating - history.deleted[0], 0)
+
+@event.listens_for(CourseReview, 'after_delete')
+def _remove_rating(mapper, connection, target):
+    _adjust_rating(connection, target.course_id, -target.rating, -1)
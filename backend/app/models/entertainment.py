@@ -1,5 +1,6 @@
 from datetime import datetime
 from app import db
+from app.utils.fields import serialize
 
 class Music(db.Model):
     __tablename__ = 'music'
@@ -29,24 +30,30 @@ class Music(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'artist': self.artist,
-            'album': self.album,
-            'genre': self.genre,
-            'duration': self.duration,
-            'audio_url': self.audio_url,
-            'cover_image': self.cover_image,
-            'year': self.year,
-            'language': self.language,
-            'lyrics': self.lyrics,
-            'is_active': self.is_active,
-            'is_featured': self.is_featured,
-            'play_count': self.play_count,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    # Keyset pagination of the catalog; updated_at versions list ETags
+    __table_args__ = (
+        db.Index('ix_music_active_created_at_id', 'is_active', 'created_at', 'id'),
+        db.Index('ix_music_updated_at', 'updated_at'),
+    )
+    
+    def to_dict(self, fields=None):
+        return serialize(fields, {
+            'id': lambda: self.id,
+            'title': lambda: self.title,
+            'artist': lambda: self.artist,
+            'album': lambda: self.album,
+            'genre': lambda: self.genre,
+            'duration': lambda: self.duration,
+            'audio_url': lambda: self.audio_url,
+            'cover_image': lambda: self.cover_image,
+            'year': lambda: self.year,
+            'language': lambda: self.language,
+            'lyrics': lambda: self.lyrics,
+            'is_active': lambda: self.is_active,
+            'is_featured': lambda: self.is_featured,
+            'play_count': lambda: self.play_count,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None
+        })
 
 class Video(db.Model):
     __tablename__ = 'videos'
@@ -80,26 +87,32 @@ class Video(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'category': self.category,
-            'duration': self.duration,
-            'video_url': self.video_url,
-            'thumbnail': self.thumbnail,
-            'quality': self.quality,
-            'file_size': self.file_size,
-            'director': self.director,
-            'cast': self.cast or [],
-            'year': self.year,
-            'language': self.language,
-            'is_active': self.is_active,
-            'is_featured': self.is_featured,
-            'view_count': self.view_count,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    # Keyset pagination of the catalog; updated_at versions list ETags
+    __table_args__ = (
+        db.Index('ix_videos_active_created_at_id', 'is_active', 'created_at', 'id'),
+        db.Index('ix_videos_updated_at', 'updated_at'),
+    )
+    
+    def to_dict(self, fields=None):
+        return serialize(fields, {
+            'id': lambda: self.id,
+            'title': lambda: self.title,
+            'description': lambda: self.description,
+            'category': lambda: self.category,
+            'duration': lambda: self.duration,
+            'video_url': lambda: self.video_url,
+            'thumbnail': lambda: self.thumbnail,
+            'quality': lambda: self.quality,
+            'file_size': lambda: self.file_size,
+            'director': lambda: self.director,
+            'cast': lambda: self.cast or [],
+            'year': lambda: self.year,
+            'language': lambda: self.language,
+            'is_active': lambda: self.is_active,
+            'is_featured': lambda: self.is_featured,
+            'view_count': lambda: self.view_count,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None
+        })
 
 class Game(db.Model):
     __tablename__ = 'games'
@@ -133,26 +146,32 @@ class Game(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'title': self.title,
-            'description': self.description,
-            'category': self.category,
-            'game_url': self.game_url,
-            'thumbnail': self.thumbnail,
-            'screenshots': self.screenshots or [],
-            'developer': self.developer,
-            'version': self.version,
-            'platform': self.platform,
-            'min_players': self.min_players,
-            'max_players': self.max_players,
-            'age_rating': self.age_rating,
-            'is_active': self.is_active,
-            'is_featured': self.is_featured,
-            'play_count': self.play_count,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    # Keyset pagination of the catalog; updated_at versions list ETags
+    __table_args__ = (
+        db.Index('ix_games_active_created_at_id', 'is_active', 'created_at', 'id'),
+        db.Index('ix_games_updated_at', 'updated_at'),
+    )
+    
+    def to_dict(self, fields=None):
+        return serialize(fields, {
+            'id': lambda: self.id,
+            'title': lambda: self.title,
+            'description': lambda: self.description,
+            'category': lambda: self.category,
+            'game_url': lambda: self.game_url,
+            'thumbnail': lambda: self.thumbnail,
+            'screenshots': lambda: self.screenshots or [],
+            'developer': lambda: self.developer,
+            'version': lambda: self.version,
+            'platform': lambda: self.platform,
+            'min_players': lambda: self.min_players,
+            'max_players': lambda: self.max_players,
+            'age_rating': lambda: self.age_rating,
+            'is_active': lambda: self.is_active,
+            'is_featured': lambda: self.is_featured,
+            'play_count': lambda: self.play_count,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None
+        })
 
 class Playlist(db.Model):
     __tablename__ = 'playlists'
@@ -1,6 +1,8 @@
 from datetime import datetime
 from decimal import Decimal
+from sqlalchemy import event, func, inspect, select, update, DDL
 from app import db
+from app.utils.fields import serialize, nested
 
 class Product(db.Model):
     __tablename__ = 'products'
@@ -9,7 +11,7 @@ class Product(db.Model):
     name = db.Column(db.String(200), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Numeric(10, 2), nullable=False)
-    quantity = db.Column(db.Integer, default=0)
+    quantity = db.Column(db.Integer, default=0)  # Available units; cart holds are already taken out
     category = db.Column(db.String(100))
     image_url = db.Column(db.String(255))
     images = db.Column(db.JSON)  # Store multiple images
@@ -35,54 +37,134 @@ class Product(db.Model):
     order_items = db.relationship('OrderItem', backref='product', lazy='dynamic')
     wishlists = db.relationship('Wishlist', backref='product', lazy='dynamic')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'name': self.name,
-            'description': self.description,
-            'price': float(self.price),
-            'quantity': self.quantity,
-            'category': self.category,
-            'image_url': self.image_url,
-            'images': self.images or [],
-            'is_active': self.is_active,
-            'is_featured': self.is_featured,
-            'slug': self.slug,
-            'tags': self.tags or [],
-            'seller_id': self.seller_id,
-            'seller': self.seller.username if self.seller else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    # Composite indexes backing keyset pagination of the storefront sorts, and
+    # updated_at for the max(updated_at) version behind list ETags
+    __table_args__ = (
+        db.Index('ix_products_active_created_at_id', 'is_active', 'created_at', 'id'),
+        db.Index('ix_products_active_price_id', 'is_active', 'price', 'id'),
+        db.Index('ix_products_active_name_id', 'is_active', 'name', 'id'),
+        db.Index('ix_products_created_at_id', 'created_at', 'id'),
+        db.Index('ix_products_updated_at', 'updated_at'),
+    )
+    
+    def to_dict(self, fields=None):
+        return serialize(fields, {
+            'id': lambda: self.id,
+            'name': lambda: self.name,
+            'description': lambda: self.description,
+            'price': lambda: float(self.price),
+            'quantity': lambda: self.quantity,
+            'category': lambda: self.category,
+            'image_url': lambda: self.image_url,
+            'images': lambda: self.images or [],
+            'is_active': lambda: self.is_active,
+            'is_featured': lambda: self.is_featured,
+            'slug': lambda: self.slug,
+            'tags': lambda: self.tags or [],
+            'seller_id': lambda: self.seller_id,
+            'seller': lambda: self.seller.username if self.seller else None,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None
+        })
     
     def __repr__(self):
         return f'<Product {self.name}>'
 
+# Full-text index over product names and descriptions. On SQLite an
+# external-content FTS5 table is kept in sync with triggers; on PostgreSQL a
+# generated tsvector column is maintained by the database and GIN-indexed.
+# Every statement is idempotent so the same list can upgrade an existing
+# database (see the rebuild-search-index CLI command).
+PRODUCT_SEARCH_DDL = {
+    'sqlite': [
+        """CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+            name, description,
+            content='products', content_rowid='id',
+            tokenize='porter unicode61', prefix='2 3'
+        )""",
+        """CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+            INSERT INTO products_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END""",
+        """CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE OF name, description ON products BEGIN
+            INSERT INTO products_fts(products_fts, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO products_fts(rowid, name, description)
+            VALUES (new.id, new.name, new.description);
+        END"""
+    ],
+    'postgresql': [
+        """ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(description, '')), 'B')
+            ) STORED""",
+        """CREATE INDEX IF NOT EXISTS ix_products_search_vector
+            ON products USING GIN (search_vector)"""
+    ]
+}
+
+for _dialect, _statements in PRODUCT_SEARCH_DDL.items():
+    for _statement in _statements:
+        event.listen(Product.__table__, 'after_create', DDL(_statement).execute_if(dialect=_dialect))
+
 class Cart(db.Model):
     __tablename__ = 'carts'
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False, unique=True)
+    
+    # Denormalized totals, refreshed by refresh_totals() on every cart mutation
+    # and by _reprice_carts() when a product in the cart changes price
+    item_count = db.Column(db.Integer, default=0)
+    subtotal = db.Column(db.Numeric(10, 2), default=0)
+    
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     items = db.relationship('CartItem', backref='cart', lazy='dynamic', cascade='all, delete-orphan')
     
+    def _aggregate(self):
+        """Sum item quantities and line totals in one joined query"""
+        return db.session.query(
+            func.coalesce(func.sum(CartItem.quantity), 0),
+            func.coalesce(func.sum(CartItem.quantity * Product.price), 0)
+        ).join(Product, Product.id == CartItem.product_id).filter(
+            CartItem.cart_id == self.id
+        ).one()
+    
     def get_total(self):
         """Calculate total cart value"""
-        return sum(item.get_subtotal() for item in self.items)
+        return Decimal(str(self._aggregate()[1])).quantize(Decimal('0.01'))
     
     def get_item_count(self):
         """Get total number of items in cart"""
-        return sum(item.quantity for item in self.items)
+        return int(self._aggregate()[0])
+    
+    def refresh_totals(self):
+        """Recompute the stored totals; call within the transaction that changed the items"""
+        db.session.flush()
+        item_count, total = self._aggregate()
+        self.item_count = int(item_count)
+        self.subtotal = Decimal(str(total)).quantize(Decimal('0.01'))
+    
+    def get_items(self):
+        """Get cart items, preferring ones primed by a batched loader"""
+        if hasattr(self, '_preloaded_items'):
+            return self._preloaded_items
+        return self.items
     
     def to_dict(self):
         return {
             'id': self.id,
             'user_id': self.user_id,
-            'items': [item.to_dict() for item in self.items],
-            'total': float(self.get_total()),
-            'item_count': self.get_item_count(),
+            'items': [item.to_dict() for item in self.get_items()],
+            'total': float(self.subtotal or 0),
+            'item_count': self.item_count or 0,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'updated_at': self.updated_at.isoformat() if self.updated_at else None
         }
@@ -110,6 +192,50 @@ class CartItem(db.Model):
             'added_at': self.added_at.isoformat() if self.added_at else None
         }
 
+@event.listens_for(Product, 'after_update')
+def _reprice_carts(mapper, connection, target):
+    """Recompute the subtotal of every cart holding a product whose price changed, in one UPDATE"""
+    if not inspect(target).attrs.price.history.has_changes():
+        return
+    
+    carts, cart_items, products = Cart.__table__, CartItem.__table__, Product.__table__
+    subtotal = select(
+        func.coalesce(func.round(func.sum(cart_items.c.quantity * products.c.price), 2), 0)
+    ).select_from(cart_items.join(products, products.c.id == cart_items.c.product_id)).where(
+        cart_items.c.cart_id == carts.c.id
+    ).scalar_subquery()
+    connection.execute(
+        update(carts).where(
+            carts.c.id.in_(select(cart_items.c.cart_id).where(cart_items.c.product_id == target.id))
+        ).values(subtotal=subtotal, updated_at=carts.c.updated_at)
+    )
+
+class StockReservation(db.Model):
+    """Units of a product held for a cart until expires_at"""
+    __tablename__ = 'stock_reservations'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    cart_id = db.Column(db.Integer, db.ForeignKey('carts.id'), nullable=False)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    # The sweeper scans holds in expiry order
+    __table_args__ = (
+        db.UniqueConstraint('cart_id', 'product_id', name='unique_cart_product_hold'),
+        db.Index('ix_stock_reservations_expires_at', 'expires_at'),
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'cart_id': self.cart_id,
+            'product_id': self.product_id,
+            'quantity': self.quantity,
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+        }
+
 class Order(db.Model):
     __tablename__ = 'orders'
     
@@ -134,27 +260,43 @@ class Order(db.Model):
     shipped_at = db.Column(db.DateTime)
     delivered_at = db.Column(db.DateTime)
     
+    # Set once the order's items are counted into the co-purchase model
+    copurchases_recorded = db.Column(db.Boolean, default=False, nullable=False, index=True)
+    
     # Relationships
     items = db.relationship('OrderItem', backref='order', lazy='dynamic', cascade='all, delete-orphan')
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'order_number': self.order_number,
-            'customer_id': self.customer_id,
-            'customer': self.customer.username if self.customer else None,
-            'total_amount': float(self.total_amount),
-            'status': self.status,
-            'payment_status': self.payment_status,
-            'shipping_address': self.shipping_address,
-            'billing_address': self.billing_address,
-            'shipping_method': self.shipping_method,
-            'tracking_number': self.tracking_number,
-            'items': [item.to_dict() for item in self.items],
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'shipped_at': self.shipped_at.isoformat() if self.shipped_at else None,
-            'delivered_at': self.delivered_at.isoformat() if self.delivered_at else None
-        }
+    # Composite indexes backing keyset pagination of customer and admin order lists
+    __table_args__ = (
+        db.Index('ix_orders_customer_created_at_id', 'customer_id', 'created_at', 'id'),
+        db.Index('ix_orders_status_created_at_id', 'status', 'created_at', 'id'),
+        db.Index('ix_orders_created_at_id', 'created_at', 'id'),
+    )
+    
+    def get_items(self):
+        """Get order items, preferring ones primed by a batched loader"""
+        if hasattr(self, '_preloaded_items'):
+            return self._preloaded_items
+        return self.items
+    
+    def to_dict(self, fields=None):
+        return serialize(fields, {
+            'id': lambda: self.id,
+            'order_number': lambda: self.order_number,
+            'customer_id': lambda: self.customer_id,
+            'customer': lambda: self.customer.username if self.customer else None,
+            'total_amount': lambda: float(self.total_amount),
+            'status': lambda: self.status,
+            'payment_status': lambda: self.payment_status,
+            'shipping_address': lambda: self.shipping_address,
+            'billing_address': lambda: self.billing_address,
+            'shipping_method': lambda: self.shipping_method,
+            'tracking_number': lambda: self.tracking_number,
+            'items': nested(lambda f: [item.to_dict(f) for item in self.get_items()]),
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'shipped_at': lambda: self.shipped_at.isoformat() if self.shipped_at else None,
+            'delivered_at': lambda: self.delivered_at.isoformat() if self.delivered_at else None
+        })
 
 class OrderItem(db.Model):
     __tablename__ = 'order_items'
@@ -165,18 +307,74 @@ class OrderItem(db.Model):
     quantity = db.Column(db.Integer, nullable=False)
     price = db.Column(db.Numeric(10, 2), nullable=False)  # Price at time of purchase
     
+    # Columns behind computed to_dict fields, for sparse fieldset projections
+    _field_columns = {'subtotal': ('price', 'quantity')}
+    
     def get_subtotal(self):
         return self.price * self.quantity
     
-    def to_dict(self):
-        return {
-            'id': self.id,
-            'product_id': self.product_id,
-            'product': self.product.to_dict() if self.product else None,
-            'quantity': self.quantity,
-            'price': float(self.price),
-            'subtotal': float(self.get_subtotal())
-        }
+    def to_dict(self, fields=None):
+        return serialize(fields, {
+            'id': lambda: self.id,
+            'product_id': lambda: self.product_id,
+            'product': nested(lambda f: self.product.to_dict(f) if self.product else None),
+            'quantity': lambda: self.quantity,
+            'price': lambda: float(self.price),
+            'subtotal': lambda: float(self.get_subtotal())
+        })
+
+class PaymentEvent(db.Model):
+    """A payment provider webhook event, queued until the worker applies it to its order"""
+    __tablename__ = 'payment_events'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    provider = db.Column(db.String(20), nullable=False)  # stripe, flutterwave
+    event_id = db.Column(db.String(255), nullable=False)
+    event_type = db.Column(db.String(100))
+    payload = db.Column(db.JSON, nullable=False)
+    received_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    processed_at = db.Column(db.DateTime)
+    
+    # A redelivered event hits the unique key and is dropped; the worker
+    # claims unprocessed events in arrival order
+    __table_args__ = (
+        db.UniqueConstraint('provider', 'event_id', name='unique_provider_event'),
+        db.Index('ix_payment_events_processed_at_id', 'processed_at', 'id'),
+    )
+
+class SellerDailySales(db.Model):
+    """Units sold and revenue per seller, product and UTC day, excluding cancelled orders"""
+    __tablename__ = 'seller_daily_sales'
+    
+    # Key order lets a seller's date range be read as one index range
+    seller_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Numeric(12, 2), nullable=False, default=0)
+
+class ProductCopurchase(db.Model):
+    """Number of orders containing both products (one row per direction)"""
+    __tablename__ = 'product_copurchases'
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+class ProductNeighbor(db.Model):
+    """A product's top-K co-purchased products, ranked from 1"""
+    __tablename__ = 'product_neighbors'
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
+    rank = db.Column(db.Integer, primary_key=True)
+    related_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    score = db.Column(db.Integer, nullable=False)
+
+class ProductNeighborRefresh(db.Model):
+    """A product whose co-purchase counts changed since its neighbors were last ranked"""
+    __tablename__ = 'product_neighbor_refreshes'
+    
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), primary_key=True)
 
 class Wishlist(db.Model):
     __tablename__ = 'wishlists'
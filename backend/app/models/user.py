@@ -1,8 +1,12 @@
 from datetime import datetime
+from sqlalchemy import event, inspect
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_sqlalchemy import SQLAlchemy
 from app import db
 
+# Columns shown with products, courses and playlists in the public catalog
+NAME_COLUMNS = ('username', 'first_name', 'last_name')
+
 class User(db.Model):
     __tablename__ = 'users'
     
@@ -25,6 +29,8 @@ class User(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     last_login = db.Column(db.DateTime)
+    # Changes only with NAME_COLUMNS, so logins do not touch catalog ETags
+    names_updated_at = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relationships
     products = db.relationship('Product', backref='seller', lazy='dynamic')
@@ -36,6 +42,12 @@ class User(db.Model):
     quiz_attempts = db.relationship('QuizAttempt', backref='user', lazy='dynamic')
     playlists = db.relationship('Playlist', backref='user', lazy='dynamic')
     
+    # Keyset pagination of the admin user list; names_updated_at versions catalog ETags
+    __table_args__ = (
+        db.Index('ix_users_created_at_id', 'created_at', 'id'),
+        db.Index('ix_users_names_updated_at', 'names_updated_at'),
+    )
+    
     def set_password(self, password):
         """Hash and set password"""
         self.password_hash = generate_password_hash(password)
@@ -79,4 +91,10 @@ class User(db.Model):
         return data
     
     def __repr__(self):
-        return f'<User {self.username}>'
\ No newline at end of file
+        return f'<User {self.username}>'
+
+@event.listens_for(User, 'before_update')
+def _touch_names(mapper, connection, target):
+    state = inspect(target)
+    if any(state.attrs[name].history.has_changes() for name in NAME_COLUMNS):
+        target.names_updated_at = datetime.utcnow()
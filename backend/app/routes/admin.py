@@ -6,6 +6,10 @@ from app.models.user import User
 from app.models.marketplace import Product, Order
 from app.models.education import Course
 from app.models.admin import AdminLog
+from app.utils.loaders import load_products, load_orders, load_admin_logs
+from app.utils.pagination import keyset_paginate
+from app.utils.cache import get_response_cache
+from app.services.sales_rollups import record_status_change
 from functools import wraps
 
 admin_bp = Blueprint('admin', __name__)
@@ -63,6 +67,7 @@ def get_users():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
         search = request.args.get('search')
         role = request.args.get('role')
         
@@ -77,6 +82,13 @@ def get_users():
         if role:
             query = query.filter(User.role == role)
         
+        if cursor is not None:
+            users = keyset_paginate(query, User.created_at, User.id, cursor, per_page)
+            return jsonify({
+                'users': [user.to_dict(include_sensitive=True) for user in users.items],
+                'pagination': users.to_dict()
+            }), 200
+        
         users = query.order_by(User.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
@@ -91,6 +103,8 @@ def get_users():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch users'}), 500
 
@@ -175,13 +189,21 @@ def get_all_products():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
+        
+        if cursor is not None:
+            products = keyset_paginate(Product.query, Product.created_at, Product.id, cursor, per_page)
+            return jsonify({
+                'products': [product.to_dict() for product in load_products(products.items)],
+                'pagination': products.to_dict()
+            }), 200
         
         products = Product.query.order_by(Product.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'products': [product.to_dict() for product in products.items],
+            'products': [product.to_dict() for product in load_products(products.items)],
             'pagination': {
                 'page': page,
                 'pages': products.pages,
@@ -190,6 +212,8 @@ def get_all_products():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch products'}), 500
 
@@ -231,6 +255,7 @@ def get_all_orders():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
         status = request.args.get('status')
         
         query = Order.query
@@ -238,12 +263,19 @@ def get_all_orders():
         if status:
             query = query.filter(Order.status == status)
         
+        if cursor is not None:
+            orders = keyset_paginate(query, Order.created_at, Order.id, cursor, per_page)
+            return jsonify({
+                'orders': [order.to_dict() for order in load_orders(orders.items)],
+                'pagination': orders.to_dict()
+            }), 200
+        
         orders = query.order_by(Order.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'orders': [order.to_dict() for order in orders.items],
+            'orders': [order.to_dict() for order in load_orders(orders.items)],
             'pagination': {
                 'page': page,
                 'pages': orders.pages,
@@ -252,6 +284,8 @@ def get_all_orders():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch orders'}), 500
 
@@ -282,6 +316,7 @@ def update_order_status(order_id):
         elif new_status == 'delivered' and not order.delivered_at:
             order.delivered_at = datetime.utcnow()
         
+        record_status_change(order, old_status, new_status)
         db.session.commit()
         
         # Log admin action
@@ -309,13 +344,21 @@ def get_admin_logs():
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
+        cursor = request.args.get('cursor')
+        
+        if cursor is not None:
+            logs = keyset_paginate(AdminLog.query, AdminLog.created_at, AdminLog.id, cursor, per_page)
+            return jsonify({
+                'logs': [log.to_dict() for log in load_admin_logs(logs.items)],
+                'pagination': logs.to_dict()
+            }), 200
         
         logs = AdminLog.query.order_by(AdminLog.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'logs': [log.to_dict() for log in logs.items],
+            'logs': [log.to_dict() for log in load_admin_logs(logs.items)],
             'pagination': {
                 'page': page,
                 'pages': logs.pages,
@@ -324,5 +367,27 @@ def get_admin_logs():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
-        return jsonify({'error': 'Failed to fetch admin logs'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to fetch admin logs'}), 500
+
+@admin_bp.route('/cache/stats', methods=['GET'])
+@admin_required
+def get_cache_stats():
+    """Get hit/miss counters of the catalog response cache"""
+    cache = get_response_cache()
+    if cache is None:
+        return jsonify({'error': 'Response cache is not configured'}), 404
+    
+    return jsonify({'cache': cache.stats()}), 200
+
+@admin_bp.route('/cache/clear', methods=['POST'])
+@admin_required
+def clear_cache():
+    """Drop every cached catalog response"""
+    cache = get_response_cache()
+    if cache is not None:
+        cache.clear()
+    
+    return jsonify({'message': 'Cache cleared'}), 200
\ No newline at end of file
@@ -3,21 +3,53 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 from datetime import datetime
 from app import db
 from app.models.user import User
-from app.models.education import Course, Enrollment, Quiz, Question, Answer, QuizAttempt
+from app.models.education import (
+    Course, Enrollment, CourseReview, Quiz, Question, Answer, QuizAttempt, QuizStats, QuestionStats
+)
+from app.utils.loaders import load_courses, load_enrollments
+from app.utils.pagination import keyset_paginate
+from app.utils.fields import parse_fields, project
+from app.utils.cache import cached_response
+from app.utils.etag import conditional, max_version
+from app.services.quiz_grading import get_answer_key
+from app.services.quiz_tree import get_student_quiz
+from app.services.progress_buffer import get_progress_buffer
 
 education_bp = Blueprint('education', __name__)
 
+def _courses_version():
+    # Enrollment ids only grow, so max(id) tracks the enrollment counts;
+    # reviews carry their own updated_at for the rating aggregates
+    return max_version(Course.updated_at, User.names_updated_at, Enrollment.id, CourseReview.updated_at)
+
+def _course_version(course_id):
+    row = db.session.query(
+        Course.updated_at, User.names_updated_at, Course.enrollment_count, Course.rating_total, Course.rating_count
+    ).join(
+        User, User.id == Course.instructor_id
+    ).filter(Course.id == course_id, Course.is_published == True).first()
+    return tuple(row) if row else None
+
 # Courses endpoints
 @education_bp.route('/courses', methods=['GET'])
+@conditional(_courses_version)
+@cached_response('courses')
 def get_courses():
     """Get all published courses"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 12, type=int)
+        cursor = request.args.get('cursor')
         category = request.args.get('category')
         level = request.args.get('level')
+        sort_by = request.args.get('sort_by', 'created_at')
+        fields = parse_fields(request.args.get('fields'))
+        
+        # Ratings rank by their Bayesian score, newest course first among ties;
+        # any other value keeps the default newest-first order
+        sort_column = Course.rating_score if sort_by == 'rating' else Course.created_at
         
-        query = Course.query.filter_by(is_published=True)
+        query = project(Course.query, Course, fields).filter_by(is_published=True)
         
         if category:
             query = query.filter(Course.category == category)
@@ -25,12 +57,19 @@ def get_courses():
         if level:
             query = query.filter(Course.level == level)
         
-        courses = query.order_by(Course.created_at.desc()).paginate(
+        if cursor is not None:
+            courses = keyset_paginate(query, sort_column, Course.id, cursor, per_page)
+            return jsonify({
+                'courses': [course.to_dict(fields) for course in load_courses(courses.items, fields)],
+                'pagination': courses.to_dict()
+            }), 200
+        
+        courses = query.order_by(sort_column.desc(), Course.id.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'courses': [course.to_dict() for course in courses.items],
+            'courses': [course.to_dict(fields) for course in load_courses(courses.items, fields)],
             'pagination': {
                 'page': page,
                 'pages': courses.pages,
@@ -39,20 +78,30 @@ def get_courses():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch courses'}), 500
 
 @education_bp.route('/courses/<int:course_id>', methods=['GET'])
+@conditional(_course_version)
+@cached_response('courses')
 def get_course(course_id):
     """Get single course by ID"""
     try:
-        course = Course.query.get(course_id)
+        fields = parse_fields(request.args.get('fields'))
+        course = project(Course.query, Course, fields).filter(
+            Course.id == course_id,
+            Course.is_published == True
+        ).first()
         
-        if not course or not course.is_published:
+        if not course:
             return jsonify({'error': 'Course not found'}), 404
         
-        return jsonify({'course': course.to_dict()}), 200
+        return jsonify({'course': course.to_dict(fields)}), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch course'}), 500
 
@@ -135,22 +184,124 @@ def enroll_in_course(course_id):
         db.session.rollback()
         return jsonify({'error': 'Failed to enroll in course'}), 500
 
+@education_bp.route('/courses/<int:course_id>/reviews', methods=['GET'])
+def get_course_reviews(course_id):
+    """Get a course's reviews, newest first"""
+    try:
+        page = request.args.get('page', 1, type=int)
+        per_page = min(request.args.get('per_page', 20, type=int), 100)
+        
+        course = Course.query.get(course_id)
+        if not course or not course.is_published:
+            return jsonify({'error': 'Course not found'}), 404
+        
+        reviews = CourseReview.query.filter_by(course_id=course_id).order_by(
+            CourseReview.created_at.desc(), CourseReview.id.desc()
+        ).paginate(page=page, per_page=per_page, error_out=False)
+        
+        return jsonify({
+            'reviews': [review.to_dict() for review in reviews.items],
+            'average_rating': course.get_average_rating(),
+            'rating_count': course.rating_count,
+            'pagination': {
+                'page': page,
+                'pages': reviews.pages,
+                'per_page': per_page,
+                'total': reviews.total
+            }
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch reviews'}), 500
+
+@education_bp.route('/courses/<int:course_id>/reviews', methods=['POST'])
+@jwt_required()
+def rate_course(course_id):
+    """Rate a course (enrolled students only); rating again replaces the earlier review"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.json or {}
+        
+        rating = data.get('rating')
+        if not isinstance(rating, int) or isinstance(rating, bool) or not 1 <= rating <= 5:
+            return jsonify({'error': 'Rating must be a whole number from 1 to 5'}), 400
+        
+        enrollment = Enrollment.query.filter_by(
+            student_id=user_id,
+            course_id=course_id
+        ).first()
+        
+        if not enrollment:
+            return jsonify({'error': 'Not enrolled in this course'}), 403
+        
+        review = CourseReview.query.filter_by(course_id=course_id, student_id=user_id).first()
+        created = review is None
+        if created:
+            review = CourseReview(course_id=course_id, student_id=user_id)
+            db.session.add(review)
+        review.rating = rating
+        if 'comment' in data:
+            review.comment = data['comment']
+        
+        # The course's aggregates are adjusted in the same flush
+        db.session.commit()
+        course = Course.query.get(course_id)
+        
+        return jsonify({
+            'message': 'Review saved successfully',
+            'review': review.to_dict(),
+            'average_rating': course.get_average_rating(),
+            'rating_count': course.rating_count
+        }), 201 if created else 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to save review'}), 500
+
 @education_bp.route('/my-courses', methods=['GET'])
 @jwt_required()
 def get_my_courses():
     """Get user's enrolled courses"""
     try:
         user_id = get_jwt_identity()
+        fields = parse_fields(request.args.get('fields'))
         
-        enrollments = Enrollment.query.filter_by(student_id=user_id).all()
+        enrollments = project(Enrollment.query, Enrollment, fields).filter_by(student_id=user_id).all()
         
         return jsonify({
-            'enrollments': [enrollment.to_dict() for enrollment in enrollments]
+            'enrollments': [enrollment.to_dict(fields) for enrollment in load_enrollments(enrollments, fields)]
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch enrolled courses'}), 500
 
+@education_bp.route('/courses/<int:course_id>/progress', methods=['POST'])
+@jwt_required()
+def report_progress(course_id):
+    """Report progress through a course (player heartbeats); stored with the next batched write"""
+    try:
+        user_id = int(get_jwt_identity())
+        data = request.json or {}
+        
+        progress = data.get('progress')
+        if not isinstance(progress, (int, float)) or isinstance(progress, bool) or not 0 <= progress <= 100:
+            return jsonify({'error': 'Progress must be a percentage from 0 to 100'}), 400
+        
+        buffer = get_progress_buffer()
+        enrollment_id = buffer.enrollment_id(user_id, course_id)
+        if enrollment_id is None:
+            return jsonify({'error': 'Not enrolled in this course'}), 403
+        
+        buffer.record(enrollment_id, float(progress))
+        
+        return jsonify({'progress': float(progress)}), 202
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to record progress'}), 500
+
 # Quiz endpoints
 @education_bp.route('/courses/<int:course_id>/quizzes', methods=['GET'])
 @jwt_required()
@@ -200,16 +351,8 @@ def get_quiz(quiz_id):
         if not enrollment:
             return jsonify({'error': 'Not enrolled in this course'}), 403
         
-        # Include questions in response
-        quiz._include_questions = True
-        quiz_data = quiz.to_dict()
-        
-        # Remove correct answers from questions
-        for question in quiz_data['questions']:
-            for answer in question['answers']:
-                answer.pop('is_correct', None)
-        
-        return jsonify({'quiz': quiz_data}), 200
+        # Questions and answers in one query, without the correct answers
+        return jsonify({'quiz': get_student_quiz(quiz)}), 200
         
     except Exception as e:
         return jsonify({'error': 'Failed to fetch quiz'}), 500
@@ -251,8 +394,8 @@ def submit_quiz_attempt(quiz_id):
             answers=data.get('answers', {})
         )
         
-        # Calculate score
-        score, max_score, percentage = attempt.calculate_score()
+        # Calculate score against the quiz's cached answer key
+        score, max_score, percentage = attempt.calculate_score(get_answer_key(quiz))
         attempt.score = score
         attempt.max_score = max_score
         attempt.percentage = percentage
@@ -269,4 +412,40 @@ def submit_quiz_attempt(quiz_id):
         
     except Exception as e:
         db.session.rollback()
-        return jsonify({'error': 'Failed to submit quiz'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Failed to submit quiz'}), 500
+
+@education_bp.route('/quizzes/<int:quiz_id>/analytics', methods=['GET'])
+@jwt_required()
+def get_quiz_analytics(quiz_id):
+    """Get per-question item analysis of a quiz (course instructor or admin)"""
+    try:
+        user = User.query.get(get_jwt_identity())
+        
+        quiz = Quiz.query.get(quiz_id)
+        if not quiz:
+            return jsonify({'error': 'Quiz not found'}), 404
+        
+        if not user or (quiz.course.instructor_id != user.id and not user.is_admin()):
+            return jsonify({'error': 'Only the course instructor can view quiz analytics'}), 403
+        
+        # Computed by flask refresh-quiz-stats; attempts are never scanned here
+        stats = QuizStats.query.get(quiz_id)
+        rows = db.session.query(QuestionStats, Question.question_text).join(
+            Question, Question.id == QuestionStats.question_id
+        ).filter(QuestionStats.quiz_id == quiz_id).order_by(Question.order, Question.id).all()
+        
+        questions = []
+        for question_stats, question_text in rows:
+            data = question_stats.to_dict()
+            data['question_text'] = question_text
+            questions.append(data)
+        
+        return jsonify({
+            'quiz_id': quiz_id,
+            'stats': stats.to_dict() if stats else None,
+            'up_to_date': stats is not None and stats.quiz_version == quiz.updated_at,
+            'questions': questions
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch quiz analytics'}), 500
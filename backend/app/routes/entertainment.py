@@ -1,21 +1,43 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import func, select
 from app import db
+from app.models.user import User
 from app.models.entertainment import Music, Video, Game, Playlist
+from app.utils.pagination import keyset_paginate
+from app.utils.fields import parse_fields, project
+from app.utils.cache import cached_response
+from app.utils.etag import conditional, max_version
 
 entertainment_bp = Blueprint('entertainment', __name__)
 
+def _playlist_version(playlist_id):
+    user_id = get_jwt_identity()
+    playlist = Playlist.query.get(playlist_id)
+    if not playlist or (playlist.user_id != user_id and not playlist.is_public):
+        return None
+    
+    # The owner's name and every listed track are part of the response
+    owner = select(User.names_updated_at).where(User.id == playlist.user_id).scalar_subquery()
+    music = select(func.max(Music.updated_at)).where(Music.id.in_(playlist.music_ids or [])).scalar_subquery()
+    videos = select(func.max(Video.updated_at)).where(Video.id.in_(playlist.video_ids or [])).scalar_subquery()
+    return (playlist.updated_at,) + tuple(db.session.execute(select(owner, music, videos)).one())
+
 # Music endpoints
 @entertainment_bp.route('/music', methods=['GET'])
+@conditional(lambda: max_version(Music.updated_at))
+@cached_response('music')
 def get_music():
     """Get all active music"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'))
         genre = request.args.get('genre')
         artist = request.args.get('artist')
         
-        query = Music.query.filter_by(is_active=True)
+        query = project(Music.query, Music, fields).filter_by(is_active=True)
         
         if genre:
             query = query.filter(Music.genre == genre)
@@ -23,12 +45,19 @@ def get_music():
         if artist:
             query = query.filter(Music.artist.ilike(f'%{artist}%'))
         
+        if cursor is not None:
+            music = keyset_paginate(query, Music.created_at, Music.id, cursor, per_page)
+            return jsonify({
+                'music': [track.to_dict(fields) for track in music.items],
+                'pagination': music.to_dict()
+            }), 200
+        
         music = query.order_by(Music.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'music': [track.to_dict() for track in music.items],
+            'music': [track.to_dict(fields) for track in music.items],
             'pagination': {
                 'page': page,
                 'pages': music.pages,
@@ -37,6 +66,8 @@ def get_music():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch music'}), 500
 
@@ -59,24 +90,35 @@ def play_music(music_id):
 
 # Video endpoints
 @entertainment_bp.route('/videos', methods=['GET'])
+@conditional(lambda: max_version(Video.updated_at))
+@cached_response('videos')
 def get_videos():
     """Get all active videos"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 12, type=int)
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'))
         category = request.args.get('category')
         
-        query = Video.query.filter_by(is_active=True)
+        query = project(Video.query, Video, fields).filter_by(is_active=True)
         
         if category:
             query = query.filter(Video.category == category)
         
+        if cursor is not None:
+            videos = keyset_paginate(query, Video.created_at, Video.id, cursor, per_page)
+            return jsonify({
+                'videos': [video.to_dict(fields) for video in videos.items],
+                'pagination': videos.to_dict()
+            }), 200
+        
         videos = query.order_by(Video.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'videos': [video.to_dict() for video in videos.items],
+            'videos': [video.to_dict(fields) for video in videos.items],
             'pagination': {
                 'page': page,
                 'pages': videos.pages,
@@ -85,6 +127,8 @@ def get_videos():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch videos'}), 500
 
@@ -107,24 +151,35 @@ def watch_video(video_id):
 
 # Games endpoints
 @entertainment_bp.route('/games', methods=['GET'])
+@conditional(lambda: max_version(Game.updated_at))
+@cached_response('games')
 def get_games():
     """Get all active games"""
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 12, type=int)
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'))
         category = request.args.get('category')
         
-        query = Game.query.filter_by(is_active=True)
+        query = project(Game.query, Game, fields).filter_by(is_active=True)
         
         if category:
             query = query.filter(Game.category == category)
         
+        if cursor is not None:
+            games = keyset_paginate(query, Game.created_at, Game.id, cursor, per_page)
+            return jsonify({
+                'games': [game.to_dict(fields) for game in games.items],
+                'pagination': games.to_dict()
+            }), 200
+        
         games = query.order_by(Game.created_at.desc()).paginate(
             page=page, per_page=per_page, error_out=False
         )
         
         return jsonify({
-            'games': [game.to_dict() for game in games.items],
+            'games': [game.to_dict(fields) for game in games.items],
             'pagination': {
                 'page': page,
                 'pages': games.pages,
@@ -133,6 +188,8 @@ def get_games():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch games'}), 500
 
@@ -202,6 +259,7 @@ def create_playlist():
 
 @entertainment_bp.route('/playlists/<int:playlist_id>', methods=['GET'])
 @jwt_required()
+@conditional(_playlist_version, private=True)
 def get_playlist(playlist_id):
     """Get playlist with items"""
     try:
@@ -1,16 +1,38 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
-from datetime import datetime
-import uuid
+from datetime import datetime, date, timedelta
+import csv
 from app import db
 from app.models.user import User
-from app.models.marketplace import Product, Cart, CartItem, Order, OrderItem, Wishlist
-from sqlalchemy import or_
+from app.models.marketplace import Product, Cart, CartItem, Order, OrderItem, ProductNeighbor, Wishlist
+from app.utils.loaders import load_products, load_orders, load_cart
+from app.utils.pagination import keyset_paginate
+from app.utils.fields import parse_fields, project
+from app.utils.cache import cached_response
+from app.utils.etag import conditional, max_version
+from app.services.product_search import search_products
+from app.services.product_facets import parse_facets, product_facets
+from app.services.checkout import checkout_cart
+from app.services.inventory import OutOfStockError, hold_stock, release_hold
+from app.services.product_import import ImportResult, import_products, make_slug, FORMATS
+from app.services.related_products import record_orders
+from app.services.sales_rollups import seller_sales_series, seller_product_totals, DEFAULT_WINDOWS, RESOLUTIONS
 
 marketplace_bp = Blueprint('marketplace', __name__)
 
+def _products_version():
+    return max_version(Product.updated_at, User.names_updated_at)
+
+def _product_version(product_id):
+    row = db.session.query(Product.updated_at, User.names_updated_at).join(
+        User, User.id == Product.seller_id
+    ).filter(Product.id == product_id, Product.is_active == True).first()
+    return tuple(row) if row else None
+
 # Products endpoints
 @marketplace_bp.route('/products', methods=['GET'])
+@conditional(_products_version)
+@cached_response('products')
 def get_products():
     """Get all products with filtering and pagination"""
     try:
@@ -22,29 +44,58 @@ def get_products():
         max_price = request.args.get('max_price', type=float)
         sort_by = request.args.get('sort_by', 'created_at')
         sort_order = request.args.get('sort_order', 'desc')
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'))
+        facet_names = parse_facets(request.args.get('facets'))
         
         query = Product.query.filter_by(is_active=True)
+        relevance = None
         
         # Apply filters
-        if category:
-            query = query.filter(Product.category == category)
-        
         if search:
-            query = query.filter(
-                or_(
-                    Product.name.ilike(f'%{search}%'),
-                    Product.description.ilike(f'%{search}%')
-                )
+            query, relevance = search_products(query, search)
+        
+        # Facets leave out their own filters, so count before category/price
+        facets = None
+        if facet_names:
+            facets = product_facets(
+                query, facet_names, category=category, min_price=min_price, max_price=max_price,
+                edges=current_app.config['PRODUCT_PRICE_BUCKETS']
             )
         
+        query = project(query, Product, fields)
+        
+        if category:
+            query = query.filter(Product.category == category)
+        
         if min_price:
             query = query.filter(Product.price >= min_price)
         
         if max_price:
             query = query.filter(Product.price <= max_price)
         
+        # Cursor mode pages by (sort key, id) without OFFSET or COUNT
+        if cursor is not None:
+            if sort_by == 'relevance':
+                # Rank is computed per query and cannot seed a keyset; use page= for ranked results
+                raise ValueError('sort_by=relevance does not support cursor pagination; use page instead')
+            sort_column = getattr(Product, sort_by if sort_by in ['name', 'price', 'created_at'] else 'created_at')
+            products = keyset_paginate(
+                query, sort_column, Product.id, cursor, per_page,
+                descending=(sort_order == 'desc')
+            )
+            response = {
+                'products': [product.to_dict(fields) for product in load_products(products.items, fields)],
+                'pagination': products.to_dict()
+            }
+            if facets is not None:
+                response['facets'] = facets
+            return jsonify(response), 200
+        
         # Apply sorting
-        if sort_by in ['name', 'price', 'created_at']:
+        if sort_by == 'relevance' and relevance is not None:
+            query = query.order_by(relevance, Product.id)
+        elif sort_by in ['name', 'price', 'created_at']:
             if sort_order == 'desc':
                 query = query.order_by(getattr(Product, sort_by).desc())
             else:
@@ -57,8 +108,8 @@ def get_products():
             error_out=False
         )
         
-        return jsonify({
-            'products': [product.to_dict() for product in products.items],
+        response = {
+            'products': [product.to_dict(fields) for product in load_products(products.items, fields)],
             'pagination': {
                 'page': page,
                 'pages': products.pages,
@@ -67,25 +118,70 @@ def get_products():
                 'has_next': products.has_next,
                 'has_prev': products.has_prev
             }
-        }), 200
+        }
+        if facets is not None:
+            response['facets'] = facets
+        return jsonify(response), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch products'}), 500
 
 @marketplace_bp.route('/products/<int:product_id>', methods=['GET'])
+@conditional(_product_version)
+@cached_response('products')
 def get_product(product_id):
     """Get single product by ID"""
     try:
-        product = Product.query.get(product_id)
+        fields = parse_fields(request.args.get('fields'))
+        product = project(Product.query, Product, fields).filter(
+            Product.id == product_id,
+            Product.is_active == True
+        ).first()
         
-        if not product or not product.is_active:
+        if not product:
             return jsonify({'error': 'Product not found'}), 404
         
-        return jsonify({'product': product.to_dict()}), 200
+        return jsonify({'product': product.to_dict(fields)}), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch product'}), 500
 
+@marketplace_bp.route('/products/<int:product_id>/related', methods=['GET'])
+@cached_response('related')
+def get_related_products(product_id):
+    """Get products frequently bought together with a product"""
+    try:
+        top_k = current_app.config['RELATED_PRODUCTS_TOP_K']
+        limit = min(max(request.args.get('limit', 10, type=int), 1), top_k)
+        fields = parse_fields(request.args.get('fields'))
+        
+        # One range scan of the (product_id, rank) primary key
+        rows = project(Product.query, Product, fields).join(
+            ProductNeighbor, ProductNeighbor.related_id == Product.id
+        ).filter(
+            ProductNeighbor.product_id == product_id,
+            Product.is_active == True
+        ).add_columns(ProductNeighbor.score).order_by(ProductNeighbor.rank).limit(limit).all()
+        
+        products = load_products([product for product, _ in rows], fields)
+        
+        return jsonify({
+            'product_id': product_id,
+            'related': [
+                {'product': product.to_dict(fields), 'copurchases': score}
+                for product, (_, score) in zip(products, rows)
+            ]
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch related products'}), 500
+
 @marketplace_bp.route('/products', methods=['POST'])
 @jwt_required()
 def create_product():
@@ -119,7 +215,7 @@ def create_product():
         )
         
         # Generate slug from name
-        product.slug = data['name'].lower().replace(' ', '-') + '-' + str(uuid.uuid4())[:8]
+        product.slug = make_slug(data['name'])
         
         db.session.add(product)
         db.session.commit()
@@ -133,6 +229,48 @@ def create_product():
         db.session.rollback()
         return jsonify({'error': 'Failed to create product'}), 500
 
+@marketplace_bp.route('/products/import', methods=['POST'])
+@jwt_required()
+def import_products_bulk():
+    """Bulk import products from a CSV or NDJSON request body (sellers only)"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user or not user.is_seller():
+            return jsonify({'error': 'Only sellers can import products'}), 403
+        
+        fmt = request.args.get('format')
+        if not fmt:
+            fmt = 'csv' if request.mimetype == 'text/csv' else 'ndjson'
+        if fmt not in FORMATS:
+            return jsonify({'error': f'format must be one of: {", ".join(FORMATS)}'}), 400
+        
+        chunk_size = request.args.get('chunk_size', current_app.config['PRODUCT_IMPORT_CHUNK_SIZE'], type=int)
+        
+        # Chunks already committed stay imported if the body fails part way; report them either way
+        result = ImportResult()
+        try:
+            import_products(request.stream, fmt, user.id, chunk_size=max(chunk_size, 1), result=result)
+        except UnicodeDecodeError:
+            db.session.rollback()
+            return jsonify({'error': 'Import file must be UTF-8 encoded', **result.to_dict()}), 400
+        except csv.Error as e:
+            db.session.rollback()
+            return jsonify({'error': f'Malformed CSV: {e}', **result.to_dict()}), 400
+        except Exception as e:
+            db.session.rollback()
+            return jsonify({'error': 'Failed to import products', **result.to_dict()}), 500
+        
+        return jsonify({
+            'message': 'Import finished',
+            **result.to_dict()
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to import products'}), 500
+
 # Cart endpoints
 @marketplace_bp.route('/cart', methods=['GET'])
 @jwt_required()
@@ -141,12 +279,13 @@ def get_cart():
     try:
         user_id = get_jwt_identity()
         
-        cart = Cart.query.filter_by(user_id=user_id).first()
+        cart = load_cart(user_id)
         if not cart:
             # Create empty cart if it doesn't exist
             cart = Cart(user_id=user_id)
             db.session.add(cart)
             db.session.commit()
+            cart._preloaded_items = []
         
         return jsonify({'cart': cart.to_dict()}), 200
         
@@ -167,6 +306,9 @@ def add_to_cart():
         if not product_id:
             return jsonify({'error': 'Product ID is required'}), 400
         
+        if not isinstance(quantity, int) or quantity < 1:
+            return jsonify({'error': 'Quantity must be a positive integer'}), 400
+        
         # Check if product exists and is active
         product = Product.query.get(product_id)
         if not product or not product.is_active:
@@ -195,13 +337,23 @@ def add_to_cart():
             )
             db.session.add(cart_item)
         
+        # Take the units out of stock now and hold them for this cart
+        hold_stock(cart, product.id, quantity, current_app.config['CART_HOLD_TTL'])
+        
+        cart.refresh_totals()
         db.session.commit()
         
         return jsonify({
             'message': 'Item added to cart',
-            'cart': cart.to_dict()
+            'cart': load_cart(user_id).to_dict()
         }), 200
         
+    except OutOfStockError as e:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Insufficient stock',
+            'product_ids': e.product_ids
+        }), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to add item to cart'}), 500
@@ -221,7 +373,10 @@ def remove_from_cart(item_id):
         if not cart_item:
             return jsonify({'error': 'Cart item not found'}), 404
         
+        cart = cart_item.cart
+        release_hold(cart, cart_item.product_id)
         db.session.delete(cart_item)
+        cart.refresh_totals()
         db.session.commit()
         
         return jsonify({'message': 'Item removed from cart'}), 200
@@ -240,45 +395,31 @@ def create_order():
         data = request.json
         
         cart = Cart.query.filter_by(user_id=user_id).first()
-        if not cart or not cart.items.count():
+        order = checkout_cart(cart, user_id, data) if cart else None
+        if not order:
             return jsonify({'error': 'Cart is empty'}), 400
         
-        # Calculate total
-        total_amount = cart.get_total()
-        
-        # Create order
-        order = Order(
-            order_number=f'ORD-{datetime.utcnow().strftime("%Y%m%d")}-{str(uuid.uuid4())[:8]}',
-            customer_id=user_id,
-            total_amount=total_amount,
-            shipping_address=data.get('shipping_address'),
-            billing_address=data.get('billing_address'),
-            shipping_method=data.get('shipping_method', 'standard')
-        )
-        
-        db.session.add(order)
-        db.session.flush()
-        
-        # Create order items from cart items
-        for cart_item in cart.items:
-            order_item = OrderItem(
-                order_id=order.id,
-                product_id=cart_item.product_id,
-                quantity=cart_item.quantity,
-                price=cart_item.product.price
-            )
-            db.session.add(order_item)
-        
-        # Clear cart
-        cart.items.delete()
-        
         db.session.commit()
         
+        # Count the basket's pairs; the periodic record-related-products
+        # job re-ranks the neighbors, and records the order if this fails
+        try:
+            record_orders(current_app.config['RELATED_PRODUCTS_TOP_K'], order_ids=[order.id], rerank=False)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+        
         return jsonify({
             'message': 'Order created successfully',
-            'order': order.to_dict()
+            'order': load_orders([order])[0].to_dict()
         }), 201
         
+    except OutOfStockError as e:
+        db.session.rollback()
+        return jsonify({
+            'error': 'Insufficient stock',
+            'product_ids': e.product_ids
+        }), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Failed to create order'}), 500
@@ -291,8 +432,19 @@ def get_orders():
         user_id = get_jwt_identity()
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 10, type=int)
+        cursor = request.args.get('cursor')
+        fields = parse_fields(request.args.get('fields'))
         
-        orders = Order.query.filter_by(customer_id=user_id).order_by(
+        query = project(Order.query, Order, fields).filter_by(customer_id=user_id)
+        
+        if cursor is not None:
+            orders = keyset_paginate(query, Order.created_at, Order.id, cursor, per_page)
+            return jsonify({
+                'orders': [order.to_dict(fields) for order in load_orders(orders.items, fields)],
+                'pagination': orders.to_dict()
+            }), 200
+        
+        orders = query.order_by(
             Order.created_at.desc()
         ).paginate(
             page=page, 
@@ -301,7 +453,7 @@ def get_orders():
         )
         
         return jsonify({
-            'orders': [order.to_dict() for order in orders.items],
+            'orders': [order.to_dict(fields) for order in load_orders(orders.items, fields)],
             'pagination': {
                 'page': page,
                 'pages': orders.pages,
@@ -310,9 +462,111 @@ def get_orders():
             }
         }), 200
         
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': 'Failed to fetch orders'}), 500
 
+@marketplace_bp.route('/orders/<int:order_id>/payment', methods=['POST'])
+@jwt_required()
+def start_order_payment(order_id):
+    """Start paying for an order with Stripe or Flutterwave"""
+    try:
+        user_id = get_jwt_identity()
+        data = request.json or {}
+        provider = data.get('provider', 'stripe')
+        
+        order = Order.query.filter_by(id=order_id, customer_id=user_id).first()
+        if not order:
+            return jsonify({'error': 'Order not found'}), 404
+        if order.payment_status not in (None, 'pending', 'failed'):
+            return jsonify({'error': f'Order is already {order.payment_status}'}), 409
+        
+        # The order number goes to the provider as the payment's reference,
+        # which is how webhook events find the order (app.services.payment_events)
+        amount = int(order.total_amount * 100)
+        if provider == 'stripe':
+            import stripe_client
+            if not data.get('success_url') or not data.get('cancel_url'):
+                raise ValueError('success_url and cancel_url are required')
+            session = stripe_client.create_checkout_session(
+                current_app.config['STRIPE_SECRET_KEY'],
+                [{
+                    'price_data': {
+                        'currency': 'usd',
+                        'product_data': {'name': f'Order {order.order_number}'},
+                        'unit_amount': amount
+                    },
+                    'quantity': 1
+                }],
+                data['success_url'],
+                data['cancel_url'],
+                order_number=order.order_number
+            )
+            return jsonify({
+                'provider': 'stripe',
+                'order_number': order.order_number,
+                'session_id': session.id,
+                'checkout_url': session.url
+            }), 201
+        
+        if provider == 'flutterwave':
+            # Flutterwave payments are started by the client; it must use this tx_ref
+            return jsonify({
+                'provider': 'flutterwave',
+                'order_number': order.order_number,
+                'tx_ref': order.order_number,
+                'amount': amount / 100,
+                'currency': 'USD'
+            }), 200
+        
+        raise ValueError('provider must be stripe or flutterwave')
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to start payment'}), 500
+
+# Seller analytics endpoints
+@marketplace_bp.route('/seller/analytics', methods=['GET'])
+@jwt_required()
+def get_seller_analytics():
+    """Get the seller's units and revenue over time from the daily rollups"""
+    try:
+        user_id = get_jwt_identity()
+        user = User.query.get(user_id)
+        
+        if not user or not user.is_seller():
+            return jsonify({'error': 'Only sellers can view sales analytics'}), 403
+        
+        resolution = request.args.get('resolution', 'day')
+        if resolution not in RESOLUTIONS:
+            return jsonify({'error': f'resolution must be one of: {", ".join(RESOLUTIONS)}'}), 400
+        
+        end = date.fromisoformat(request.args['end']) if request.args.get('end') else datetime.utcnow().date()
+        if request.args.get('start'):
+            start = date.fromisoformat(request.args['start'])
+        else:
+            start = end - timedelta(days=DEFAULT_WINDOWS[resolution] - 1)
+        
+        if (end - start).days > current_app.config['SELLER_ANALYTICS_MAX_DAYS']:
+            return jsonify({'error': 'Date range is too long'}), 400
+        
+        product_id = request.args.get('product_id', type=int)
+        
+        return jsonify({
+            'resolution': resolution,
+            'start': start.isoformat(),
+            'end': end.isoformat(),
+            'series': seller_sales_series(user.id, start, end, resolution, product_id),
+            'products': seller_product_totals(user.id, start, end)
+        }), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': 'Failed to fetch sales analytics'}), 500
+
 # Wishlist endpoints
 @marketplace_bp.route('/wishlist', methods=['GET'])
 @jwt_required()
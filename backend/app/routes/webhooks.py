@@ -0,0 +1,44 @@
+from flask import Blueprint, request, jsonify, current_app
+from app import db
+from app.services.payment_events import enqueue_event
+from payment_webhooks import InvalidSignatureError, verify_stripe_signature, verify_flutterwave_signature
+
+webhooks_bp = Blueprint('webhooks', __name__)
+
+def _enqueue(provider):
+    try:
+        created = enqueue_event(provider, request.get_data())
+        db.session.commit()
+        return jsonify({'received': True, 'duplicate': not created}), 200
+        
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': 'Failed to record event'}), 500
+
+@webhooks_bp.route('/stripe', methods=['POST'])
+def stripe_webhook():
+    """Queue a signed Stripe event for the payment worker"""
+    try:
+        verify_stripe_signature(
+            request.get_data(),
+            request.headers.get('Stripe-Signature'),
+            current_app.config['STRIPE_WEBHOOK_SECRET'],
+            current_app.config['STRIPE_WEBHOOK_TOLERANCE']
+        )
+    except InvalidSignatureError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return _enqueue('stripe')
+
+@webhooks_bp.route('/flutterwave', methods=['POST'])
+def flutterwave_webhook():
+    """Queue a signed Flutterwave event for the payment worker"""
+    try:
+        verify_flutterwave_signature(request.headers.get('verif-hash'), current_app.config['FLUTTERWAVE_WEBHOOK_HASH'])
+    except InvalidSignatureError as e:
+        return jsonify({'error': str(e)}), 401
+    
+    return _enqueue('flutterwave')
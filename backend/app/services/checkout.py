@@ -0,0 +1,81 @@
+"""
+Cart checkout.
+
+Turns a cart into an order with a fixed number of statements regardless of
+cart size: one read of the cart lines with their prices, one delete that
+claims the cart's stock holds, one bulk insert of the order items and one
+delete of the cart items. Stock was already taken out when the items were
+held; lines whose hold lapsed are taken with one conditional ``UPDATE`` that
+only matches rows that still have enough quantity, so if any line is short
+the whole order is rolled back instead of overselling.
+"""
+
+import uuid
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import insert
+from app import db
+from app.models.marketplace import Product, CartItem, Order, OrderItem
+from app.services.inventory import convert_holds
+from app.services.sales_rollups import record_sales
+
+def _cart_lines(cart):
+    """Quantity and current unit price per product in the cart"""
+    rows = db.session.query(
+        CartItem.product_id, CartItem.quantity, Product.price, Product.seller_id
+    ).join(Product, Product.id == CartItem.product_id).filter(
+        CartItem.cart_id == cart.id
+    ).all()
+    
+    lines = {}
+    for product_id, quantity, price, seller_id in rows:
+        if product_id in lines:
+            lines[product_id]['quantity'] += quantity
+        else:
+            lines[product_id] = {'quantity': quantity, 'price': price, 'seller_id': seller_id}
+    return lines
+
+def checkout_cart(cart, customer_id, data):
+    """Create an order from ``cart``, decrementing stock and emptying the cart"""
+    lines = _cart_lines(cart)
+    if not lines:
+        return None
+    
+    convert_holds(cart, {product_id: line['quantity'] for product_id, line in lines.items()})
+    
+    total_amount = sum(
+        (Decimal(line['price']) * line['quantity'] for line in lines.values()),
+        Decimal('0')
+    )
+    
+    order = Order(
+        order_number=f'ORD-{datetime.utcnow().strftime("%Y%m%d")}-{str(uuid.uuid4())[:8]}',
+        customer_id=customer_id,
+        total_amount=total_amount,
+        shipping_address=data.get('shipping_address'),
+        billing_address=data.get('billing_address'),
+        shipping_method=data.get('shipping_method', 'standard')
+    )
+    db.session.add(order)
+    db.session.flush()
+    
+    db.session.execute(insert(OrderItem), [
+        {
+            'order_id': order.id,
+            'product_id': product_id,
+            'quantity': line['quantity'],
+            'price': line['price']
+        }
+        for product_id, line in lines.items()
+    ])
+    
+    record_sales(order, [
+        (product_id, line['seller_id'], line['quantity'], line['price'])
+        for product_id, line in lines.items()
+    ])
+    
+    cart.items.delete()
+    cart.item_count = 0
+    cart.subtotal = 0
+    
+    return order
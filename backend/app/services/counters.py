@@ -0,0 +1,60 @@
+"""
+Denormalized counters.
+
+``Course.enrollment_count`` and ``Quiz.question_count`` are adjusted in the
+same transaction as every ORM insert or delete of the rows they count, and
+a course's rating aggregates with every review given, edited or removed
+(see ``app.models.education``), so listings read them instead of running a
+``COUNT`` or ``AVG`` per row. Writes that bypass the ORM, such as bulk
+inserts or manual SQL, are not seen; ``reconcile_counters`` recomputes
+every counter with one correlated UPDATE per counter, touching only rows
+that drifted. It also rescores every course after the rating prior
+changes.
+"""
+
+from sqlalchemy import func, or_, select, update
+from app import db
+from app.models.education import Course, Enrollment, CourseReview, Quiz, Question, rating_aggregates
+
+def reconcile_counters():
+    """Recompute all counters from the counted rows; returns {counter: rows corrected}"""
+    enrollments = select(func.count(Enrollment.id)).where(
+        Enrollment.course_id == Course.id
+    ).scalar_subquery()
+    questions = select(func.count(Question.id)).where(
+        Question.quiz_id == Quiz.id
+    ).scalar_subquery()
+    rating_total = select(func.coalesce(func.sum(CourseReview.rating), 0)).where(
+        CourseReview.course_id == Course.id
+    ).scalar_subquery()
+    rating_count = select(func.count(CourseReview.id)).where(
+        CourseReview.course_id == Course.id
+    ).scalar_subquery()
+    average_rating, rating_score = rating_aggregates(rating_total, rating_count)
+    
+    corrected = {}
+    corrected['courses.enrollment_count'] = db.session.execute(
+        update(Course).where(Course.enrollment_count != enrollments).values(
+            enrollment_count=enrollments,
+            updated_at=Course.updated_at
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    corrected['quizzes.question_count'] = db.session.execute(
+        update(Quiz).where(Quiz.question_count != questions).values(
+            question_count=questions
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    corrected['courses.rating'] = db.session.execute(
+        update(Course).where(or_(
+            Course.rating_total != rating_total,
+            Course.rating_count != rating_count,
+            func.abs(Course.rating_score - rating_score) > 1e-9
+        )).values(
+            rating_total=rating_total,
+            rating_count=rating_count,
+            average_rating=average_rating,
+            rating_score=rating_score,
+            updated_at=Course.updated_at
+        ).execution_options(synchronize_session=False)
+    ).rowcount
+    return corrected
@@ -0,0 +1,202 @@
+"""
+Stock levels and cart reservations.
+
+``Product.quantity`` counts the units still available to buy. Adding to a
+cart takes the requested units out of it straight away with one conditional
+``UPDATE`` and records a time-boxed hold (``StockReservation``), so
+contention on a SKU is resolved when shoppers add to their carts rather than
+at checkout. Checkout converts a cart's holds by deleting them, which needs
+no further change to the product rows unless a hold has lapsed; holds that
+expire are handed back to stock by the sweeper.
+
+Holds are always claimed with ``DELETE ... RETURNING`` (or an equivalent
+per-row delete), so a hold is returned to stock or converted into an order
+exactly once even when the sweeper and a checkout race for it.
+
+Stock movements are not catalog changes: the UPDATEs here keep
+``Product.updated_at`` and opt out of response cache invalidation, so busy
+carts do not keep expiring cached product listings and their ETags. The
+``quantity`` shown in listings is therefore as of the product's last edit;
+adding to a cart and checkout always check the live stock.
+"""
+
+from datetime import datetime, timedelta
+from sqlalchemy import case, delete, select, update
+from app import db
+from app.models.marketplace import Product, StockReservation
+
+class OutOfStockError(Exception):
+    """Raised when one or more cart lines exceed the available stock"""
+    
+    def __init__(self, product_ids):
+        super().__init__('Insufficient stock')
+        self.product_ids = product_ids
+
+def _dialect():
+    return db.session.get_bind().dialect
+
+def _stock_update(*criteria, quantity):
+    """UPDATE of product stock that leaves updated_at and the response caches alone"""
+    return update(Product).where(*criteria).values(
+        quantity=quantity,
+        updated_at=Product.updated_at
+    ).execution_options(synchronize_session=False, invalidates_cache=False)
+
+def decrement_stock(demand):
+    """
+    Atomically take ``demand`` ({product_id: quantity}) out of stock.
+    
+    Issues a single UPDATE whose WHERE clause requires every product to be
+    active and to hold at least the requested quantity; if fewer rows than
+    requested were updated, raises OutOfStockError. The caller must roll
+    back the transaction in that case.
+    """
+    if not demand:
+        return
+    
+    needed = case(demand, value=Product.id)
+    statement = _stock_update(
+        Product.id.in_(demand),
+        Product.is_active == True,
+        Product.quantity >= needed,
+        quantity=Product.quantity - needed
+    )
+    
+    if _dialect().update_returning:
+        updated = set(db.session.execute(statement.returning(Product.id)).scalars())
+        short = [product_id for product_id in demand if product_id not in updated]
+    else:
+        result = db.session.execute(statement)
+        short = list(demand) if result.rowcount != len(demand) else []
+    
+    if short:
+        raise OutOfStockError(short)
+
+def restock(amounts):
+    """Give ``amounts`` ({product_id: quantity}) back to stock in one UPDATE"""
+    amounts = {product_id: quantity for product_id, quantity in amounts.items() if quantity}
+    if not amounts:
+        return
+    
+    db.session.execute(_stock_update(
+        Product.id.in_(amounts),
+        quantity=Product.quantity + case(amounts, value=Product.id)
+    ))
+
+def _claim_holds(*criteria):
+    """Delete the matching holds, returning {product_id: quantity} of those this transaction removed"""
+    claimed = {}
+    
+    if _dialect().delete_returning:
+        rows = db.session.execute(
+            delete(StockReservation).where(*criteria).returning(
+                StockReservation.product_id, StockReservation.quantity
+            ).execution_options(synchronize_session=False)
+        ).all()
+    else:
+        rows = []
+        for hold_id, product_id, quantity in db.session.query(
+            StockReservation.id, StockReservation.product_id, StockReservation.quantity
+        ).filter(*criteria).all():
+            result = db.session.execute(
+                delete(StockReservation).where(StockReservation.id == hold_id).execution_options(synchronize_session=False)
+            )
+            if result.rowcount:
+                rows.append((product_id, quantity))
+    
+    for product_id, quantity in rows:
+        claimed[product_id] = claimed.get(product_id, 0) + quantity
+    return claimed
+
+def release_expired_holds(now=None, product_id=None, batch_size=1000):
+    """
+    Return lapsed holds to stock, oldest first, and report how many were released.
+    
+    Walks ``ix_stock_reservations_expires_at`` in batches; pass ``product_id``
+    to only sweep one product.
+    """
+    now = now or datetime.utcnow()
+    released = 0
+    
+    while True:
+        expired = select(StockReservation.id).where(StockReservation.expires_at < now)
+        if product_id is not None:
+            expired = expired.where(StockReservation.product_id == product_id)
+        expired = expired.order_by(StockReservation.expires_at).limit(batch_size)
+        
+        claimed = _claim_holds(StockReservation.id.in_(expired))
+        if not claimed:
+            return released
+        
+        restock(claimed)
+        released += sum(claimed.values())
+
+def hold_stock(cart, product_id, quantity, ttl):
+    """
+    Take ``quantity`` units of a product out of stock for ``cart``.
+    
+    Lapsed holds on the product are swept first if the stock looks short.
+    Every hold of the cart is extended to ``ttl`` from now. Raises
+    OutOfStockError when the units are not available.
+    """
+    try:
+        decrement_stock({product_id: quantity})
+    except OutOfStockError:
+        if not release_expired_holds(product_id=product_id):
+            raise
+        decrement_stock({product_id: quantity})
+    
+    expires_at = datetime.utcnow() + timedelta(seconds=ttl)
+    extended = db.session.execute(
+        update(StockReservation).where(
+            StockReservation.cart_id == cart.id,
+            StockReservation.product_id == product_id
+        ).values(
+            quantity=StockReservation.quantity + quantity,
+            expires_at=expires_at
+        ).execution_options(synchronize_session=False)
+    )
+    if not extended.rowcount:
+        db.session.add(StockReservation(
+            cart_id=cart.id,
+            product_id=product_id,
+            quantity=quantity,
+            expires_at=expires_at
+        ))
+    
+    db.session.execute(
+        update(StockReservation).where(StockReservation.cart_id == cart.id).values(
+            expires_at=expires_at
+        ).execution_options(synchronize_session=False)
+    )
+
+def release_hold(cart, product_id):
+    """Return a cart's hold on a product to stock"""
+    restock(_claim_holds(
+        StockReservation.cart_id == cart.id,
+        StockReservation.product_id == product_id
+    ))
+
+def convert_holds(cart, demand):
+    """
+    Turn a cart's holds into the stock taken by an order for ``demand``.
+    
+    Held units are consumed by deleting the holds. Only lines whose hold has
+    lapsed (or never covered the full quantity) touch the product rows, to
+    take the shortfall with the same conditional UPDATE as ``decrement_stock``;
+    held units beyond the demand go back to stock.
+    """
+    held = _claim_holds(StockReservation.cart_id == cart.id)
+    
+    shortfall = {}
+    for product_id, quantity in demand.items():
+        missing = quantity - held.get(product_id, 0)
+        if missing > 0:
+            shortfall[product_id] = missing
+    decrement_stock(shortfall)
+    
+    restock({
+        product_id: quantity - demand.get(product_id, 0)
+        for product_id, quantity in held.items()
+        if quantity > demand.get(product_id, 0)
+    })
@@ -0,0 +1,114 @@
+"""
+Payment webhook ingestion.
+
+Webhook endpoints only check the provider's signature, pull out the event
+id and store the raw event in ``payment_events`` before acknowledging, so a
+delivery costs one small INSERT and a redelivered event (same provider and
+event id) is dropped by the unique key. ``process_payment_events`` later
+claims unprocessed events in batches, maps each one to an order and a
+payment status, and applies them with one UPDATE per target status.
+
+Orders are matched by ``order_number``: Stripe sessions and payment
+intents are created with it as ``client_reference_id`` and
+``metadata.order_number``, and sessions pass it on to the payment intent
+they create so its charges and refunds carry it too (see
+``stripe_client``). Flutterwave payments are started with it as ``tx_ref``
+(see the order payment endpoint). Statuses only move forward (pending,
+failed, paid, refunded), so events can be applied out of order or more
+than once without undoing a later one. Signature checks and the event
+mapping live in the top-level ``payment_webhooks`` module.
+"""
+
+import json
+from datetime import datetime
+from sqlalchemy import or_, select, update
+from app import db
+from app.models.marketplace import Order, PaymentEvent
+from app.utils.upsert import insert_ignore
+# Kept free of app imports for the standalone marketplace_api
+from payment_webhooks import PAYMENT_STATUS_RANK, advances, event_outcome
+
+def enqueue_event(provider, payload):
+    """
+    Store a verified webhook body in the queue.
+    
+    Returns False when the provider already delivered this event. Raises
+    ValueError when the body is not an event. The caller commits.
+    """
+    try:
+        event = json.loads(payload)
+    except ValueError:
+        raise ValueError('Payload is not valid JSON')
+    if not isinstance(event, dict):
+        raise ValueError('Payload is not an event')
+    
+    if provider == 'stripe':
+        event_id, event_type = event.get('id'), event.get('type')
+    else:
+        event_id, event_type = (event.get('data') or {}).get('id'), event.get('event')
+    if not event_id:
+        raise ValueError('Event has no id')
+    
+    return bool(insert_ignore(PaymentEvent, [{
+        'provider': provider,
+        'event_id': str(event_id),
+        'event_type': event_type,
+        'payload': event,
+        'received_at': datetime.utcnow()
+    }], keys=['provider', 'event_id']))
+
+def _claim_events(batch_size, now):
+    """Mark up to ``batch_size`` unprocessed events as processed, returning those this transaction claimed"""
+    pending = select(PaymentEvent.id).where(PaymentEvent.processed_at.is_(None)).order_by(PaymentEvent.id).limit(batch_size)
+    
+    def claim(*where):
+        return update(PaymentEvent).where(
+            *where, PaymentEvent.processed_at.is_(None)
+        ).values(processed_at=now).execution_options(synchronize_session=False)
+    
+    if db.session.get_bind().dialect.update_returning:
+        claimed = list(db.session.execute(claim(PaymentEvent.id.in_(pending)).returning(PaymentEvent.id)).scalars())
+    else:
+        claimed = [
+            event_id for event_id in db.session.execute(pending).scalars().all()
+            if db.session.execute(claim(PaymentEvent.id == event_id)).rowcount
+        ]
+    if not claimed:
+        return []
+    
+    return db.session.query(
+        PaymentEvent.provider, PaymentEvent.event_type, PaymentEvent.payload
+    ).filter(PaymentEvent.id.in_(claimed)).order_by(PaymentEvent.id).all()
+
+def process_payment_events(batch_size=1000):
+    """
+    Apply one batch of queued events to their orders.
+    
+    Returns (events processed, orders updated); the caller commits. Events
+    for unknown orders are consumed without effect.
+    """
+    events = _claim_events(batch_size, datetime.utcnow())
+    if not events:
+        return 0, 0
+    
+    outcomes = {}
+    for provider, event_type, payload in events:
+        reference, status = event_outcome(provider, event_type, payload)
+        if reference and advances(outcomes.get(reference), status):
+            outcomes[reference] = status
+    
+    by_status = {}
+    for reference, status in outcomes.items():
+        by_status.setdefault(status, []).append(reference)
+    
+    updated = 0
+    for status, references in by_status.items():
+        earlier = [name for name, rank in PAYMENT_STATUS_RANK.items() if rank < PAYMENT_STATUS_RANK[status]]
+        for start in range(0, len(references), 500):
+            updated += db.session.execute(
+                update(Order).where(
+                    Order.order_number.in_(references[start:start + 500]),
+                    or_(Order.payment_status.in_(earlier), Order.payment_status.is_(None))
+                ).values(payment_status=status).execution_options(synchronize_session=False)
+            ).rowcount
+    return len(events), updated
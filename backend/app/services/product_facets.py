@@ -0,0 +1,84 @@
+"""
+Facet counts for product listings.
+
+All requested facets come from one grouped query over the active products
+matching the search: rows are grouped by (category, price bucket, whether the
+price passes the price filter) and the small result is folded into each
+facet in Python. Each facet ignores its own filter, so the category counts
+show what selecting another category would return under the current price
+range and the price histogram covers every bucket of the chosen category.
+"""
+
+from sqlalchemy import and_, case, func, literal
+from app import db
+from app.models.marketplace import Product
+
+FACETS = ('category', 'price')
+
+def parse_facets(raw):
+    """Parse a facets= parameter, raising ValueError on unknown names"""
+    if not raw:
+        return []
+    names = [name.strip() for name in raw.split(',') if name.strip()]
+    for name in names:
+        if name not in FACETS:
+            raise ValueError(f'Unknown facet: {name}')
+    return names
+
+def _price_bucket(edges):
+    """Index of the bucket [edges[i], edges[i + 1]) each price falls into"""
+    if len(edges) < 2:
+        return literal(0)
+    return case(
+        *[(Product.price < edge, index) for index, edge in enumerate(edges[1:])],
+        else_=len(edges) - 1
+    )
+
+def product_facets(query, names, category=None, min_price=None, max_price=None, edges=(0,)):
+    """
+    Count the products of ``query`` per facet value.
+    
+    ``query`` must carry every listing filter except category and price,
+    which are passed separately so each facet can leave its own out.
+    """
+    price_filters = []
+    if min_price:
+        price_filters.append(Product.price >= min_price)
+    if max_price:
+        price_filters.append(Product.price <= max_price)
+    in_price = case((and_(*price_filters), 1), else_=0) if price_filters else literal(1)
+    
+    groups = query.order_by(None).with_entities(
+        Product.category.label('category'),
+        _price_bucket(edges).label('bucket'),
+        in_price.label('in_price')
+    ).subquery()
+    
+    rows = db.session.query(
+        groups.c.category, groups.c.bucket, groups.c.in_price, func.count()
+    ).group_by(groups.c.category, groups.c.bucket, groups.c.in_price).all()
+    
+    categories = {}
+    buckets = [0] * len(edges)
+    for row_category, bucket, row_in_price, count in rows:
+        if row_in_price:
+            categories[row_category] = categories.get(row_category, 0) + count
+        if not category or row_category == category:
+            buckets[bucket] += count
+    
+    facets = {}
+    if 'category' in names:
+        facets['category'] = [
+            {'value': value, 'count': count}
+            for value, count in sorted(categories.items(), key=lambda item: (-item[1], item[0] or ''))
+        ]
+    if 'price' in names:
+        facets['price'] = [
+            {
+                'min': edges[index],
+                'max': edges[index + 1] if index + 1 < len(edges) else None,
+                'count': count
+            }
+            for index, count in enumerate(buckets)
+        ]
+    return facets
@@ -0,0 +1,178 @@
+"""
+Streaming bulk product import.
+
+Reads CSV or NDJSON incrementally from a binary stream, validates each row
+on its own and writes valid rows in chunks with a single executemany
+``INSERT`` per chunk. Invalid rows are reported back with their row number
+and never abort the rest of the import.
+"""
+
+import codecs
+import csv
+import json
+import uuid
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from app import db
+from app.models.marketplace import Product
+
+FORMATS = ('csv', 'ndjson')
+
+# Cap on errors echoed back so a bad file cannot produce an unbounded response
+MAX_REPORTED_ERRORS = 1000
+
+# Largest values the products columns hold: Numeric(10, 2) and a 32-bit Integer
+MAX_PRICE = Decimal('99999999.99')
+MAX_QUANTITY = 2 ** 31 - 1
+
+def make_slug(name):
+    """URL slug for a product name, made unique with a random suffix"""
+    return name.lower().replace(' ', '-') + '-' + str(uuid.uuid4())[:8]
+
+def _split_list(value):
+    """Lists arrive as JSON arrays in NDJSON and as '|'-separated cells in CSV"""
+    if value is None or value == '':
+        return []
+    if isinstance(value, list):
+        return value
+    return [part.strip() for part in str(value).split('|') if part.strip()]
+
+def iter_rows(stream, fmt):
+    """Yield (row_number, row dict or None, error) from a binary stream"""
+    text = codecs.getreader('utf-8')(stream)
+
+    if fmt == 'csv':
+        reader = csv.DictReader(text)
+        for number, row in enumerate(reader, start=1):
+            yield number, row, None
+        return
+
+    for number, line in enumerate(text, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            yield number, None, 'Invalid JSON'
+            continue
+        if not isinstance(row, dict):
+            yield number, None, 'Row must be a JSON object'
+            continue
+        yield number, row, None
+
+def validate_row(row, seller_id):
+    """Return (values, error) for one input row"""
+    for field in ('name', 'price', 'category'):
+        if row.get(field) is None or not str(row[field]).strip():
+            return None, f'{field} is required'
+
+    try:
+        price = Decimal(str(row['price']).strip())
+    except InvalidOperation:
+        return None, 'price must be a number'
+    # Decimal also parses NaN and Infinity
+    if not price.is_finite():
+        return None, 'price must be a number'
+    if price < 0:
+        return None, 'price must not be negative'
+    # Compared before rounding too, as quantize() fails on huge exponents
+    if price > MAX_PRICE or price.quantize(Decimal('0.01')) > MAX_PRICE:
+        return None, f'price must be at most {MAX_PRICE}'
+    price = price.quantize(Decimal('0.01'))
+
+    try:
+        quantity = int(row.get('quantity') or 0)
+    except (TypeError, ValueError, OverflowError):
+        return None, 'quantity must be an integer'
+    if not 0 <= quantity <= MAX_QUANTITY:
+        return None, f'quantity must be between 0 and {MAX_QUANTITY}'
+
+    name = str(row['name']).strip()
+    if len(name) > 200:
+        return None, 'name must be at most 200 characters'
+
+    return {
+        'name': name,
+        'description': row.get('description') or None,
+        'price': price,
+        'quantity': quantity,
+        'category': str(row['category']).strip(),
+        'image_url': row.get('image_url') or None,
+        'images': _split_list(row.get('images')),
+        'meta_description': row.get('meta_description') or None,
+        'tags': _split_list(row.get('tags')),
+        'seller_id': seller_id,
+        'slug': make_slug(name)
+    }, None
+
+class ImportResult:
+    """Running totals and per-row errors of an import"""
+
+    def __init__(self):
+        self.imported = 0
+        self.failed = 0
+        self.errors = []
+
+    def add_error(self, row_number, error):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({'row': row_number, 'error': error})
+
+    def to_dict(self):
+        return {
+            'imported': self.imported,
+            'failed': self.failed,
+            'errors': self.errors,
+            'errors_truncated': self.failed > len(self.errors)
+        }
+
+def _flush_chunk(chunk, result):
+    """Insert a chunk in one statement, retrying row by row if it conflicts"""
+    try:
+        db.session.execute(insert(Product), [values for _, values in chunk])
+        db.session.commit()
+        result.imported += len(chunk)
+        return
+    except IntegrityError:
+        db.session.rollback()
+
+    for row_number, values in chunk:
+        try:
+            db.session.execute(insert(Product), [values])
+            db.session.commit()
+            result.imported += 1
+        except IntegrityError:
+            db.session.rollback()
+            result.add_error(row_number, 'Conflicts with an existing product')
+
+def import_products(stream, fmt, seller_id, chunk_size=1000, result=None):
+    """
+    Import products for ``seller_id`` from a CSV/NDJSON stream.
+
+    Chunks are committed as they fill, so pass ``result`` to still know
+    what was imported when the stream fails part way.
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f'Unsupported format: {fmt}')
+
+    result = result if result is not None else ImportResult()
+    chunk = []
+
+    for row_number, row, error in iter_rows(stream, fmt):
+        if error is None:
+            values, error = validate_row(row, seller_id)
+        if error is not None:
+            result.add_error(row_number, error)
+            continue
+
+        chunk.append((row_number, values))
+        if len(chunk) >= chunk_size:
+            _flush_chunk(chunk, result)
+            chunk = []
+
+    if chunk:
+        _flush_chunk(chunk, result)
+
+    return result
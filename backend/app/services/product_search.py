@@ -0,0 +1,95 @@
+"""
+Full-text product search.
+
+Queries the index declared next to the ``Product`` model (FTS5 on SQLite,
+a GIN-indexed tsvector on PostgreSQL) instead of scanning ``products`` with
+``ILIKE``. Each search word is matched as a prefix so results keep up with
+search-as-you-type clients.
+
+The index is created with the tables by ``db.create_all``. A database
+created before it existed keeps working with the old ``ILIKE`` filter
+until ``flask rebuild-search-index`` builds and fills the index; whether
+it exists is checked once per process and engine.
+"""
+
+import re
+from sqlalchemy import or_, func, inspect, select, table, column, literal_column, text
+from app import db
+from app.models.marketplace import Product, PRODUCT_SEARCH_DDL
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+_products_fts = table('products_fts', column('rowid'))
+
+# Engine -> whether its database has the search index
+_index_available = {}
+
+def _tokenize(term):
+    return _TOKEN_RE.findall(term.lower())
+
+def _dialect():
+    return db.session.get_bind().dialect.name
+
+def _has_search_index(dialect):
+    engine = db.session.get_bind()
+    available = _index_available.get(engine)
+    if available is None:
+        inspector = inspect(engine)
+        if dialect == 'sqlite':
+            available = inspector.has_table('products_fts')
+        else:
+            available = any(column['name'] == 'search_vector' for column in inspector.get_columns('products'))
+        _index_available[engine] = available
+    return available
+
+def search_products(query, term):
+    """
+    Restrict a Product query to rows matching ``term``.
+    
+    Returns ``(query, relevance)`` where ``relevance`` is an ORDER BY clause
+    ranking the best matches first (BM25 on SQLite, ts_rank on PostgreSQL),
+    or None when the backend cannot rank results. Terms without any word
+    characters, and databases without a full-text index, use ILIKE.
+    """
+    tokens = _tokenize(term)
+    dialect = _dialect() if tokens else None
+    if dialect in ('sqlite', 'postgresql') and not _has_search_index(dialect):
+        dialect = None
+    
+    if dialect == 'sqlite':
+        match = ' '.join(f'"{token}"*' for token in tokens)
+        # bm25() scores better matches lower; weight name hits over description hits.
+        # LIMIT -1 stops SQLite flattening the subquery into the outer join, where
+        # the planner may drive from products and run the MATCH once per row.
+        matches = select(
+            _products_fts.c.rowid,
+            func.bm25(literal_column('products_fts'), 10.0, 1.0).label('rank')
+        ).where(literal_column('products_fts').match(match)).limit(-1).subquery('products_fts_match')
+        query = query.join(matches, matches.c.rowid == Product.id)
+        return query, matches.c.rank.asc()
+    
+    if dialect == 'postgresql':
+        vector = literal_column('products.search_vector')
+        tsquery = func.to_tsquery('english', ' & '.join(f'{token}:*' for token in tokens))
+        query = query.filter(vector.op('@@')(tsquery))
+        return query, func.ts_rank(vector, tsquery).desc()
+    
+    query = query.filter(
+        or_(
+            Product.name.ilike(f'%{term}%'),
+            Product.description.ilike(f'%{term}%')
+        )
+    )
+    return query, None
+
+def rebuild_search_index():
+    """Create any missing search index objects and repopulate the index"""
+    dialect = _dialect()
+    for statement in PRODUCT_SEARCH_DDL.get(dialect, []):
+        db.session.execute(text(statement))
+    
+    if dialect == 'sqlite':
+        db.session.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+    
+    db.session.commit()
+    _index_available.pop(db.session.get_bind(), None)
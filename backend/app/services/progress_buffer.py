@@ -0,0 +1,175 @@
+"""
+Lesson progress heartbeats.
+
+Video players report a student's progress through a course every few
+seconds. Committing each report would turn every viewer into a stream of
+single-row transactions, so reports are kept in memory instead, one value
+per enrollment (a newer report replaces the older one), and a background
+thread writes whatever is pending every ``PROGRESS_FLUSH_INTERVAL``
+seconds with one ``UPDATE`` per 500 enrollments.
+
+Progress never goes backwards in the database, so reports arriving late or
+from another worker process cannot undo newer ones, and ``completed_at`` is
+set by the flush that takes an enrollment to 100%. Reports still in memory
+when a process dies are lost; the player's next heartbeat replaces them.
+"""
+
+import atexit
+import os
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, case, or_, update
+from app import db
+from app.models.education import Enrollment
+
+# Enrollments written per UPDATE
+FLUSH_CHUNK_SIZE = 500
+
+def write_progress(progress, now=None):
+    """
+    Raise ``progress`` ({enrollment_id: percentage}) in the database.
+    
+    Enrollments already at or past the reported value are left alone.
+    Returns the number of enrollments updated; the caller commits.
+    """
+    now = now or datetime.utcnow()
+    enrollments = Enrollment.__table__
+    # No cached response shows progress, so the write goes through the
+    # connection and leaves the 'courses' response cache alone
+    connection = db.session.connection()
+    
+    updated = 0
+    # Sorted so concurrent flushes from several workers lock rows in the same order
+    enrollment_ids = sorted(progress)
+    for start in range(0, len(enrollment_ids), FLUSH_CHUNK_SIZE):
+        chunk = {enrollment_id: progress[enrollment_id] for enrollment_id in enrollment_ids[start:start + FLUSH_CHUNK_SIZE]}
+        reported = case(chunk, value=enrollments.c.id)
+        updated += connection.execute(
+            update(enrollments).where(
+                enrollments.c.id.in_(chunk),
+                or_(enrollments.c.progress.is_(None), enrollments.c.progress < reported)
+            ).values(
+                progress=reported,
+                completed_at=case(
+                    (and_(enrollments.c.completed_at.is_(None), reported >= 100.0), now),
+                    else_=enrollments.c.completed_at
+                )
+            )
+        ).rowcount
+    return updated
+
+class ProgressBuffer:
+    """Latest reported progress per enrollment, flushed to the database in batches"""
+    
+    def __init__(self, app, interval=5.0, max_entries=50000):
+        self.app = app
+        self.interval = interval
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._enrollment_ids = OrderedDict()
+        self._wake = threading.Event()
+        self._flusher_pid = None
+        self.flushes = 0
+        self.written = 0
+    
+    def enrollment_id(self, student_id, course_id):
+        """Id of the student's enrollment in the course, or None; remembered after the first lookup"""
+        key = (student_id, course_id)
+        with self._lock:
+            enrollment_id = self._enrollment_ids.get(key)
+            if enrollment_id is not None:
+                self._enrollment_ids.move_to_end(key)
+                return enrollment_id
+        
+        enrollment_id = db.session.query(Enrollment.id).filter_by(
+            student_id=student_id,
+            course_id=course_id
+        ).scalar()
+        if enrollment_id is not None:
+            with self._lock:
+                self._enrollment_ids[key] = enrollment_id
+                if len(self._enrollment_ids) > self.max_entries:
+                    self._enrollment_ids.popitem(last=False)
+        return enrollment_id
+    
+    def record(self, enrollment_id, progress):
+        """Buffer a report, replacing any report for the same enrollment that is still pending"""
+        if self.interval <= 0:
+            # Buffering disabled: write through
+            write_progress({enrollment_id: progress})
+            db.session.commit()
+            return
+        
+        self._start_flusher()
+        with self._lock:
+            self._pending[enrollment_id] = progress
+            full = len(self._pending) >= self.max_entries
+        if full:
+            self._wake.set()
+    
+    def pending(self):
+        with self._lock:
+            return len(self._pending)
+    
+    def flush(self):
+        """Write every pending report in this app context; returns the enrollments updated"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        
+        try:
+            updated = write_progress(pending)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            # Put the batch back unless newer reports arrived in the meantime
+            with self._lock:
+                for enrollment_id, progress in pending.items():
+                    self._pending.setdefault(enrollment_id, progress)
+            raise
+        
+        with self._lock:
+            self.flushes += 1
+            self.written += updated
+        return updated
+    
+    def _flush_in_app_context(self):
+        with self.app.app_context():
+            return self.flush()
+    
+    def _start_flusher(self):
+        # Once per process: a thread started before the server forks its workers does not survive the fork
+        if self._flusher_pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher_pid == os.getpid():
+                return
+            self._flusher_pid = os.getpid()
+        
+        def run():
+            while True:
+                self._wake.wait(self.interval)
+                self._wake.clear()
+                try:
+                    self._flush_in_app_context()
+                except Exception:
+                    self.app.logger.exception('Failed to flush lesson progress')
+        
+        threading.Thread(target=run, name='progress-flusher', daemon=True).start()
+        atexit.register(self._flush_in_app_context)
+
+def init_progress_buffer(app):
+    app.config.setdefault('PROGRESS_FLUSH_INTERVAL', 5.0)
+    app.config.setdefault('PROGRESS_BUFFER_MAX_ENTRIES', 50000)
+    app.extensions['progress_buffer'] = ProgressBuffer(
+        app,
+        app.config['PROGRESS_FLUSH_INTERVAL'],
+        app.config['PROGRESS_BUFFER_MAX_ENTRIES']
+    )
+
+def get_progress_buffer():
+    return current_app.extensions['progress_buffer']
@@ -0,0 +1,92 @@
+"""
+Quiz grading.
+
+A quiz's answer key (points, type and accepted answers per question) is
+loaded with one query and cached in-process under the quiz id, tagged
+with ``Quiz.updated_at``. Editing a question or answer through the ORM
+bumps ``updated_at`` (see ``app.models.education``), so every process
+notices the change on its next submission and reloads the key; grading an
+attempt is then a pure in-memory pass over its answers.
+
+Submitted answers are keyed by question id and may carry:
+
+- ``answer_id``: one choice, correct if it is any of the correct answers;
+- ``answer_ids``: several choices, correct only if they are exactly the
+  correct answers;
+- ``text``: free text, correct if it matches a correct answer's text
+  ignoring case and surrounding or repeated whitespace.
+
+As before, only the questions that were answered count towards the
+maximum score.
+"""
+
+from collections import namedtuple
+from app import db
+from app.models.education import Question, Answer
+from app.utils.cache import VersionedCache
+
+KeyEntry = namedtuple('KeyEntry', 'points question_type correct_ids correct_texts')
+
+_answer_keys = VersionedCache()
+
+def normalize_text(text):
+    return ' '.join(str(text).split()).casefold()
+
+def load_answer_key(quiz_id):
+    """Read {question_id: KeyEntry} for a quiz in one query"""
+    rows = db.session.query(
+        Question.id, Question.points, Question.question_type,
+        Answer.id, Answer.answer_text, Answer.is_correct
+    ).outerjoin(Answer, Answer.question_id == Question.id).filter(Question.quiz_id == quiz_id).all()
+    
+    questions = {}
+    for question_id, points, question_type, answer_id, answer_text, is_correct in rows:
+        entry = questions.setdefault(question_id, (points or 0, question_type, set(), set()))
+        if answer_id is not None and is_correct:
+            entry[2].add(answer_id)
+            entry[3].add(normalize_text(answer_text))
+    
+    return {
+        question_id: KeyEntry(points, question_type, frozenset(correct_ids), frozenset(correct_texts))
+        for question_id, (points, question_type, correct_ids, correct_texts) in questions.items()
+    }
+
+def get_answer_key(quiz):
+    """Return the cached answer key of ``quiz``, reloading it if the quiz changed since it was cached"""
+    return _answer_keys.get(quiz.id, quiz.updated_at, lambda: load_answer_key(quiz.id))
+
+def clear_answer_keys():
+    _answer_keys.clear()
+
+def is_correct(entry, answer_data):
+    """Whether one submitted answer is correct under its question's key entry"""
+    if not isinstance(answer_data, dict):
+        return False
+    if 'answer_ids' in answer_data:
+        answer_ids = answer_data['answer_ids']
+        if not isinstance(answer_ids, list) or not all(isinstance(answer_id, int) for answer_id in answer_ids):
+            return False
+        return bool(entry.correct_ids) and set(answer_ids) == entry.correct_ids
+    if 'text' in answer_data and entry.question_type == 'text':
+        return isinstance(answer_data['text'], str) and normalize_text(answer_data['text']) in entry.correct_texts
+    answer_id = answer_data.get('answer_id')
+    return isinstance(answer_id, int) and answer_id in entry.correct_ids
+
+def grade_answers(answer_key, answers):
+    """Return (score, max score, percentage) of submitted ``answers`` against an answer key"""
+    total_score = 0
+    max_possible = 0
+    
+    for question_id, answer_data in (answers or {}).items():
+        try:
+            entry = answer_key.get(int(question_id))
+        except (TypeError, ValueError):
+            continue
+        if entry is None:
+            continue
+        max_possible += entry.points
+        if is_correct(entry, answer_data):
+            total_score += entry.points
+    
+    percentage = (total_score / max_possible * 100) if max_possible > 0 else 0
+    return total_score, max_possible, percentage
@@ -0,0 +1,189 @@
+"""
+Bulk re-grading of quiz attempts.
+
+Fixing a quiz's answer key (a wrong ``Answer.is_correct``, say) leaves the
+``score``, ``percentage`` and ``passed`` stored on earlier attempts stale.
+``regrade_quiz`` walks the quiz's attempts in id order, a chunk at a time,
+grades each chunk against the current key with NumPy and writes back only
+the attempts whose result changed, with one executemany UPDATE per chunk.
+
+The results are exactly those of ``app.services.quiz_grading``: each
+chunk's answers are flattened into one row per answered question, then
+choices are matched against the key's (question, answer) pairs and the
+points summed per attempt in bulk. Free-text answers are still compared
+one by one, after normalization.
+"""
+
+from collections import namedtuple
+from datetime import datetime
+from sqlalchemy import update
+from app import db
+from app.models.education import QuizAttempt
+from app.services.quiz_grading import load_answer_key, normalize_text
+
+# One entry per answered question (row: submission, question: position in
+# question_ids, correct: bool), plus every answer option picked
+# (chosen_answers: entry, chosen_ids: answer id, 0 when not a known option)
+Responses = namedtuple('Responses', 'question_ids rows questions correct chosen_answers chosen_ids')
+
+def score_responses(answer_key, submissions, max_answer_id=0):
+    """
+    Flatten submitted ``answers`` dicts and mark each answer right or wrong.
+    
+    Answer ids above ``max_answer_id`` and above every correct answer's id
+    are treated as unknown options.
+    """
+    import numpy as np
+    
+    question_ids = sorted(answer_key)
+    position = {question_id: index for index, question_id in enumerate(question_ids)}
+    entries = [answer_key[question_id] for question_id in question_ids]
+    correct_counts = np.array([len(entry.correct_ids) for entry in entries], dtype=np.int64)
+    
+    # Correct (question, answer id) pairs encoded as question position * width + answer id
+    width = max([max_answer_id] + [max(entry.correct_ids) for entry in entries if entry.correct_ids]) + 1
+    correct_pairs = np.array(sorted(
+        index * width + answer_id
+        for index, entry in enumerate(entries)
+        for answer_id in entry.correct_ids
+    ), dtype=np.int64)
+    
+    # Submissions arrive with the question ids as JSON object keys
+    by_key = {str(question_id): index for question_id, index in position.items()}
+    
+    counts = []  # answered questions per submission
+    questions = []  # one per answered question
+    single, single_ids = [], []  # answer_id answers
+    multiple, members, member_ids = [], [], []  # answer_ids answers and their choices
+    text_correct = []
+    
+    for answers in submissions:
+        start = len(questions)
+        if isinstance(answers, dict):
+            for question_id, answer_data in answers.items():
+                index = by_key.get(question_id)
+                if index is None:
+                    try:
+                        index = position.get(int(question_id))
+                    except (TypeError, ValueError):
+                        continue
+                    if index is None:
+                        continue
+                
+                questions.append(index)
+                if not isinstance(answer_data, dict):
+                    continue
+                if 'answer_ids' in answer_data:
+                    answer_ids = answer_data['answer_ids']
+                    if isinstance(answer_ids, list) and all(isinstance(answer_id, int) for answer_id in answer_ids):
+                        answer = len(questions) - 1
+                        multiple.append(answer)
+                        members.extend([answer] * len(answer_ids))
+                        member_ids.extend(answer_ids)
+                elif 'text' in answer_data and entries[index].question_type == 'text':
+                    text = answer_data['text']
+                    if isinstance(text, str) and normalize_text(text) in entries[index].correct_texts:
+                        text_correct.append(len(questions) - 1)
+                else:
+                    answer_id = answer_data.get('answer_id')
+                    if isinstance(answer_id, int) and 0 < answer_id < width:
+                        single.append(len(questions) - 1)
+                        single_ids.append(answer_id)
+        counts.append(len(questions) - start)
+    
+    rows = np.repeat(np.arange(len(submissions)), counts)
+    questions = np.array(questions, dtype=np.int64)
+    single = np.array(single, dtype=np.int64)
+    single_ids = np.array(single_ids, dtype=np.int64)
+    correct = np.zeros(len(questions), dtype=bool)
+    correct[single] = np.isin(questions[single] * width + single_ids, correct_pairs)
+    
+    # Ids outside the options become 0, which never matches; one wrong choice is enough to fail
+    chosen = np.unique(np.array(members, dtype=np.int64) * width + np.array(
+        [answer_id if 0 < answer_id < width else 0 for answer_id in member_ids], dtype=np.int64
+    ))
+    chosen_answers, chosen_ids = chosen // width, chosen % width
+    if multiple:
+        multiple = np.array(multiple, dtype=np.int64)
+        hits = np.isin(questions[chosen_answers] * width + chosen_ids, correct_pairs)
+        distinct = np.bincount(chosen_answers, minlength=len(questions))[multiple]
+        matched = np.bincount(chosen_answers, weights=hits, minlength=len(questions))[multiple]
+        needed = correct_counts[questions[multiple]]
+        correct[multiple] = (needed > 0) & (distinct == needed) & (matched == needed)
+    
+    correct[text_correct] = True
+    
+    return Responses(
+        question_ids, rows, questions, correct,
+        np.concatenate([single, chosen_answers]), np.concatenate([single_ids, chosen_ids])
+    )
+
+def attempt_scores(answer_key, responses, submission_count):
+    """(scores, max scores, percentages) arrays per submission from ``score_responses``"""
+    import numpy as np
+    
+    points = np.array([answer_key[question_id].points for question_id in responses.question_ids], dtype=np.float64)
+    weights = points[responses.questions]
+    max_scores = np.bincount(responses.rows, weights=weights, minlength=submission_count)
+    scores = np.bincount(responses.rows, weights=weights * responses.correct, minlength=submission_count)
+    percentages = np.divide(scores, max_scores, out=np.zeros(submission_count), where=max_scores > 0) * 100
+    return scores, max_scores, percentages
+
+def grade_attempts(answer_key, submissions):
+    """Grade a list of submitted ``answers`` dicts; returns (scores, max scores, percentages) arrays"""
+    return attempt_scores(answer_key, score_responses(answer_key, submissions), len(submissions))
+
+def regrade_quiz(quiz, chunk_size=5000):
+    """
+    Re-grade every attempt at ``quiz`` against its current answer key.
+    
+    Yields (attempts graded, attempts changed) after each chunk so the
+    caller can commit and report progress. The key is read fresh rather
+    than from the per-process cache, and the quiz is touched so that
+    workers holding a key cached before a fix made outside the ORM reload
+    it too.
+    """
+    import numpy as np
+    
+    quiz_id, passing_score = quiz.id, quiz.passing_score
+    answer_key = load_answer_key(quiz_id)
+    quiz.updated_at = datetime.utcnow()
+    
+    last_id = 0
+    while True:
+        attempts = db.session.query(
+            QuizAttempt.id, QuizAttempt.answers, QuizAttempt.score,
+            QuizAttempt.max_score, QuizAttempt.percentage, QuizAttempt.passed
+        ).filter(
+            QuizAttempt.quiz_id == quiz_id,
+            QuizAttempt.id > last_id
+        ).order_by(QuizAttempt.id).limit(chunk_size).all()
+        if not attempts:
+            return
+        last_id = attempts[-1].id
+        
+        scores, max_scores, percentages = grade_attempts(answer_key, [attempt.answers for attempt in attempts])
+        passed = percentages >= passing_score
+        
+        # Stored NULLs become NaN and always count as changed
+        changed = (
+            (np.array([attempt.score for attempt in attempts], dtype=np.float64) != scores) |
+            (np.array([attempt.max_score for attempt in attempts], dtype=np.float64) != max_scores) |
+            (np.array([attempt.percentage for attempt in attempts], dtype=np.float64) != percentages) |
+            (np.array([attempt.passed for attempt in attempts], dtype=object) != passed)
+        )
+        
+        updates = [
+            {
+                'id': attempts[index].id,
+                'score': float(scores[index]),
+                'max_score': float(max_scores[index]),
+                'percentage': float(percentages[index]),
+                'passed': bool(passed[index])
+            }
+            for index in np.flatnonzero(changed).tolist()
+        ]
+        if updates:
+            db.session.execute(update(QuizAttempt), updates)
+        
+        yield len(attempts), len(updates)
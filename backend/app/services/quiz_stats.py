@@ -0,0 +1,151 @@
+"""
+Quiz item analysis.
+
+For every question of a quiz ``refresh_quiz_stats`` maintains, in
+``question_stats``:
+
+- difficulty: the share of responses that were correct (classical p-value);
+- discrimination: the point-biserial correlation between answering the
+  question correctly and the attempt's percentage, so good questions are
+  answered correctly by the students who do well overall;
+- answer_counts: how often each answer option was picked, which shows
+  the distractors that attract students and those nobody picks.
+
+Only questions an attempt answered count as responses, as in grading.
+Everything is derived from running sums (responses, correct, and the sums
+of y, y^2 and x*y over responses), so the job reads only attempts newer
+than the last one it saw and adds them in. Attempts are graded in chunks
+with the NumPy grader of ``app.services.quiz_regrade`` and summed per
+question with ``np.bincount``. When the quiz itself changed (an edited
+question or answer key, or a re-grade) the statistics are recomputed from
+scratch. The analytics endpoint only reads the stored rows.
+"""
+
+import math
+from collections import Counter
+from datetime import datetime
+from sqlalchemy import func, or_, select
+from app import db
+from app.models.education import Quiz, Question, Answer, QuizAttempt, QuizStats, QuestionStats
+from app.services.quiz_grading import load_answer_key
+from app.services.quiz_regrade import attempt_scores, score_responses
+
+def stale_quiz_ids():
+    """Ids of quizzes with attempts their statistics do not include yet, or that changed since"""
+    latest = select(func.max(QuizAttempt.id)).where(QuizAttempt.quiz_id == Quiz.id).scalar_subquery()
+    rows = db.session.query(Quiz.id).outerjoin(QuizStats, QuizStats.quiz_id == Quiz.id).filter(
+        latest.isnot(None),
+        or_(
+            QuizStats.quiz_id.is_(None),
+            QuizStats.quiz_version.is_distinct_from(Quiz.updated_at),
+            latest > QuizStats.last_attempt_id
+        )
+    ).order_by(Quiz.id).all()
+    return [quiz_id for quiz_id, in rows]
+
+def point_biserial(responses, correct, sum_y, sum_y2, sum_xy):
+    """Correlation of a 0/1 item score with y from running sums, or None when undefined"""
+    spread_x = responses * correct - correct * correct
+    spread_y = responses * sum_y2 - sum_y * sum_y
+    if responses < 2 or spread_x <= 0 or spread_y <= 0:
+        return None
+    return (responses * sum_xy - correct * sum_y) / math.sqrt(spread_x * spread_y)
+
+def refresh_quiz_stats(quiz, chunk_size=5000):
+    """
+    Bring the item analysis of ``quiz`` up to date.
+    
+    Returns the number of attempts added; the caller commits.
+    """
+    import numpy as np
+    
+    stats = QuizStats.query.get(quiz.id)
+    if stats is None:
+        stats = QuizStats(quiz_id=quiz.id)
+        db.session.add(stats)
+    if stats.quiz_version != quiz.updated_at:
+        QuestionStats.query.filter_by(quiz_id=quiz.id).delete()
+        stats.attempt_count = 0
+        stats.percentage_sum = 0.0
+        stats.last_attempt_id = 0
+        stats.quiz_version = quiz.updated_at
+    
+    answer_key = load_answer_key(quiz.id)
+    question_ids = sorted(answer_key)
+    options = db.session.query(Answer.question_id, Answer.id).join(
+        Question, Question.id == Answer.question_id
+    ).filter(Question.quiz_id == quiz.id).all()
+    max_answer_id = max((answer_id for _, answer_id in options), default=0)
+    # (question position, answer id) pairs of real options, encoded like score_responses does
+    width = max_answer_id + 1
+    position = {question_id: index for index, question_id in enumerate(question_ids)}
+    option_codes = np.array([position[question_id] * width + answer_id for question_id, answer_id in options], dtype=np.int64)
+    
+    size = len(question_ids)
+    responses, correct = np.zeros(size), np.zeros(size)
+    sum_y, sum_y2, sum_xy = np.zeros(size), np.zeros(size), np.zeros(size)
+    picks = Counter()
+    added, percentage_sum = 0, 0.0
+    
+    last_id = stats.last_attempt_id or 0
+    while True:
+        attempts = db.session.query(QuizAttempt.id, QuizAttempt.answers).filter(
+            QuizAttempt.quiz_id == quiz.id,
+            QuizAttempt.id > last_id
+        ).order_by(QuizAttempt.id).limit(chunk_size).all()
+        if not attempts:
+            break
+        last_id = attempts[-1].id
+        
+        submissions = [attempt.answers for attempt in attempts]
+        scored = score_responses(answer_key, submissions, max_answer_id)
+        _, _, percentages = attempt_scores(answer_key, scored, len(submissions))
+        
+        x = scored.correct.astype(np.float64)
+        y = percentages[scored.rows]
+        responses += np.bincount(scored.questions, minlength=size)
+        correct += np.bincount(scored.questions, weights=x, minlength=size)
+        sum_y += np.bincount(scored.questions, weights=y, minlength=size)
+        sum_y2 += np.bincount(scored.questions, weights=y * y, minlength=size)
+        sum_xy += np.bincount(scored.questions, weights=x * y, minlength=size)
+        
+        codes = scored.questions[scored.chosen_answers] * width + scored.chosen_ids
+        codes, counts = np.unique(codes[np.isin(codes, option_codes)], return_counts=True)
+        picks.update(dict(zip(codes.tolist(), counts.tolist())))
+        
+        added += len(attempts)
+        percentage_sum += float(percentages.sum())
+    
+    existing = {row.question_id: row for row in QuestionStats.query.filter_by(quiz_id=quiz.id)}
+    option_ids = {}
+    for question_id, answer_id in options:
+        option_ids.setdefault(question_id, []).append(answer_id)
+    
+    for index, question_id in enumerate(question_ids):
+        row = existing.get(question_id)
+        if row is None:
+            row = QuestionStats(
+                question_id=question_id, quiz_id=quiz.id, responses=0, correct=0,
+                sum_y=0.0, sum_y2=0.0, sum_xy=0.0, answer_counts={}
+            )
+            db.session.add(row)
+        
+        row.responses += int(responses[index])
+        row.correct += int(correct[index])
+        row.sum_y += float(sum_y[index])
+        row.sum_y2 += float(sum_y2[index])
+        row.sum_xy += float(sum_xy[index])
+        previous = row.answer_counts or {}
+        row.answer_counts = {
+            str(answer_id): previous.get(str(answer_id), 0) + picks[index * width + answer_id]
+            for answer_id in sorted(option_ids.get(question_id, []))
+        }
+        row.difficulty = row.correct / row.responses if row.responses else None
+        row.discrimination = point_biserial(row.responses, row.correct, row.sum_y, row.sum_y2, row.sum_xy)
+    
+    stats.attempt_count = (stats.attempt_count or 0) + added
+    stats.percentage_sum = (stats.percentage_sum or 0.0) + percentage_sum
+    stats.mean_percentage = stats.percentage_sum / stats.attempt_count if stats.attempt_count else None
+    stats.last_attempt_id = last_id
+    stats.computed_at = datetime.utcnow()
+    return added
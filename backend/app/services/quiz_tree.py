@@ -0,0 +1,73 @@
+"""
+Quiz content for students.
+
+``load_quiz_tree`` reads a quiz's questions and their answers, in display
+order, with one joined query and serializes them straight into the shape
+``get_quiz`` returns: the fields of ``Quiz.to_dict``/``Question.to_dict``,
+with answers stripped of ``is_correct``. The result is cached per quiz and
+tagged with ``Quiz.updated_at``, which changes whenever the quiz or one of
+its questions or answers is edited.
+"""
+
+from app import db
+from app.models.education import Question, Answer
+from app.utils.cache import VersionedCache
+
+_quiz_trees = VersionedCache()
+
+def load_quiz_tree(quiz):
+    """Serialize ``quiz`` with its ordered questions and answers, leaving out which answers are correct"""
+    rows = db.session.query(
+        Question.id, Question.question_text, Question.question_type, Question.points,
+        Question.order, Question.image_url, Question.created_at,
+        Answer.id, Answer.answer_text, Answer.order
+    ).outerjoin(Answer, Answer.question_id == Question.id).filter(
+        Question.quiz_id == quiz.id
+    ).order_by(Question.order, Question.id, Answer.order, Answer.id).all()
+    
+    questions = []
+    by_id = {}
+    for (question_id, question_text, question_type, points, question_order, image_url, created_at,
+            answer_id, answer_text, answer_order) in rows:
+        question = by_id.get(question_id)
+        if question is None:
+            question = by_id[question_id] = {
+                'id': question_id,
+                'quiz_id': quiz.id,
+                'question_text': question_text,
+                'question_type': question_type,
+                'points': points,
+                'order': question_order,
+                'image_url': image_url,
+                'answers': [],
+                'created_at': created_at.isoformat() if created_at else None
+            }
+            questions.append(question)
+        if answer_id is not None:
+            question['answers'].append({
+                'id': answer_id,
+                'question_id': question_id,
+                'answer_text': answer_text,
+                'order': answer_order
+            })
+    
+    return {
+        'id': quiz.id,
+        'title': quiz.title,
+        'description': quiz.description,
+        'course_id': quiz.course_id,
+        'time_limit': quiz.time_limit,
+        'max_attempts': quiz.max_attempts,
+        'passing_score': quiz.passing_score,
+        'is_published': quiz.is_published,
+        'question_count': len(questions),
+        'questions': questions,
+        'created_at': quiz.created_at.isoformat() if quiz.created_at else None
+    }
+
+def get_student_quiz(quiz):
+    """Return the cached student view of ``quiz``, rebuilding it if the quiz was edited since"""
+    return _quiz_trees.get(quiz.id, quiz.updated_at, lambda: load_quiz_tree(quiz))
+
+def clear_quiz_trees():
+    _quiz_trees.clear()
@@ -0,0 +1,214 @@
+"""
+"Frequently bought together" recommendations.
+
+The co-purchase model is the sparse product x product matrix C = A^T A,
+where A is the order x product incidence matrix of ``order_items``: C[i, j]
+counts the orders containing both products. Its non-zero entries are kept
+in ``product_copurchases`` and each product's K best neighbors in the
+compact ``product_neighbors`` table, which the related-products endpoint
+reads with a single primary-key range scan.
+
+``rebuild_related_products`` recomputes everything from the order history
+with NumPy; ``record_orders`` folds newly created orders in incrementally by
+upserting their pair counts and re-ranking only the products they touch.
+Orders are claimed through ``Order.copurchases_recorded`` so each one is
+counted exactly once. Cancellations are only accounted for by a rebuild.
+
+Checkout only records the pair counts of the order just placed and queues
+its products in ``product_neighbor_refreshes``; the record-related-products
+job re-ranks them with ``refresh_stale_neighbors``, keeping the window
+functions over ``product_copurchases`` out of the request.
+"""
+
+from collections import Counter
+from itertools import permutations
+from sqlalchemy import delete, func, insert, select, update
+from app import db
+from app.models.marketplace import Order, OrderItem, ProductCopurchase, ProductNeighbor, ProductNeighborRefresh
+from app.utils.upsert import CHUNK_SIZE, insert_ignore, upsert_add
+
+def _chunks(items, size=CHUNK_SIZE):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _claim_orders(criteria, batch_size):
+    """Flag up to ``batch_size`` unrecorded orders as recorded, returning the ids this transaction flagged"""
+    pending = select(Order.id).where(Order.copurchases_recorded == False, *criteria).order_by(Order.id).limit(batch_size)
+    
+    def claim(*where):
+        return update(Order).where(
+            *where, Order.copurchases_recorded == False
+        ).values(copurchases_recorded=True).execution_options(synchronize_session=False)
+    
+    if db.session.get_bind().dialect.update_returning:
+        return list(db.session.execute(claim(Order.id.in_(pending)).returning(Order.id)).scalars())
+    
+    return [
+        order_id for order_id in db.session.execute(pending).scalars().all()
+        if db.session.execute(claim(Order.id == order_id)).rowcount
+    ]
+
+def refresh_neighbors(product_ids, top_k):
+    """Re-rank the top-K neighbors of ``product_ids`` from the stored counts"""
+    for chunk in _chunks(sorted(product_ids)):
+        db.session.execute(
+            delete(ProductNeighbor).where(ProductNeighbor.product_id.in_(chunk)).execution_options(synchronize_session=False)
+        )
+        ranked = select(
+            ProductCopurchase.product_id,
+            ProductCopurchase.related_id,
+            ProductCopurchase.count,
+            func.row_number().over(
+                partition_by=ProductCopurchase.product_id,
+                order_by=(ProductCopurchase.count.desc(), ProductCopurchase.related_id)
+            ).label('rank')
+        ).where(ProductCopurchase.product_id.in_(chunk)).subquery()
+        db.session.execute(insert(ProductNeighbor).from_select(
+            ['product_id', 'rank', 'related_id', 'score'],
+            select(ranked.c.product_id, ranked.c.rank, ranked.c.related_id, ranked.c.count).where(ranked.c.rank <= top_k)
+        ))
+
+def refresh_stale_neighbors(top_k, batch_size=500):
+    """Re-rank one batch of the products queued by ``record_orders``, returning how many"""
+    product_ids = db.session.execute(
+        select(ProductNeighborRefresh.product_id).order_by(ProductNeighborRefresh.product_id).limit(batch_size)
+    ).scalars().all()
+    if not product_ids:
+        return 0
+    
+    # Dequeued first, so counts recorded meanwhile queue the product again
+    db.session.execute(
+        delete(ProductNeighborRefresh).where(
+            ProductNeighborRefresh.product_id.in_(product_ids)
+        ).execution_options(synchronize_session=False)
+    )
+    refresh_neighbors(product_ids, top_k)
+    return len(product_ids)
+
+def record_orders(top_k, order_ids=None, batch_size=500, rerank=True):
+    """
+    Count not yet recorded orders into the model, one batch per call.
+    
+    Restrict to ``order_ids`` to record specific orders (e.g. one that was
+    just placed). With ``rerank=False`` the touched products are queued for
+    ``refresh_stale_neighbors`` instead of re-ranked here. Returns the number
+    of orders recorded; the caller commits.
+    """
+    criteria = [Order.id.in_(order_ids)] if order_ids is not None else []
+    claimed = _claim_orders(criteria, batch_size)
+    if not claimed:
+        return 0
+    
+    baskets = {}
+    for order_id, product_id in db.session.query(OrderItem.order_id, OrderItem.product_id).filter(
+        OrderItem.order_id.in_(claimed)
+    ):
+        baskets.setdefault(order_id, set()).add(product_id)
+    
+    pair_counts = Counter()
+    for products in baskets.values():
+        pair_counts.update(permutations(sorted(products), 2))
+    
+    if pair_counts:
+        upsert_add(ProductCopurchase, [
+            {'product_id': product_id, 'related_id': related_id, 'count': count}
+            for (product_id, related_id), count in pair_counts.items()
+        ], keys=['product_id', 'related_id'])
+        touched = {product_id for product_id, _ in pair_counts}
+        if rerank:
+            refresh_neighbors(touched, top_k)
+        else:
+            insert_ignore(ProductNeighborRefresh, [{'product_id': product_id} for product_id in sorted(touched)], keys=['product_id'])
+    return len(claimed)
+
+def copurchase_matrix(order_ids, product_ids):
+    """
+    Non-zero off-diagonal entries of A^T A for the incidence pairs given.
+    
+    Returns ``(products, related, counts)`` arrays. Duplicate (order,
+    product) pairs are counted once. Each order's co-purchased pairs are
+    found by comparing the order-sorted incidence list with itself shifted
+    by 1, 2, ... positions, so the work is vectorised per basket size rather
+    than per order.
+    """
+    import numpy as np
+    
+    order_ids = np.asarray(order_ids, dtype=np.int64)
+    product_ids = np.asarray(product_ids, dtype=np.int64)
+    if not len(order_ids):
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    
+    width = int(product_ids.max()) + 1
+    incidence = np.unique(order_ids * width + product_ids)
+    orders, products = incidence // width, incidence % width
+    
+    firsts, seconds = [], []
+    for offset in range(1, len(incidence)):
+        same_order = orders[:-offset] == orders[offset:]
+        if not same_order.any():
+            break
+        firsts.append(products[:-offset][same_order])
+        seconds.append(products[offset:][same_order])
+    
+    if not firsts:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty, empty
+    
+    firsts, seconds = np.concatenate(firsts), np.concatenate(seconds)
+    pairs = np.concatenate([firsts * width + seconds, seconds * width + firsts])
+    pairs, counts = np.unique(pairs, return_counts=True)
+    return pairs // width, pairs % width, counts
+
+def top_k_neighbors(products, related, counts, top_k):
+    """Rank each product's neighbors by count (ties by id) and keep the best ``top_k``"""
+    import numpy as np
+    
+    if not len(products):
+        return products, products, related, counts
+    
+    order = np.lexsort((related, -counts, products))
+    products, related, counts = products[order], related[order], counts[order]
+    
+    positions = np.arange(len(products))
+    group_start = np.r_[True, products[1:] != products[:-1]]
+    ranks = positions - np.maximum.accumulate(np.where(group_start, positions, 0)) + 1
+    
+    keep = ranks <= top_k
+    return products[keep], ranks[keep], related[keep], counts[keep]
+
+def rebuild_related_products(top_k):
+    """Recompute the co-purchase model from every order that is not cancelled"""
+    # Claim everything first so orders placed meanwhile are left to record_orders
+    db.session.execute(
+        update(Order).where(Order.copurchases_recorded == False).values(
+            copurchases_recorded=True
+        ).execution_options(synchronize_session=False)
+    )
+    
+    rows = db.session.query(OrderItem.order_id, OrderItem.product_id).join(
+        Order, Order.id == OrderItem.order_id
+    ).filter(Order.copurchases_recorded == True, Order.status != 'cancelled').all()
+    
+    products, related, counts = copurchase_matrix(
+        [order_id for order_id, _ in rows],
+        [product_id for _, product_id in rows]
+    )
+    
+    db.session.execute(delete(ProductCopurchase))
+    for chunk in _chunks(zip(products.tolist(), related.tolist(), counts.tolist()), 5000):
+        db.session.execute(insert(ProductCopurchase), [
+            {'product_id': product_id, 'related_id': related_id, 'count': count}
+            for product_id, related_id, count in chunk
+        ])
+    
+    db.session.execute(delete(ProductNeighbor))
+    db.session.execute(delete(ProductNeighborRefresh))
+    for chunk in _chunks(zip(*(column.tolist() for column in top_k_neighbors(products, related, counts, top_k))), 5000):
+        db.session.execute(insert(ProductNeighbor), [
+            {'product_id': product_id, 'rank': rank, 'related_id': related_id, 'score': score}
+            for product_id, rank, related_id, score in chunk
+        ])
+    
+    return len(products)
@@ -0,0 +1,166 @@
+"""
+Seller sales rollups.
+
+``seller_daily_sales`` holds units and revenue per (seller, day, product),
+maintained by adding each order's lines when it is placed and subtracting
+them when it is cancelled (adding them back if it is reinstated). Seller
+analytics read a date range straight off the table's primary key, so a
+report costs O(days x products sold) instead of a scan of orders x
+order_items.
+"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+from sqlalchemy import delete, func, insert
+from app import db
+from app.models.marketplace import Product, Order, OrderItem, SellerDailySales
+from app.utils.upsert import upsert_add
+
+RESOLUTIONS = ('day', 'week', 'month')
+
+# Default report window per resolution, in days
+DEFAULT_WINDOWS = {'day': 30, 'week': 84, 'month': 365}
+
+def record_sales(order, lines, sign=1):
+    """
+    Add (``sign=1``) or remove (``sign=-1``) an order's lines from the rollups.
+    
+    ``lines`` are (product_id, seller_id, quantity, unit price) tuples.
+    """
+    day = order.created_at.date()
+    totals = {}
+    for product_id, seller_id, quantity, price in lines:
+        key = (seller_id, product_id)
+        units, revenue = totals.get(key, (0, Decimal('0')))
+        totals[key] = (units + quantity, revenue + Decimal(price) * quantity)
+    
+    upsert_add(SellerDailySales, [
+        {
+            'seller_id': seller_id,
+            'day': day,
+            'product_id': product_id,
+            'units': sign * units,
+            'revenue': sign * revenue
+        }
+        for (seller_id, product_id), (units, revenue) in totals.items()
+    ], keys=['seller_id', 'day', 'product_id'])
+
+def order_lines(order):
+    """Rollup lines of a stored order in one query"""
+    return db.session.query(
+        OrderItem.product_id, Product.seller_id, OrderItem.quantity, OrderItem.price
+    ).join(Product, Product.id == OrderItem.product_id).filter(OrderItem.order_id == order.id).all()
+
+def record_status_change(order, old_status, new_status):
+    """Keep the rollups in step when an order is cancelled or reinstated"""
+    if old_status != 'cancelled' and new_status == 'cancelled':
+        record_sales(order, order_lines(order), sign=-1)
+    elif old_status == 'cancelled' and new_status != 'cancelled':
+        record_sales(order, order_lines(order), sign=1)
+
+def rebuild_sales_rollups():
+    """Recompute every rollup row from the order history"""
+    db.session.execute(delete(SellerDailySales))
+    
+    day = func.date(Order.created_at)
+    rows = db.session.query(
+        Product.seller_id,
+        day,
+        OrderItem.product_id,
+        func.sum(OrderItem.quantity),
+        func.sum(OrderItem.quantity * OrderItem.price)
+    ).join(Order, Order.id == OrderItem.order_id).join(
+        Product, Product.id == OrderItem.product_id
+    ).filter(Order.status != 'cancelled').group_by(
+        Product.seller_id, day, OrderItem.product_id
+    ).all()
+    
+    if not rows:
+        return 0
+    
+    db.session.execute(insert(SellerDailySales), [
+        {
+            'seller_id': seller_id,
+            'day': row_day if isinstance(row_day, date) else date.fromisoformat(row_day),
+            'product_id': product_id,
+            'units': units,
+            'revenue': Decimal(str(revenue)).quantize(Decimal('0.01'))
+        }
+        for seller_id, row_day, product_id, units, revenue in rows
+    ])
+    return len(rows)
+
+def _period_start(day, resolution):
+    if resolution == 'week':
+        return day - timedelta(days=day.weekday())
+    if resolution == 'month':
+        return day.replace(day=1)
+    return day
+
+def seller_sales_series(seller_id, start, end, resolution='day', product_id=None):
+    """
+    Units and revenue per period between ``start`` and ``end`` (inclusive).
+    
+    Weeks start on Monday. Periods without sales are included with zeros
+    so the series can be charted directly.
+    """
+    if resolution not in RESOLUTIONS:
+        raise ValueError(f'resolution must be one of: {", ".join(RESOLUTIONS)}')
+    if start > end:
+        raise ValueError('start must not be after end')
+    
+    query = db.session.query(
+        SellerDailySales.day,
+        func.sum(SellerDailySales.units),
+        func.sum(SellerDailySales.revenue)
+    ).filter(
+        SellerDailySales.seller_id == seller_id,
+        SellerDailySales.day >= start,
+        SellerDailySales.day <= end
+    )
+    if product_id is not None:
+        query = query.filter(SellerDailySales.product_id == product_id)
+    
+    periods = {}
+    day = _period_start(start, resolution)
+    while day <= end:
+        periods.setdefault(_period_start(day, resolution), [0, Decimal('0')])
+        day += timedelta(days=1)
+    
+    for row_day, units, revenue in query.group_by(SellerDailySales.day):
+        period = periods[_period_start(row_day, resolution)]
+        period[0] += int(units or 0)
+        period[1] += Decimal(str(revenue or 0))
+    
+    return [
+        {
+            'period': period.isoformat(),
+            'units': units,
+            'revenue': float(revenue.quantize(Decimal('0.01')))
+        }
+        for period, (units, revenue) in sorted(periods.items())
+    ]
+
+def seller_product_totals(seller_id, start, end):
+    """Units and revenue per product between ``start`` and ``end``, best sellers first"""
+    revenue = func.sum(SellerDailySales.revenue)
+    rows = db.session.query(
+        SellerDailySales.product_id,
+        Product.name,
+        func.sum(SellerDailySales.units),
+        revenue
+    ).join(Product, Product.id == SellerDailySales.product_id).filter(
+        SellerDailySales.seller_id == seller_id,
+        SellerDailySales.day >= start,
+        SellerDailySales.day <= end
+    ).group_by(SellerDailySales.product_id, Product.name).order_by(revenue.desc()).all()
+    
+    return [
+        {
+            'product_id': product_id,
+            'name': name,
+            'units': int(units or 0),
+            'revenue': float(Decimal(str(revenue or 0)).quantize(Decimal('0.01')))
+        }
+        for product_id, name, units, revenue in rows
+    ]
@@ -0,0 +1,225 @@
+"""
+Response cache for the public catalog endpoints.
+
+Anonymous catalog reads dominate traffic while the catalog itself changes a
+few times an hour, so rendered JSON bodies are cached per endpoint namespace
+and keyed on the request path plus its normalized query arguments. Entries
+are filled lazily on a miss and dropped when a transaction that wrote one of
+the tables a namespace depends on commits, whether the write went through
+the ORM unit of work or a bulk ``insert()``/``update()``/``delete()``.
+
+Invalidation only reaches the process that committed, so entries also expire
+after ``RESPONSE_CACHE_TTL`` seconds to bound staleness across workers. On
+endpoints that also use ``conditional`` the key includes the ETag computed
+from the database for the request, so a write committed by another worker
+changes the key and the stale entry is never served under the new ETag.
+
+``VersionedCache`` serves per-object data that is rebuilt whenever a version
+read from the database (typically the row's ``updated_at``) changes, which
+keeps every worker consistent without invalidation messages.
+"""
+
+import threading
+import time
+from collections import defaultdict
+from functools import wraps
+from flask import current_app, g, has_app_context, request
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from project.cache import SimpleCache
+
+# Namespace -> tables whose changes invalidate it. None means any change to
+# the table; a tuple limits it to those columns (e.g. seller names shown on
+# products must not be invalidated by every login touching users.last_login).
+CACHE_DEPENDENCIES = {
+    'products': {'products': None, 'users': ('username',)},
+    'related': {'product_neighbors': None, 'products': None, 'users': ('username',)},
+    'courses': {'courses': None, 'enrollments': None, 'course_reviews': None, 'users': ('username', 'first_name', 'last_name')},
+    'music': {'music': None},
+    'videos': {'videos': None},
+    'games': {'games': None}
+}
+
+_TABLE_DEPENDENTS = defaultdict(list)
+for _namespace, _tables in CACHE_DEPENDENCIES.items():
+    for _table, _columns in _tables.items():
+        _TABLE_DEPENDENTS[_table].append((_namespace, _columns))
+
+class VersionedCache:
+    """Thread-safe map of values tagged with the version of the data they were built from"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = {}
+    
+    def get(self, key, version, build):
+        """Return the value cached for ``key`` at ``version``, calling ``build()`` to (re)create it"""
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+        
+        value = build()
+        with self._lock:
+            self._entries[key] = (version, value)
+        return value
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class ResponseCache(SimpleCache):
+    """Thread-safe SimpleCache of response bodies grouped by namespace"""
+    
+    def __init__(self, max_entries=10000, ttl=300):
+        super().__init__()
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._generations = defaultdict(int)
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+    
+    def get(self, key):
+        with self._lock:
+            entry = super().get(key)
+            if entry is not None and entry[0] < time.monotonic():
+                del self._store[key]
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1]
+    
+    def generation(self, namespace):
+        """Counter bumped on every invalidation of ``namespace``"""
+        with self._lock:
+            return self._generations[namespace]
+    
+    def set(self, key, value, generation=None):
+        """
+        Store ``value`` under ``key`` (whose first element is the namespace).
+        
+        When ``generation`` is given the value is only stored if the namespace
+        has not been invalidated since, so a response built from rows read
+        before a concurrent commit cannot outlive that commit.
+        """
+        with self._lock:
+            if generation is not None and generation != self._generations[key[0]]:
+                return
+            if key not in self._store and len(self._store) >= self.max_entries:
+                # Evict the oldest entry; dicts keep insertion order
+                self._store.pop(next(iter(self._store)))
+            super().set(key, (time.monotonic() + self.ttl, value))
+    
+    def invalidate(self, *namespaces):
+        with self._lock:
+            for namespace in namespaces:
+                self._generations[namespace] += 1
+            for key in [key for key in self._store if key[0] in namespaces]:
+                del self._store[key]
+            self.invalidations += 1
+    
+    def clear(self):
+        with self._lock:
+            for namespace in CACHE_DEPENDENCIES:
+                self._generations[namespace] += 1
+            super().clear()
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._store),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'invalidations': self.invalidations
+            }
+
+def init_response_cache(app):
+    app.config.setdefault('RESPONSE_CACHE_ENABLED', True)
+    app.config.setdefault('RESPONSE_CACHE_MAX_ENTRIES', 10000)
+    app.config.setdefault('RESPONSE_CACHE_TTL', 300)
+    app.extensions['response_cache'] = ResponseCache(
+        app.config['RESPONSE_CACHE_MAX_ENTRIES'],
+        app.config['RESPONSE_CACHE_TTL']
+    )
+
+def get_response_cache():
+    return current_app.extensions.get('response_cache')
+
+def _normalized_args():
+    """Query arguments as a hashable, order-independent tuple"""
+    return tuple(sorted(
+        (key.strip(), value.strip())
+        for key, values in request.args.lists()
+        for value in values
+    ))
+
+def cached_response(namespace):
+    """Cache successful responses of a public GET endpoint under ``namespace``"""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            cache = get_response_cache()
+            if cache is None or not current_app.config['RESPONSE_CACHE_ENABLED']:
+                return view(*args, **kwargs)
+            
+            # The ETag set by conditional() versions the entry across workers
+            key = (namespace, request.path, _normalized_args(), g.get('response_etag'))
+            cached = cache.get(key)
+            if cached is not None:
+                response = current_app.response_class(cached, mimetype='application/json')
+                response.headers['X-Cache'] = 'HIT'
+                return response
+            
+            generation = cache.generation(namespace)
+            response = current_app.make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                cache.set(key, response.get_data(), generation)
+            response.headers['X-Cache'] = 'MISS'
+            return response
+        return wrapper
+    return decorator
+
+def _pending(session):
+    return session.info.setdefault('cache_invalidations', set())
+
+def _record_change(session, table, changed_columns=None):
+    for namespace, columns in _TABLE_DEPENDENTS.get(table, ()):
+        if columns is None or changed_columns is None or set(columns) & changed_columns:
+            _pending(session).add(namespace)
+
+@event.listens_for(Session, 'before_flush')
+def _collect_flushed_changes(session, flush_context, instances):
+    for obj in session.new:
+        _record_change(session, obj.__table__.name)
+    for obj in session.deleted:
+        _record_change(session, obj.__table__.name)
+    for obj in session.dirty:
+        state = inspect(obj)
+        changed = {attr.key for attr in state.attrs if attr.history.has_changes()}
+        if changed:
+            _record_change(session, obj.__table__.name, changed)
+
+@event.listens_for(Session, 'do_orm_execute')
+def _collect_bulk_changes(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        # Stock movements opt out; see app.services.inventory
+        if not orm_execute_state.execution_options.get('invalidates_cache', True):
+            return
+        _record_change(orm_execute_state.session, orm_execute_state.statement.table.name)
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed(session):
+    namespaces = session.info.pop('cache_invalidations', None)
+    if namespaces and has_app_context():
+        cache = get_response_cache()
+        if cache is not None:
+            cache.invalidate(*namespaces)
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('cache_invalidations', None)
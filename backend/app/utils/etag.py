@@ -0,0 +1,62 @@
+"""
+Conditional GET support.
+
+Endpoints declare a cheap *version* query (the ``updated_at`` of the rows a
+response is built from, or ``max(updated_at)`` of the tables behind a list).
+The ETag is a hash of that version together with the path and normalized
+query arguments, so ``If-None-Match`` is answered with ``304 Not Modified``
+before the response is loaded or serialized. ETags are weak: they promise
+the same data, not byte-identical JSON. ``cached_response`` views below
+``conditional`` cache their bodies per ETag.
+"""
+
+import hashlib
+from functools import wraps
+from flask import current_app, g, request
+from sqlalchemy import func, select
+from app import db
+
+def make_etag(*parts):
+    return hashlib.sha1(repr(parts).encode()).hexdigest()[:32]
+
+def max_version(*columns):
+    """max() of each column (e.g. ``updated_at``) in a single SELECT, as a version tuple"""
+    maxima = [select(func.max(column)).scalar_subquery() for column in columns]
+    return tuple(db.session.execute(select(*maxima)).one())
+
+def conditional(version, private=False):
+    """
+    Answer ``If-None-Match`` with 304 using ``version(**view_args)``.
+    
+    ``version`` returns a tuple that changes whenever the response would, or
+    None when the resource does not exist or may not be shown; the view then
+    runs as usual and produces its own error response. Private responses
+    must be revalidated on every use and are never stored by shared caches.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            parts = version(**kwargs)
+            if parts is None:
+                return view(*args, **kwargs)
+            
+            etag = make_etag(request.path, sorted(request.args.items(multi=True)), parts)
+            # Response caches below key their entries on it
+            g.response_etag = etag
+            
+            if request.if_none_match.contains_weak(etag):
+                response = current_app.response_class(status=304)
+            else:
+                response = current_app.make_response(view(*args, **kwargs))
+                if response.status_code != 200:
+                    return response
+            
+            response.set_etag(etag, weak=True)
+            if private:
+                response.headers['Cache-Control'] = 'private, no-cache'
+                response.vary.add('Authorization')
+            else:
+                response.headers['Cache-Control'] = f"public, max-age={current_app.config['HTTP_CACHE_MAX_AGE']}"
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,85 @@
+"""
+Sparse fieldsets.
+
+List and detail endpoints accept ``fields=id,order_number,items.product.name``
+to return only the named fields; dotted names select fields of nested
+objects. The same field tree drives the SQL projection (``load_only`` on the
+columns actually needed) and serialization, so both the rows read from the
+database and the JSON body shrink with the request.
+"""
+
+from sqlalchemy import inspect
+from sqlalchemy.orm import load_only
+
+class nested:
+    """Marks a to_dict getter that receives the fieldset of a nested object"""
+    
+    def __init__(self, getter):
+        self.getter = getter
+
+def parse_fields(raw):
+    """Parse a fields= parameter into a nested dict, or None when absent"""
+    if not raw:
+        return None
+    
+    tree = {}
+    for path in raw.split(','):
+        node = tree
+        for part in path.strip().split('.'):
+            if part.strip():
+                node = node.setdefault(part.strip(), {})
+    return tree or None
+
+def wants(fields, key):
+    """Whether a fieldset includes ``key`` (None selects everything)"""
+    return fields is None or key in fields
+
+def subfields(fields, key):
+    """The fieldset for a nested object; None selects all of its fields"""
+    if fields is None:
+        return None
+    return fields.get(key) or None
+
+def serialize(fields, getters):
+    """
+    Build a to_dict result, evaluating only the getters for requested fields.
+    
+    Raises ValueError for requested fields the object does not have.
+    """
+    if fields is not None:
+        unknown = sorted(key for key in fields if key not in getters)
+        if unknown:
+            raise ValueError(f'Unknown field: {", ".join(unknown)}')
+    
+    data = {}
+    for key, getter in getters.items():
+        if not wants(fields, key):
+            continue
+        if isinstance(getter, nested):
+            data[key] = getter.getter(subfields(fields, key))
+        else:
+            data[key] = getter()
+    return data
+
+def project(query, model, fields):
+    """
+    Restrict a query on ``model`` to the columns ``fields`` needs.
+    
+    Primary and foreign keys are always loaded so relationships can still be
+    resolved; models list extra columns behind computed fields in
+    ``_field_columns``.
+    """
+    if not fields:
+        return query
+    
+    mapper = inspect(model)
+    needed = set()
+    for attr in mapper.column_attrs:
+        if attr.key in fields or any(column.primary_key or column.foreign_keys for column in attr.columns):
+            needed.add(attr.key)
+    
+    for key, columns in getattr(model, '_field_columns', {}).items():
+        if key in fields:
+            needed.update(columns)
+    
+    return query.options(load_only(*[getattr(model, key) for key in sorted(needed)]))
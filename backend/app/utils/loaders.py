@@ -0,0 +1,110 @@
+"""
+Batched relationship loaders for list endpoints.
+
+Model ``to_dict`` methods read related rows lazily, which costs one query per
+row when a whole page is serialized. The loaders below collect the foreign
+keys for a page up front, fetch each related entity type with a single
+``IN`` query and prime the instances so serialization never goes back to the
+database.
+
+Loaders accept the sparse fieldset of the request (see ``app.utils.fields``)
+and skip relationships that are not requested, projecting related rows down
+to the columns that are.
+"""
+
+from collections import defaultdict
+from sqlalchemy.orm import contains_eager
+from sqlalchemy.orm.attributes import set_committed_value
+from app import db
+from app.models.user import User
+from app.models.marketplace import Product, Cart, CartItem, OrderItem
+from app.models.education import Course
+from app.utils.fields import wants, subfields, project
+
+def _load_many_to_one(rows, fk_name, relation_name, model, fields=None):
+    """Fetch the targets of a many-to-one relationship for all rows at once"""
+    ids = {getattr(row, fk_name) for row in rows}
+    ids.discard(None)
+    
+    related = {}
+    if ids:
+        query = project(model.query, model, fields).filter(model.id.in_(ids))
+        related = {obj.id: obj for obj in query}
+    
+    for row in rows:
+        set_committed_value(row, relation_name, related.get(getattr(row, fk_name)))
+    
+    return list(related.values())
+
+def load_products(products, fields=None):
+    """Prime sellers for a page of products"""
+    products = list(products)
+    if wants(fields, 'seller'):
+        _load_many_to_one(products, 'seller_id', 'seller', User)
+    return products
+
+def load_orders(orders, fields=None):
+    """Prime customers, items, item products and their sellers for a page of orders"""
+    orders = list(orders)
+    if not orders:
+        return orders
+    
+    if wants(fields, 'customer'):
+        _load_many_to_one(orders, 'customer_id', 'customer', User)
+    
+    if not wants(fields, 'items'):
+        return orders
+    
+    item_fields = subfields(fields, 'items')
+    items_by_order = defaultdict(list)
+    items = project(OrderItem.query, OrderItem, item_fields).filter(
+        OrderItem.order_id.in_([order.id for order in orders])
+    ).order_by(OrderItem.id).all()
+    for item in items:
+        items_by_order[item.order_id].append(item)
+    
+    for order in orders:
+        order._preloaded_items = items_by_order.get(order.id, [])
+    
+    if wants(item_fields, 'product'):
+        product_fields = subfields(item_fields, 'product')
+        products = _load_many_to_one(items, 'product_id', 'product', Product, product_fields)
+        load_products(products, product_fields)
+    return orders
+
+def load_cart(user_id):
+    """Fetch a user's cart with its items, their products and sellers in a single query"""
+    rows = db.session.query(Cart, CartItem).outerjoin(
+        CartItem, CartItem.cart_id == Cart.id
+    ).outerjoin(CartItem.product).outerjoin(Product.seller).options(
+        contains_eager(CartItem.product).contains_eager(Product.seller)
+    ).filter(Cart.user_id == user_id).order_by(CartItem.id).all()
+    
+    if not rows:
+        return None
+    
+    cart = rows[0][0]
+    cart._preloaded_items = [item for _, item in rows if item is not None]
+    return cart
+
+def load_courses(courses, fields=None):
+    """Prime instructors for a page of courses (enrollment counts are stored on the course)"""
+    courses = list(courses)
+    if wants(fields, 'instructor'):
+        _load_many_to_one(courses, 'instructor_id', 'instructor', User)
+    return courses
+
+def load_enrollments(enrollments, fields=None):
+    """Prime courses (with their instructors) for a list of enrollments"""
+    enrollments = list(enrollments)
+    if wants(fields, 'course'):
+        course_fields = subfields(fields, 'course')
+        courses = _load_many_to_one(enrollments, 'course_id', 'course', Course, course_fields)
+        load_courses(courses, course_fields)
+    return enrollments
+
+def load_admin_logs(logs):
+    """Prime the acting admin for a page of admin logs"""
+    logs = list(logs)
+    _load_many_to_one(logs, 'admin_id', 'admin', User)
+    return logs
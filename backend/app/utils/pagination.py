@@ -0,0 +1,112 @@
+"""
+Keyset (cursor) pagination.
+
+``query.paginate()`` issues an OFFSET query plus a full ``COUNT(*)`` for every
+page, so deep pages get slower as tables grow. Keyset pagination instead
+remembers the (sort key, id) pair of the last row served and resumes from it
+with a range condition that a composite ``(sort key, id)`` index answers
+directly, so every page costs the same and no count query is issued.
+
+Cursors are opaque to clients: URL-safe base64 of a small JSON document that
+also records the sort key and direction, so a cursor cannot be replayed
+against a different ordering.
+"""
+
+import base64
+import json
+from datetime import datetime
+from decimal import Decimal
+from sqlalchemy import tuple_
+from sqlalchemy.orm import undefer
+
+def _encode_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+def _decode_value(column, raw):
+    python_type = column.type.python_type
+    if python_type is datetime:
+        return datetime.fromisoformat(raw)
+    return python_type(raw)
+
+def encode_cursor(column, descending, value, row_id):
+    """Build an opaque cursor pointing just after the given row"""
+    payload = {
+        'k': column.key,
+        'd': 'desc' if descending else 'asc',
+        'v': _encode_value(value),
+        'i': row_id
+    }
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+def decode_cursor(cursor, column, descending):
+    """Decode a cursor into its (sort value, id) pair, raising ValueError if invalid"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        if payload['k'] != column.key or payload['d'] != ('desc' if descending else 'asc'):
+            raise ValueError('Cursor does not match the requested sort order')
+        return _decode_value(column, payload['v']), int(payload['i'])
+    except (KeyError, TypeError, ValueError) as e:
+        raise ValueError('Invalid cursor') from e
+
+class KeysetPage:
+    """One page of keyset-paginated results"""
+    
+    def __init__(self, items, per_page, next_cursor):
+        self.items = items
+        self.per_page = per_page
+        self.next_cursor = next_cursor
+        self.has_next = next_cursor is not None
+    
+    def to_dict(self):
+        return {
+            'per_page': self.per_page,
+            'next_cursor': self.next_cursor,
+            'has_next': self.has_next
+        }
+
+def keyset_paginate(query, sort_column, id_column, cursor, per_page, descending=True):
+    """
+    Return the page of ``query`` that follows ``cursor``.
+    
+    An empty cursor starts from the first row. Rows are ordered by
+    (sort_column, id_column) in the requested direction; the id breaks ties so
+    rows sharing a sort value are neither skipped nor repeated.
+    """
+    per_page = max(per_page, 1)
+    
+    if cursor:
+        value, last_id = decode_cursor(cursor, sort_column, descending)
+        key = tuple_(sort_column, id_column)
+        if descending:
+            query = query.filter(key < tuple_(value, last_id))
+        else:
+            query = query.filter(key > tuple_(value, last_id))
+    
+    # The next cursor reads the sort key back, so keep it loaded under projections
+    query = query.options(undefer(sort_column))
+    
+    if descending:
+        query = query.order_by(sort_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(sort_column.asc(), id_column.asc())
+    
+    rows = query.limit(per_page + 1).all()
+    items = rows[:per_page]
+    
+    next_cursor = None
+    if len(rows) > per_page:
+        last = items[-1]
+        next_cursor = encode_cursor(
+            sort_column,
+            descending,
+            getattr(last, sort_column.key),
+            getattr(last, id_column.key)
+        )
+    
+    return KeysetPage(items, per_page, next_cursor)
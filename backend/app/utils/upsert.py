@@ -0,0 +1,81 @@
+"""
+Counter upserts and duplicate-tolerant inserts.
+
+Rollup and counter tables are maintained by adding deltas to rows that may
+not exist yet. SQLite and PostgreSQL do this in one ``INSERT ... ON CONFLICT
+DO UPDATE`` per chunk; other databases fall back to an UPDATE per row
+followed by an INSERT when nothing matched.
+
+``insert_ignore`` writes rows whose key may already exist, skipping those
+that do, with ``ON CONFLICT DO NOTHING`` or an equivalent per-row insert.
+"""
+
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from app import db
+
+# Rows per multi-row INSERT, well below SQLite's bound parameter limit
+CHUNK_SIZE = 500
+
+def upsert_add(model, rows, keys):
+    """
+    Insert ``rows`` (dicts), adding their non-key values to existing rows.
+    
+    Rows are written in key order so concurrent writers lock them in the
+    same order and cannot deadlock each other.
+    """
+    if not rows:
+        return
+    
+    rows = sorted(rows, key=lambda row: tuple(row[key] for key in keys))
+    values = [column for column in rows[0] if column not in keys]
+    dialect = db.session.get_bind().dialect.name
+    
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        for start in range(0, len(rows), CHUNK_SIZE):
+            statement = dialect_insert(model).values(rows[start:start + CHUNK_SIZE])
+            db.session.execute(statement.on_conflict_do_update(
+                index_elements=keys,
+                set_={column: getattr(model, column) + statement.excluded[column] for column in values}
+            ))
+        return
+    
+    for row in rows:
+        updated = db.session.execute(
+            update(model).where(
+                *[getattr(model, key) == row[key] for key in keys]
+            ).values(
+                {column: getattr(model, column) + row[column] for column in values}
+            ).execution_options(synchronize_session=False)
+        )
+        if not updated.rowcount:
+            db.session.execute(insert(model), [row])
+
+def insert_ignore(model, rows, keys):
+    """Insert ``rows`` (dicts), skipping those whose ``keys`` already exist; returns how many were inserted"""
+    if not rows:
+        return 0
+    
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('sqlite', 'postgresql'):
+        if dialect == 'sqlite':
+            from sqlalchemy.dialects.sqlite import insert as dialect_insert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as dialect_insert
+        # Passing rows as parameters keeps the statement in the compiled cache
+        result = db.session.execute(dialect_insert(model.__table__).on_conflict_do_nothing(index_elements=keys), rows)
+        return result.rowcount
+    
+    inserted = 0
+    for row in rows:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(insert(model), [row])
+            inserted += 1
+        except IntegrityError:
+            pass
+    return inserted
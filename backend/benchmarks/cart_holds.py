@@ -0,0 +1,86 @@
+"""
+Add to cart: stock holds under contention, and their effect on cached listings.
+
+    python -m benchmarks.cart_holds --customers 200 --stock 100
+"""
+
+import argparse
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models.marketplace import Product, StockReservation
+from app.models.user import User
+from benchmarks.common import benchmark_app
+
+def seed(customers, stock, catalog=1000):
+    """One contended product in a catalog of ``catalog`` plentiful ones, and ``customers`` shoppers"""
+    seller = User(username='seller', email='seller@example.com', password_hash='x', role='seller')
+    db.session.add(seller)
+    db.session.flush()
+    products = [
+        Product(name=f'Product {index}', slug=f'product-{index}', price=Decimal('2.50'), category='c',
+                seller_id=seller.id, quantity=stock if index == 0 else 10 ** 6)
+        for index in range(catalog)
+    ]
+    users = [User(username=f'customer{index}', email=f'customer{index}@example.com', password_hash='x') for index in range(customers)]
+    db.session.add_all(products + users)
+    db.session.commit()
+    return [user.id for user in users], products[0].id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--stock', type=int, default=100)
+    args = parser.parse_args()
+    
+    with benchmark_app(SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}}) as app:
+        with app.app_context():
+            customer_ids, hot_id = seed(args.customers, args.stock)
+            headers = {
+                customer_id: {'Authorization': f'Bearer {create_access_token(identity=str(customer_id))}'}
+                for customer_id in customer_ids
+            }
+        
+        statuses = Counter()
+        listings = Counter()
+        lock = threading.Lock()
+        done = threading.Event()
+        
+        def add(customer_id):
+            status = app.test_client().post(
+                '/api/marketplace/cart/add', json={'product_id': hot_id, 'quantity': 1}, headers=headers[customer_id]
+            ).status_code
+            with lock:
+                statuses[status] += 1
+        
+        def browse():
+            client = app.test_client()
+            while not done.is_set():
+                cache = client.get('/api/marketplace/products?per_page=50').headers.get('X-Cache')
+                with lock:
+                    listings[cache] += 1
+        
+        browser = threading.Thread(target=browse)
+        browser.start()
+        threads = [threading.Thread(target=add, args=(customer_id,)) for customer_id in customer_ids]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        done.set()
+        browser.join()
+        
+        with app.app_context():
+            left = db.session.get(Product, hot_id).quantity
+            held = db.session.query(db.func.coalesce(db.func.sum(StockReservation.quantity), 0)).scalar()
+        print(f'{len(threads)} concurrent adds in {elapsed:.2f}s ({len(threads) / elapsed:.0f}/s): {dict(statuses)}')
+        print(f'contended product: {args.stock} in stock, {held} held, {left} left, oversold: {held + left != args.stock}')
+        print(f'listing requests meanwhile: {dict(listings)}')
+
+if __name__ == '__main__':
+    main()
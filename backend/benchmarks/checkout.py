@@ -0,0 +1,90 @@
+"""
+Checkout: statements per order, throughput and stock safety under contention.
+
+    python -m benchmarks.checkout --customers 200 --stock 100 --lines 10
+"""
+
+import argparse
+import threading
+import time
+from collections import Counter
+from decimal import Decimal
+from flask_jwt_extended import create_access_token
+from sqlalchemy import event
+from app import db
+from app.models.marketplace import Product, Cart, CartItem, Order
+from app.models.user import User
+from benchmarks.common import benchmark_app
+
+def seed(customers, lines, stock):
+    """``customers`` carts holding one unit of a contended product plus ``lines - 1`` plentiful ones"""
+    seller = User(username='seller', email='seller@example.com', password_hash='x', role='seller')
+    db.session.add(seller)
+    db.session.flush()
+    products = [
+        Product(name=f'Product {index}', slug=f'product-{index}', price=Decimal('2.50'), category='c',
+                seller_id=seller.id, quantity=stock if index == 0 else 10 ** 6)
+        for index in range(lines)
+    ]
+    users = [User(username=f'customer{index}', email=f'customer{index}@example.com', password_hash='x') for index in range(customers)]
+    db.session.add_all(products + users)
+    db.session.flush()
+    for user in users:
+        cart = Cart(user_id=user.id)
+        db.session.add(cart)
+        db.session.flush()
+        db.session.add_all([CartItem(cart_id=cart.id, product_id=product.id, quantity=1) for product in products])
+    db.session.commit()
+    return [user.id for user in users], products[0].id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--customers', type=int, default=200)
+    parser.add_argument('--stock', type=int, default=100)
+    parser.add_argument('--lines', type=int, default=10)
+    args = parser.parse_args()
+    
+    with benchmark_app(SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}}) as app:
+        with app.app_context():
+            customer_ids, hot_id = seed(args.customers, args.lines, args.stock)
+            engine = db.engine
+            headers = {
+                customer_id: {'Authorization': f'Bearer {create_access_token(identity=str(customer_id))}'}
+                for customer_id in customer_ids
+            }
+        
+        # Statements for one checkout, measured on its own
+        statements = []
+        
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        event.listen(engine, 'before_cursor_execute', listener)
+        app.test_client().post('/api/marketplace/orders', json={}, headers=headers[customer_ids[0]])
+        event.remove(engine, 'before_cursor_execute', listener)
+        
+        statuses = Counter()
+        lock = threading.Lock()
+        
+        def checkout(customer_id):
+            status = app.test_client().post('/api/marketplace/orders', json={}, headers=headers[customer_id]).status_code
+            with lock:
+                statuses[status] += 1
+        
+        threads = [threading.Thread(target=checkout, args=(customer_id,)) for customer_id in customer_ids[1:]]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        
+        with app.app_context():
+            left = db.session.get(Product, hot_id).quantity
+            orders = Order.query.count()
+        print(f'{args.lines}-line carts: {len(statements)} statements for one checkout')
+        print(f'{len(threads)} concurrent checkouts in {elapsed:.2f}s ({len(threads) / elapsed:.0f}/s): {dict(statuses)}')
+        print(f'contended product: {args.stock} in stock, {orders} orders, {left} left, oversold: {orders + left != args.stock}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""
+Shared setup for the benchmark scripts.
+
+Each script builds a throwaway app on a SQLite file (in WAL mode, the
+configured default), seeds it and prints timings. Run them from the
+backend directory, e.g. ``python -m benchmarks.product_search``.
+"""
+
+import os
+import statistics
+import tempfile
+import time
+from contextlib import contextmanager
+from app import create_app, db
+from config import TestingConfig
+
+@contextmanager
+def benchmark_app(**config):
+    """An app on a fresh SQLite file that is removed afterwards"""
+    directory = tempfile.mkdtemp(prefix='rgfling-bench-')
+    path = os.path.join(directory, 'bench.db')
+    settings = {'SQLALCHEMY_DATABASE_URI': f'sqlite:///{path}'}
+    settings.update(config)
+    app = create_app(type('BenchmarkConfig', (TestingConfig,), settings))
+    with app.app_context():
+        db.create_all()
+    try:
+        yield app
+    finally:
+        with app.app_context():
+            db.session.remove()
+            db.engine.dispose()
+        for name in os.listdir(directory):
+            os.remove(os.path.join(directory, name))
+        os.rmdir(directory)
+
+def timed(function, repeat=5):
+    """Median wall time of ``repeat`` calls, in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
@@ -0,0 +1,90 @@
+"""
+Payment webhooks: queued ingestion and batched settlement against applying each event in the request.
+
+    python -m benchmarks.payment_webhooks --orders 2000
+"""
+
+import argparse
+import hashlib
+import hmac
+import json
+import time
+from decimal import Decimal
+from sqlalchemy import insert, update
+from app import db
+from app.models.marketplace import Order
+from app.models.user import User
+from app.services.payment_events import process_payment_events
+from benchmarks.common import benchmark_app
+from payment_webhooks import event_outcome
+
+SECRET = 'whsec_bench'
+
+def seed(count):
+    customer = User(username='customer', email='customer@example.com', password_hash='x')
+    db.session.add(customer)
+    db.session.flush()
+    db.session.execute(insert(Order), [
+        {'order_number': f'ORD-{index}', 'customer_id': customer.id, 'total_amount': Decimal('9.99'), 'payment_status': 'pending'}
+        for index in range(count)
+    ])
+    db.session.commit()
+
+def signed_events(count):
+    """A success and a refund per order, signed like Stripe does"""
+    events = []
+    for index in range(count):
+        for suffix, event_type, payment in [
+            ('a', 'payment_intent.succeeded', {'metadata': {'order_number': f'ORD-{index}'}}),
+            ('b', 'charge.refunded', {'metadata': {'order_number': f'ORD-{index}'}})
+        ]:
+            body = json.dumps({'id': f'evt_{index}{suffix}', 'type': event_type, 'data': {'object': payment}}).encode()
+            timestamp = str(int(time.time()))
+            signature = hmac.new(SECRET.encode(), timestamp.encode() + b'.' + body, hashlib.sha256).hexdigest()
+            events.append((body, {'Stripe-Signature': f't={timestamp},v1={signature}'}))
+    return events
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--orders', type=int, default=2000)
+    args = parser.parse_args()
+    events = signed_events(args.orders)
+    
+    with benchmark_app(STRIPE_WEBHOOK_SECRET=SECRET) as app:
+        with app.app_context():
+            seed(args.orders)
+        client = app.test_client()
+        
+        start = time.perf_counter()
+        for body, headers in events:
+            client.post('/api/webhooks/stripe', data=body, headers=headers)
+        ingest = time.perf_counter() - start
+        
+        with app.app_context():
+            start = time.perf_counter()
+            updated = 0
+            while True:
+                processed, changed = process_payment_events()
+                db.session.commit()
+                if not processed:
+                    break
+                updated += changed
+            settle = time.perf_counter() - start
+        print(f'{len(events)} events: queued in {ingest:.2f}s ({len(events) / ingest:.0f}/s), '
+              f'settled in {settle * 1000:.0f} ms ({updated} order updates)')
+        
+        # The same events applied one at a time, each in its own transaction
+        with app.app_context():
+            db.session.execute(update(Order).values(payment_status='pending'))
+            db.session.commit()
+            start = time.perf_counter()
+            for body, _ in events:
+                event = json.loads(body)
+                reference, status = event_outcome('stripe', event['type'], event)
+                db.session.execute(update(Order).where(Order.order_number == reference).values(payment_status=status))
+                db.session.commit()
+            inline = time.perf_counter() - start
+        print(f'applied one by one: {inline * 1000:.0f} ms ({len(events) / inline:.0f}/s)')
+
+if __name__ == '__main__':
+    main()
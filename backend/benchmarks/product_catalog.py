@@ -0,0 +1,72 @@
+"""
+Legacy in-memory catalog: indexed lookups against the list scans they replaced.
+
+    python -m benchmarks.product_catalog --products 100000 --vocabulary 50000
+"""
+
+import argparse
+import random
+import string
+import threading
+from product_catalog import ProductCatalog
+from benchmarks.common import timed
+
+QUERIES = ['phone', 'hon', 'leather wallet', 'qz', 'zzzz']
+
+def seed(count, vocabulary):
+    """``count`` products described with words drawn from a vocabulary of ``vocabulary`` made-up words"""
+    words = [''.join(random.choices(string.ascii_lowercase, k=random.randint(4, 9))) for _ in range(vocabulary)]
+    words[:4] = ['phone', 'leather', 'wallet', 'iphone']
+    return [
+        {
+            'id': f'p{index}',
+            'name': ' '.join(random.sample(words, 2)),
+            'description': ' '.join(random.sample(words, 6)),
+            'category': f'Category {index % 20}',
+            'type': random.choice(['physical', 'digital', 'service'])
+        }
+        for index in range(count)
+    ]
+
+def scan(products, query):
+    query = query.lower()
+    return [
+        product for product in products
+        if query in product['name'].lower() or query in product['description'].lower() or query in product['category'].lower()
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    parser.add_argument('--vocabulary', type=int, default=50000)
+    args = parser.parse_args()
+    random.seed(1)
+    
+    products = seed(args.products, args.vocabulary)
+    catalog = ProductCatalog(products)
+    print(f'{args.products} products, {args.vocabulary} words (median ms per call)')
+    print(f'{"query":<16} {"matches":>8} {"scan":>8} {"catalog":>8}')
+    for query in QUERIES:
+        matches = len(catalog.search(query))
+        assert matches == len(scan(products, query))
+        print(f'{query!r:<16} {matches:>8} {timed(lambda: scan(products, query)):>8.2f} {timed(lambda: catalog.search(query)):>8.2f}')
+    
+    # Searches while a writer keeps adding products
+    stop = threading.Event()
+    added = []
+    
+    def write():
+        while not stop.is_set():
+            product = dict(products[len(added) % len(products)], id=f'new{len(added)}')
+            catalog.add(product)
+            added.append(product)
+    
+    writer = threading.Thread(target=write)
+    writer.start()
+    searching = timed(lambda: [catalog.search(query) for query in QUERIES], repeat=20)
+    stop.set()
+    writer.join()
+    print(f'all queries with a concurrent writer: {searching:.2f} ms ({len(added)} products added meanwhile)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Product search: full-text index against the ILIKE scan it replaced.
+
+    python -m benchmarks.product_search --products 100000
+"""
+
+import argparse
+import random
+from decimal import Decimal
+from sqlalchemy import insert, or_
+from app import db
+from app.models.marketplace import Product
+from app.models.user import User
+from app.services.product_search import search_products
+from benchmarks.common import benchmark_app, timed
+
+WORDS = ['phone', 'case', 'wireless', 'charger', 'leather', 'wallet', 'organic', 'coffee', 'desk', 'lamp',
+         'running', 'shoes', 'yoga', 'mat', 'laptop', 'stand', 'camera', 'lens', 'kettle', 'blender']
+TERMS = ['phone', 'wire', 'leather wallet', 'zzz']
+
+def seed(count):
+    seller = User(username='seller', email='seller@example.com', password_hash='x', role='seller')
+    db.session.add(seller)
+    db.session.flush()
+    rows = []
+    for index in range(count):
+        words = random.sample(WORDS, 6)
+        rows.append({
+            'name': f'{words[0].title()} {words[1]} {index}',
+            'slug': f'product-{index}',
+            'description': ' '.join(words[2:]),
+            'price': Decimal('9.99'),
+            'category': 'c',
+            'seller_id': seller.id,
+            'quantity': 10,
+            'is_active': True
+        })
+    for start in range(0, count, 10000):
+        db.session.execute(insert(Product), rows[start:start + 10000])
+    db.session.commit()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--products', type=int, default=100000)
+    args = parser.parse_args()
+    random.seed(1)
+    
+    with benchmark_app() as app, app.app_context():
+        seed(args.products)
+        base = Product.query.filter_by(is_active=True)
+        print(f'{args.products} products, first page of 20 plus the total count, median of 5 runs')
+        for term in TERMS:
+            def ranked():
+                query, relevance = search_products(base, term)
+                query.order_by(relevance).limit(20).all()
+                query.count()
+            
+            def newest():
+                query, _ = search_products(base, term)
+                query.order_by(Product.created_at.desc()).limit(20).all()
+                query.count()
+            
+            def scan():
+                query = base.filter(or_(Product.name.ilike(f'%{term}%'), Product.description.ilike(f'%{term}%')))
+                query.order_by(Product.created_at.desc()).limit(20).all()
+                query.count()
+            
+            print(
+                f'  {term!r:18} full-text by relevance {timed(ranked):7.1f} ms   '
+                f'full-text newest {timed(newest):7.1f} ms   ILIKE newest {timed(scan):7.1f} ms'
+            )
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Lesson progress: buffered heartbeats against writing each report through, for many concurrent viewers.
+
+    python -m benchmarks.progress_heartbeats --viewers 10000 --beats 3
+"""
+
+import argparse
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import insert
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models.education import Course, Enrollment
+from app.models.user import User
+from app.services.progress_buffer import get_progress_buffer
+from benchmarks.common import benchmark_app
+
+def seed(viewers):
+    instructor = User(username='instructor', email='instructor@example.com', password_hash='x', role='instructor')
+    db.session.add(instructor)
+    db.session.flush()
+    course = Course(title='Course', instructor_id=instructor.id, is_published=True)
+    db.session.add(course)
+    db.session.flush()
+    db.session.execute(insert(User), [
+        {'username': f'viewer{index}', 'email': f'viewer{index}@example.com', 'password_hash': 'x', 'role': 'student'}
+        for index in range(viewers)
+    ])
+    student_ids = db.session.query(User.id).filter(User.username.like('viewer%')).order_by(User.id).all()
+    db.session.execute(insert(Enrollment), [{'student_id': student_id, 'course_id': course.id} for student_id, in student_ids])
+    db.session.commit()
+    return course.id, [student_id for student_id, in student_ids]
+
+def run(interval, viewers, beats, workers):
+    """Send ``beats`` heartbeats per viewer from ``workers`` threads; returns (seconds sending, failed reports, seconds flushing)"""
+    # A connection per thread, so no request waits out the pool timeout
+    with benchmark_app(
+        PROGRESS_FLUSH_INTERVAL=interval,
+        SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}, 'pool_size': workers}
+    ) as app:
+        with app.app_context():
+            course_id, student_ids = seed(viewers)
+            headers = [{'Authorization': f'Bearer {create_access_token(identity=str(student_id))}'} for student_id in student_ids]
+        url = f'/api/education/courses/{course_id}/progress'
+        
+        def viewer(index):
+            client = app.test_client()
+            return Counter(
+                client.post(url, json={'progress': 100 * beat / beats}, headers=headers[index]).status_code
+                for beat in range(1, beats + 1)
+            )
+        
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            statuses = sum(pool.map(viewer, range(viewers)), Counter())
+        sending = time.perf_counter() - start
+        
+        with app.app_context():
+            start = time.perf_counter()
+            get_progress_buffer().flush()
+            flushing = time.perf_counter() - start
+        failed = viewers * beats - statuses[202]
+        return sending, failed, flushing
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--viewers', type=int, default=10000)
+    parser.add_argument('--beats', type=int, default=3)
+    parser.add_argument('--workers', type=int, default=32)
+    args = parser.parse_args()
+    reports = args.viewers * args.beats
+    
+    # A long interval so the whole run is written by one explicit flush
+    sending, failed, flushing = run(3600, args.viewers, args.beats, args.workers)
+    print(f'{args.viewers} viewers x {args.beats} heartbeats from {args.workers} threads')
+    print(f'  buffered:      {sending:.2f}s ({reports / sending:.0f} reports/s, {failed} failed), one flush of {args.viewers} enrollments in {flushing * 1000:.0f} ms')
+    sending, failed, _ = run(0, args.viewers, args.beats, args.workers)
+    print(f'  write-through: {sending:.2f}s ({reports / sending:.0f} reports/s, {failed} failed)')
+
+if __name__ == '__main__':
+    main()
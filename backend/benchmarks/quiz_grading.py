@@ -0,0 +1,124 @@
+"""
+Quiz grading: cached answer key against per-question lookups, and submissions per second.
+
+    python -m benchmarks.quiz_grading --questions 20 --students 1000
+"""
+
+import argparse
+import random
+import threading
+import time
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models.education import Course, Enrollment, Quiz, Question, Answer
+from app.models.user import User
+from app.services.quiz_grading import clear_answer_keys, get_answer_key, grade_answers
+from benchmarks.common import benchmark_app, timed
+
+def seed(questions, students):
+    """A quiz of single-answer questions with four options, and ``students`` enrolled students"""
+    instructor = User(username='instructor', email='instructor@example.com', password_hash='x', role='instructor')
+    db.session.add(instructor)
+    db.session.flush()
+    course = Course(title='Course', instructor_id=instructor.id, is_published=True)
+    db.session.add(course)
+    db.session.flush()
+    quiz = Quiz(title='Quiz', course_id=course.id, is_published=True, max_attempts=10, passing_score=60)
+    db.session.add(quiz)
+    db.session.flush()
+    
+    options = {}
+    for index in range(questions):
+        question = Question(quiz_id=quiz.id, question_text=f'Question {index}', question_type='multiple_choice', points=1)
+        db.session.add(question)
+        db.session.flush()
+        answers = [Answer(question_id=question.id, answer_text=f'Answer {option}', is_correct=option == 0) for option in range(4)]
+        db.session.add_all(answers)
+        db.session.flush()
+        options[question.id] = [answer.id for answer in answers]
+    
+    users = [User(username=f'student{index}', email=f'student{index}@example.com', password_hash='x') for index in range(students)]
+    db.session.add_all(users)
+    db.session.flush()
+    db.session.add_all([Enrollment(student_id=user.id, course_id=course.id) for user in users])
+    db.session.commit()
+    return quiz.id, options, [user.id for user in users]
+
+def submission(options):
+    return {str(question_id): {'answer_id': random.choice(answer_ids)} for question_id, answer_ids in options.items()}
+
+def grade_per_question(answers):
+    """Two lookups per answered question, as QuizAttempt.calculate_score used to do"""
+    score = max_score = 0
+    for question_id, answer_data in answers.items():
+        question = db.session.get(Question, int(question_id))
+        max_score += question.points
+        correct = Answer.query.filter_by(question_id=question.id, is_correct=True).first()
+        if correct and answer_data.get('answer_id') == correct.id:
+            score += question.points
+    return score, max_score
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--students', type=int, default=1000)
+    args = parser.parse_args()
+    random.seed(1)
+    
+    with benchmark_app(SQLALCHEMY_ENGINE_OPTIONS={'connect_args': {'timeout': 60}}) as app:
+        with app.app_context():
+            quiz_id, options, student_ids = seed(args.questions, args.students)
+            headers = [{'Authorization': f'Bearer {create_access_token(identity=str(student_id))}'} for student_id in student_ids]
+            submissions = [submission(options) for _ in student_ids]
+            
+            quiz = db.session.get(Quiz, quiz_id)
+            answers = submissions[0]
+            key = get_answer_key(quiz)
+            for answer in submissions[:50]:
+                assert grade_answers(key, answer)[:2] == grade_per_question(answer)
+            
+            def cold():
+                clear_answer_keys()
+                grade_answers(get_answer_key(quiz), answers)
+            
+            print(f'{args.questions}-question quiz, median ms per grading:')
+            print(f'  per-question lookups   {timed(lambda: grade_per_question(answers)):8.3f}')
+            print(f'  answer key, cold       {timed(cold):8.3f}')
+            print(f'  answer key, cached     {timed(lambda: grade_answers(get_answer_key(quiz), answers)):8.3f}')
+            engine = db.engine
+        
+        statements = []
+        
+        def listener(conn, cursor, statement, parameters, context, executemany):
+            statements.append(statement)
+        
+        client = app.test_client()
+        url = f'/api/education/quizzes/{quiz_id}/attempt'
+        event.listen(engine, 'before_cursor_execute', listener)
+        client.post(url, json={'answers': submissions[0]}, headers=headers[0])
+        event.remove(engine, 'before_cursor_execute', listener)
+        print(f'submit endpoint: {len(statements)} statements per submission')
+        
+        half = len(student_ids) // 2
+        start = time.perf_counter()
+        for index in range(1, half):
+            client.post(url, json={'answers': submissions[index]}, headers=headers[index])
+        elapsed = time.perf_counter() - start
+        print(f'  {half - 1} sequential submissions: {(half - 1) / elapsed:.0f}/s')
+        
+        # A deadline spike: everyone else submits at once
+        def submit(index):
+            app.test_client().post(url, json={'answers': submissions[index]}, headers=headers[index])
+        
+        threads = [threading.Thread(target=submit, args=(index,)) for index in range(half, len(student_ids))]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - start
+        print(f'  {len(threads)} concurrent submissions: {len(threads) / elapsed:.0f}/s')
+
+if __name__ == '__main__':
+    main()
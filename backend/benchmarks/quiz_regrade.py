@@ -0,0 +1,116 @@
+"""
+Quiz re-grading: attempts per second for the bulk job after an answer key fix.
+
+    python -m benchmarks.quiz_regrade --attempts 1000000 --questions 20
+"""
+
+import argparse
+import random
+import time
+from sqlalchemy import insert, update
+from app import db
+from app.models.education import Course, Quiz, Question, Answer, QuizAttempt
+from app.models.user import User
+from app.services.quiz_grading import grade_answers, load_answer_key
+from app.services.quiz_regrade import regrade_quiz
+from benchmarks.common import benchmark_app
+
+# Attempts inserted per statement while seeding
+SEED_BATCH = 20000
+
+def seed(attempts, questions, students=1000):
+    """A quiz of single-answer questions with four options and ``attempts`` ungraded attempts at it"""
+    instructor = User(username='instructor', email='instructor@example.com', password_hash='x', role='instructor')
+    db.session.add(instructor)
+    db.session.flush()
+    course = Course(title='Course', instructor_id=instructor.id, is_published=True)
+    db.session.add(course)
+    db.session.flush()
+    quiz = Quiz(title='Quiz', course_id=course.id, is_published=True, passing_score=60)
+    db.session.add(quiz)
+    db.session.flush()
+    
+    options = {}
+    for index in range(questions):
+        question = Question(quiz_id=quiz.id, question_text=f'Question {index}', question_type='multiple_choice', points=1)
+        db.session.add(question)
+        db.session.flush()
+        answers = [Answer(question_id=question.id, answer_text=f'Answer {option}', is_correct=option == 0) for option in range(4)]
+        db.session.add_all(answers)
+        db.session.flush()
+        options[question.id] = [answer.id for answer in answers]
+    
+    db.session.execute(insert(User), [
+        {'username': f'student{index}', 'email': f'student{index}@example.com', 'password_hash': 'x', 'role': 'student'}
+        for index in range(students)
+    ])
+    student_ids = [student_id for student_id, in db.session.query(User.id).filter(User.username.like('student%'))]
+    for start in range(0, attempts, SEED_BATCH):
+        db.session.execute(insert(QuizAttempt), [
+            {
+                'user_id': student_ids[index % students],
+                'quiz_id': quiz.id,
+                'answers': {str(question_id): {'answer_id': random.choice(answer_ids)} for question_id, answer_ids in options.items()}
+            }
+            for index in range(start, min(start + SEED_BATCH, attempts))
+        ])
+    db.session.commit()
+    return quiz.id, options
+
+def regrade(quiz_id, chunk_size, total):
+    """Run the job as ``flask regrade-quiz`` does, committing per chunk; returns (seconds, attempts changed)"""
+    quiz = db.session.get(Quiz, quiz_id)
+    graded = changed = 0
+    step = max(total // 10, 1)
+    start = time.perf_counter()
+    for chunk_graded, chunk_changed in regrade_quiz(quiz, chunk_size):
+        db.session.commit()
+        if (graded + chunk_graded) // step > graded // step:
+            elapsed = time.perf_counter() - start
+            print(f'    {graded + chunk_graded}/{total} graded, {changed + chunk_changed} changed, {elapsed:.1f}s')
+        graded += chunk_graded
+        changed += chunk_changed
+    db.session.commit()
+    assert graded == total
+    return time.perf_counter() - start, changed
+
+def check(quiz_id, sample=1000):
+    """Stored results of the first ``sample`` attempts against grading each one directly"""
+    key = load_answer_key(quiz_id)
+    attempts = QuizAttempt.query.filter_by(quiz_id=quiz_id).order_by(QuizAttempt.id).limit(sample).all()
+    for attempt in attempts:
+        score, max_score, percentage = grade_answers(key, attempt.answers)
+        assert (attempt.score, attempt.max_score, attempt.percentage) == (score, max_score, percentage), attempt.id
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--attempts', type=int, default=1000000)
+    parser.add_argument('--questions', type=int, default=20)
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    args = parser.parse_args()
+    random.seed(1)
+    
+    with benchmark_app() as app:
+        with app.app_context():
+            start = time.perf_counter()
+            quiz_id, options = seed(args.attempts, args.questions)
+            print(f'seeded {args.attempts} attempts at a {args.questions}-question quiz in {time.perf_counter() - start:.0f}s')
+            
+            def report(label):
+                print(f'  {label}:')
+                elapsed, changed = regrade(quiz_id, args.chunk_size, args.attempts)
+                check(quiz_id)
+                print(f'  {label}: {elapsed:.1f}s, {args.attempts / elapsed:.0f} attempts/s, {changed} changed')
+            
+            report('ungraded, every attempt written')
+            report('key unchanged, nothing written')
+            
+            # The fix: the second option was the right answer to half the questions
+            fixed = list(options.values())[::2]
+            db.session.execute(update(Answer).where(Answer.id.in_([answer_ids[0] for answer_ids in fixed])).values(is_correct=False))
+            db.session.execute(update(Answer).where(Answer.id.in_([answer_ids[1] for answer_ids in fixed])).values(is_correct=True))
+            db.session.commit()
+            report('half the key fixed')
+
+if __name__ == '__main__':
+    main()
@@ -26,12 +26,58 @@ class Config:
     MAIL_USERNAME = os.environ.get('MAIL_USERNAME')
     MAIL_PASSWORD = os.environ.get('MAIL_PASSWORD')
     
+    # SQLite journal mode, applied to every connection (ignored on other databases)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE') or 'WAL'
+    
     # Pagination
     POSTS_PER_PAGE = 10
     
+    # Response cache for the public catalog endpoints
+    RESPONSE_CACHE_ENABLED = os.environ.get('RESPONSE_CACHE_ENABLED', 'true').lower() in ['true', 'on', '1']
+    RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get('RESPONSE_CACHE_MAX_ENTRIES') or 10000)
+    RESPONSE_CACHE_TTL = int(os.environ.get('RESPONSE_CACHE_TTL') or 300)  # seconds
+    
+    # Cache-Control max-age of public catalog responses; 0 makes clients
+    # revalidate every time, which ETags turn into cheap 304s
+    HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE') or 0)
+    
+    # Lower edges of the price histogram buckets in product facets
+    PRODUCT_PRICE_BUCKETS = [0, 25, 50, 100, 250, 500, 1000]
+    
+    # Seconds a cart holds stock after its last change
+    CART_HOLD_TTL = int(os.environ.get('CART_HOLD_TTL') or 15 * 60)
+    
+    # Neighbors kept per product for "frequently bought together"
+    RELATED_PRODUCTS_TOP_K = int(os.environ.get('RELATED_PRODUCTS_TOP_K') or 20)
+    
+    # Longest date range a seller analytics request may cover
+    SELLER_ANALYTICS_MAX_DAYS = int(os.environ.get('SELLER_ANALYTICS_MAX_DAYS') or 3 * 366)
+    
+    # Bulk product import
+    PRODUCT_IMPORT_CHUNK_SIZE = int(os.environ.get('PRODUCT_IMPORT_CHUNK_SIZE') or 1000)
+    
     # Payment Configuration (Stripe)
     STRIPE_PUBLISHABLE_KEY = os.environ.get('STRIPE_PUBLISHABLE_KEY')
     STRIPE_SECRET_KEY = os.environ.get('STRIPE_SECRET_KEY')
+    STRIPE_WEBHOOK_SECRET = os.environ.get('STRIPE_WEBHOOK_SECRET')
+    STRIPE_WEBHOOK_TOLERANCE = int(os.environ.get('STRIPE_WEBHOOK_TOLERANCE') or 300)  # seconds
+    
+    # Payment Configuration (Flutterwave webhooks carry this secret hash in verif-hash)
+    FLUTTERWAVE_WEBHOOK_HASH = os.environ.get('FLUTTERWAVE_WEBHOOK_HASH')
+    
+    # Webhook events applied to orders per worker batch
+    PAYMENT_EVENT_BATCH_SIZE = int(os.environ.get('PAYMENT_EVENT_BATCH_SIZE') or 1000)
+    
+    # Seconds between writes of buffered lesson progress heartbeats; 0 writes each one through
+    PROGRESS_FLUSH_INTERVAL = float(os.environ.get('PROGRESS_FLUSH_INTERVAL') or 5)
+    # Pending heartbeats (one per enrollment) that trigger an early write
+    PROGRESS_BUFFER_MAX_ENTRIES = int(os.environ.get('PROGRESS_BUFFER_MAX_ENTRIES') or 50000)
+    
+    # Quiz attempts graded and written per batch by flask regrade-quiz
+    QUIZ_REGRADE_CHUNK_SIZE = int(os.environ.get('QUIZ_REGRADE_CHUNK_SIZE') or 5000)
+    
+    # Quiz attempts read per batch by flask refresh-quiz-stats
+    QUIZ_STATS_CHUNK_SIZE = int(os.environ.get('QUIZ_STATS_CHUNK_SIZE') or 5000)
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -0,0 +1,136 @@
+import os
+import threading
+import time
+from concurrent.futures import Future
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Point at the local stand-in (python flutterwave_stub.py) with FLUTTERWAVE_API_BASE=http://127.0.0.1:12112
+FLUTTERWAVE_API_BASE = os.environ.get("FLUTTERWAVE_API_BASE", "https://api.flutterwave.com")
+FLUTTERWAVE_CONNECT_TIMEOUT = float(os.environ.get("FLUTTERWAVE_CONNECT_TIMEOUT", 3.05))
+FLUTTERWAVE_READ_TIMEOUT = float(os.environ.get("FLUTTERWAVE_READ_TIMEOUT", 10))
+FLUTTERWAVE_MAX_RETRIES = int(os.environ.get("FLUTTERWAVE_MAX_RETRIES", 2))
+FLUTTERWAVE_POOL_SIZE = int(os.environ.get("FLUTTERWAVE_POOL_SIZE", 20))
+# Seconds a successful/failed/cancelled verification is answered from memory
+VERIFICATION_CACHE_TTL = float(os.environ.get("VERIFICATION_CACHE_TTL", 300))
+# Cached results beyond which expired entries are swept
+VERIFICATION_CACHE_MAX_ENTRIES = 10000
+
+TERMINAL_STATUSES = {"successful", "failed", "cancelled"}
+
+class VerificationError(Exception):
+    """Raised when Flutterwave cannot be reached or does not answer with a 200."""
+
+def payment_status(result):
+    """Return the transaction status of a verify response, e.g. "successful" or "pending"."""
+    if result.get("status") != "success":
+        return None
+    return (result.get("data") or {}).get("status")
+
+class FlutterwaveVerifier:
+    """Verifies transactions by reference over a pooled keep-alive session.
+
+    Results whose transaction status is terminal are cached for
+    VERIFICATION_CACHE_TTL seconds, so client retries are answered without
+    calling Flutterwave again. Concurrent verifications of the same
+    reference share a single upstream request. Pending results are not
+    cached, so the client's next check asks Flutterwave again.
+    """
+
+    def __init__(self, secret_key, api_base=FLUTTERWAVE_API_BASE, cache_ttl=VERIFICATION_CACHE_TTL):
+        self.secret_key = secret_key
+        self.api_base = api_base.rstrip("/")
+        self.cache_ttl = cache_ttl
+        self._lock = threading.Lock()
+        self._cache = {}
+        self._in_flight = {}
+        self._session = None
+        self._session_pid = None
+
+    def _get_session(self):
+        # A pool opened before the server forks its workers must not be shared with them
+        if self._session_pid != os.getpid():
+            session = requests.Session()
+            adapter = HTTPAdapter(
+                pool_connections=1,
+                pool_maxsize=FLUTTERWAVE_POOL_SIZE,
+                max_retries=Retry(
+                    total=FLUTTERWAVE_MAX_RETRIES,
+                    backoff_factor=0.2,
+                    backoff_jitter=0.2,
+                    status_forcelist=(429, 502, 503, 504),
+                    allowed_methods=("GET",),
+                    raise_on_status=False
+                )
+            )
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+            session.headers.update({
+                "Authorization": f"Bearer {self.secret_key}",
+                "Content-Type": "application/json"
+            })
+            self._session, self._session_pid = session, os.getpid()
+        return self._session
+
+    def _fetch(self, tx_ref):
+        try:
+            resp = self._get_session().get(
+                f"{self.api_base}/v3/transactions/verify_by_reference",
+                params={"tx_ref": tx_ref},
+                timeout=(FLUTTERWAVE_CONNECT_TIMEOUT, FLUTTERWAVE_READ_TIMEOUT)
+            )
+        except requests.RequestException as e:
+            raise VerificationError(str(e)) from e
+        if resp.status_code != 200:
+            raise VerificationError(f"Flutterwave answered {resp.status_code}")
+        try:
+            return resp.json()
+        except ValueError as e:
+            raise VerificationError("Flutterwave answered with invalid JSON") from e
+
+    def _cached(self, tx_ref):
+        entry = self._cache.get(tx_ref)
+        if entry is None:
+            return None
+        expires_at, result = entry
+        if expires_at < time.monotonic():
+            del self._cache[tx_ref]
+            return None
+        return result
+
+    def _record(self, tx_ref, result):
+        status = payment_status(result)
+        if status in TERMINAL_STATUSES:
+            self._cache[tx_ref] = (time.monotonic() + self.cache_ttl, result)
+            if len(self._cache) > VERIFICATION_CACHE_MAX_ENTRIES:
+                now = time.monotonic()
+                for key in [key for key, (expires_at, _) in self._cache.items() if expires_at < now]:
+                    del self._cache[key]
+
+    def verify(self, tx_ref):
+        """Return Flutterwave's verify response for ``tx_ref``, raising VerificationError on failure."""
+        with self._lock:
+            result = self._cached(tx_ref)
+            if result is not None:
+                return result
+            future = self._in_flight.get(tx_ref)
+            leader = future is None
+            if leader:
+                future = self._in_flight[tx_ref] = Future()
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = self._fetch(tx_ref)
+        except BaseException as e:
+            with self._lock:
+                del self._in_flight[tx_ref]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._record(tx_ref, result)
+            del self._in_flight[tx_ref]
+        future.set_result(result)
+        return result
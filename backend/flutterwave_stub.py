@@ -0,0 +1,92 @@
+"""Local stand-in for Flutterwave's verify-by-reference endpoint.
+
+GET /v3/transactions/verify_by_reference?tx_ref=... answers with a
+Flutterwave-shaped body. The transaction status is taken from the
+reference's prefix (``ok-``: successful, ``fail-``: failed, ``pend-``:
+pending, anything else: not found), and can be changed at runtime with
+``set_status`` to simulate a pending payment completing:
+
+    python flutterwave_stub.py --port 12112 --latency 0.05
+    FLUTTERWAVE_API_BASE=http://127.0.0.1:12112 python app.py
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+PREFIX_STATUSES = {"ok-": "successful", "fail-": "failed", "pend-": "pending"}
+
+class FlutterwaveStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    statuses = {}
+    lock = threading.Lock()
+    requests_served = 0
+
+    def _send(self, status, body):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        with self.lock:
+            type(self).requests_served += 1
+        if self.latency:
+            time.sleep(self.latency)
+        if url.path != "/v3/transactions/verify_by_reference":
+            self._send(404, {"status": "error", "message": "Not found", "data": None})
+            return
+
+        tx_ref = parse_qs(url.query).get("tx_ref", [""])[0]
+        with self.lock:
+            status = self.statuses.get(tx_ref)
+        if status is None:
+            status = next((value for prefix, value in PREFIX_STATUSES.items() if tx_ref.startswith(prefix)), None)
+        if status is None:
+            self._send(400, {"status": "error", "message": "No transaction was found for this id", "data": None})
+            return
+        self._send(200, {
+            "status": "success",
+            "message": "Transaction fetched successfully",
+            "data": {"tx_ref": tx_ref, "status": status, "amount": 100, "currency": "NGN"},
+        })
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host="127.0.0.1", port=12112, latency=0.0):
+    """Start the stub in a background thread and return the server."""
+    handler = type("ConfiguredFlutterwaveStubHandler", (FlutterwaveStubHandler,), {
+        "latency": latency,
+        "statuses": {},
+        "lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def set_status(server, tx_ref, status):
+    """Make ``server`` report ``status`` for ``tx_ref`` from now on."""
+    with server.RequestHandlerClass.lock:
+        server.RequestHandlerClass.statuses[tx_ref] = status
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Flutterwave API stub.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12112)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.latency)
+    print(f"Flutterwave stub listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -1,15 +1,24 @@
 import os
 import uuid
-from flask import Blueprint, request, jsonify, render_template
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from datetime import datetime
+from flask import Blueprint, request, jsonify, render_template, stream_template
+from markupsafe import Markup
 from flask_cors import CORS
 import stripe
+import stripe_client
+from product_catalog import ProductCatalog
+from payment_webhooks import InvalidSignatureError, advances, event_outcome, verify_stripe_signature
 
 marketplace_bp = Blueprint('marketplace', __name__)
 CORS_kwargs = {}
 CORS(marketplace_bp, **CORS_kwargs)
 
-# Demo product list (in-memory, not for production)
-PRODUCTS = [
+# Demo product catalog (in-memory, not for production)
+PRODUCTS = ProductCatalog([
     # Electronics
     {"id": str(uuid.uuid4()), "name": "iPhone 15 Pro Max", "category": "Electronics", "price": 1299.00, "description": "Apple iPhone 15 Pro Max, 256GB, Space Black, Unlocked.", "type": "physical", "imageUrl": "https://images.unsplash.com/photo-1511707171634-5f897ff02aa9", "discount": "5%"},
     {"id": str(uuid.uuid4()), "name": "Samsung Galaxy S24 Ultra", "category": "Electronics", "price": 1199.00, "description": "Samsung Galaxy S24 Ultra, 512GB, Phantom Black, Unlocked.", "type": "physical", "imageUrl": "https://images.unsplash.com/photo-1517336714731-489689fd1ca8", "discount": None},
@@ -46,13 +55,25 @@ PRODUCTS = [
     # Freelance Services
     {"id": str(uuid.uuid4()), "name": "Logo Design Service", "category": "Freelance Services", "price": 120.00, "description": "Professional logo design delivered in 3 days. Includes 3 concepts.", "type": "service", "imageUrl": "https://images.unsplash.com/photo-1504384308090-c894fdcc538d", "discount": "10%"},
     {"id": str(uuid.uuid4()), "name": "Website Audit (Freelance)", "category": "Freelance Services", "price": 75.00, "description": "Detailed website audit and improvement report by a web expert.", "type": "service", "imageUrl": "https://images.unsplash.com/photo-1461749280684-dccba630e2f6", "discount": None},
-]
+])
 ORDERS = []  # Store orders in memory for demo
+ORDERS_BY_NUMBER = {}  # The same orders keyed by order_number, for webhook events
+
+# Rendered product fragments keyed by (product id, content hash), least recently used evicted first
+FRAGMENT_CACHE_SIZE = int(os.environ.get("FRAGMENT_CACHE_SIZE", 10000))
+_fragment_cache = OrderedDict()
+_fragment_cache_lock = threading.Lock()
+
+# Products per page of the HTML listing
+HTML_PAGE_SIZE = 50
+HTML_MAX_PAGE_SIZE = 500
 
 # Stripe API keys (use environment variables in production)
 STRIPE_SECRET_KEY = os.environ.get("STRIPE_SECRET_KEY", "sk_test_...")
 STRIPE_PUBLISHABLE_KEY = os.environ.get("STRIPE_PUBLISHABLE_KEY", "pk_test_...")
 stripe.api_key = STRIPE_SECRET_KEY
+STRIPE_WEBHOOK_SECRET = os.environ.get("STRIPE_WEBHOOK_SECRET")
+STRIPE_WEBHOOK_TOLERANCE = int(os.environ.get("STRIPE_WEBHOOK_TOLERANCE", 300))
 
 @marketplace_bp.route("/", methods=["GET"])
 def index():
@@ -84,9 +105,9 @@ def products():
             "imageUrl": data.get("imageUrl", ""),
             "discount": data.get("discount", None)
         }
-        PRODUCTS.append(product)
+        PRODUCTS.add(product)
         return jsonify(product), 201
-    return jsonify(PRODUCTS)
+    return jsonify(PRODUCTS.all())
 
 @marketplace_bp.route("/api/orders", methods=["GET"])
 def orders():
@@ -95,54 +116,93 @@ def orders():
 
 @marketplace_bp.route("/api/create-checkout-session", methods=["POST"])
 def create_checkout_session():
-    """Create a Stripe checkout session for a product purchase."""
+    """Create a Stripe checkout session for a product or a whole cart.
+
+    Send either ``product_id`` or ``items``: a list of
+    ``{"product_id": ..., "quantity": ...}`` lines.
+    """
     data = request.json
-    product_id = data.get("product_id")
-    product = next((p for p in PRODUCTS if p["id"] == product_id), None)
-    if not product:
-        return jsonify({"error": "Product not found"}), 404
-    price_cents = int(product["price"] * 1.03 * 100)  # Add 3% fee
+    items = data.get("items") or [{"product_id": data.get("product_id"), "quantity": 1}]
+    line_items = []
+    for item in items:
+        product = PRODUCTS.get(item.get("product_id"))
+        if not product:
+            return jsonify({"error": "Product not found"}), 404
+        quantity = item.get("quantity", 1)
+        if not isinstance(quantity, int) or isinstance(quantity, bool) or quantity < 1:
+            return jsonify({"error": "Quantity must be a positive integer"}), 400
+        price_cents = int(product["price"] * 1.03 * 100)  # Add 3% fee
+        line_items.append({
+            "price_data": {
+                "currency": "usd",
+                "product_data": {"name": product["name"]},
+                "unit_amount": price_cents,
+            },
+            "quantity": quantity,
+        })
+    order_number = f"ORD-{datetime.utcnow().strftime('%Y%m%d')}-{str(uuid.uuid4())[:8]}"
     try:
-        session = stripe.checkout.Session.create(
-            payment_method_types=["card"],
-            line_items=[{
-                "price_data": {
-                    "currency": "usd",
-                    "product_data": {"name": product["name"]},
-                    "unit_amount": price_cents,
-                },
-                "quantity": 1,
-            }],
-            mode="payment",
-            success_url=data["success_url"],
-            cancel_url=data["cancel_url"],
+        session = stripe_client.create_checkout_session(
+            STRIPE_SECRET_KEY, line_items, data["success_url"], data["cancel_url"], order_number=order_number
         )
-        ORDERS.append({
+        order = {
             "id": str(uuid.uuid4()),
-            "product_id": product_id,
+            "order_number": order_number,
+            "product_id": items[0]["product_id"],
+            "items": [{"product_id": item["product_id"], "quantity": item.get("quantity", 1)} for item in items],
             "session_id": session.id,
             "status": "pending"
-        })
-        return jsonify({"checkout_url": session.url})
+        }
+        ORDERS.append(order)
+        ORDERS_BY_NUMBER[order_number] = order
+        return jsonify({"checkout_url": session.url, "order_number": order_number})
+    except stripe.APIConnectionError:
+        return jsonify({"error": "Payment provider is unavailable, please try again"}), 503
     except Exception as e:
         return jsonify({"error": str(e)}), 400
 
+@marketplace_bp.route("/api/stripe-webhook", methods=["POST"])
+def stripe_webhook():
+    """Settle the order a signed Stripe event reports on.
+
+    Sessions carry the order's number as client_reference_id, and their
+    payment intents and charges as metadata.order_number. The order's
+    status moves forward like Order.payment_status does in the
+    database-backed API (pending, failed, paid, refunded).
+    """
+    payload = request.get_data()
+    try:
+        verify_stripe_signature(
+            payload, request.headers.get("Stripe-Signature"), STRIPE_WEBHOOK_SECRET, STRIPE_WEBHOOK_TOLERANCE
+        )
+        event = json.loads(payload)
+    except (InvalidSignatureError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    if not isinstance(event, dict):
+        return jsonify({"error": "Payload is not an event"}), 400
+
+    order_number, status = event_outcome("stripe", event.get("type"), event)
+    order = ORDERS_BY_NUMBER.get(order_number)
+    if order is not None and advances(order["status"], status):
+        order["status"] = status
+    return jsonify({"received": True})
+
 @marketplace_bp.route("/api/products/physical", methods=["GET"])
 def get_physical_products():
     """Return only physical products."""
-    physical_products = [p for p in PRODUCTS if p["type"] == "physical"]
+    physical_products = PRODUCTS.by_type("physical")
     return jsonify(physical_products)
 
 @marketplace_bp.route("/api/products/digital", methods=["GET"])
 def get_digital_products():
     """Return only digital products."""
-    digital_products = [p for p in PRODUCTS if p["type"] == "digital"]
+    digital_products = PRODUCTS.by_type("digital")
     return jsonify(digital_products)
 
 @marketplace_bp.route("/api/products/services", methods=["GET"])
 def get_service_products():
     """Return only service products."""
-    service_products = [p for p in PRODUCTS if p["type"] == "service"]
+    service_products = PRODUCTS.by_type("service")
     return jsonify(service_products)
 
 @marketplace_bp.route("/api/products/by-category", methods=["GET"])
@@ -151,24 +211,47 @@ def get_products_by_category():
     category = request.args.get("category")
     if not category:
         return jsonify({"error": "Category query parameter is required."}), 400
-    filtered_products = [p for p in PRODUCTS if p["category"].lower() == category.lower()]
+    filtered_products = PRODUCTS.by_category(category)
     return jsonify(filtered_products)
 
 @marketplace_bp.route("/api/products/search", methods=["GET"])
 def search_products():
     """Search products by query string."""
-    query = request.args.get("query", "").lower()
+    query = request.args.get("query", "")
     if not query:
-        return jsonify(PRODUCTS)
-    results = [
-        p for p in PRODUCTS
-        if query in p["name"].lower() or query in p["description"].lower() or query in p["category"].lower()
-    ]
+        return jsonify(PRODUCTS.all())
+    results = PRODUCTS.search(query)
     if not results:
-        return jsonify(PRODUCTS)
+        return jsonify(PRODUCTS.all())
     return jsonify(results)
 
+def render_product_fragment(product):
+    """Render one product's HTML, reusing the cached fragment while its content is unchanged."""
+    content_hash = hashlib.sha1(json.dumps(product, sort_keys=True, default=str).encode()).hexdigest()
+    key = (product["id"], content_hash)
+    with _fragment_cache_lock:
+        fragment = _fragment_cache.get(key)
+        if fragment is not None:
+            _fragment_cache.move_to_end(key)
+            return fragment
+    fragment = Markup(render_template("product_fragment.html", product=product))
+    with _fragment_cache_lock:
+        _fragment_cache[key] = fragment
+        while len(_fragment_cache) > FRAGMENT_CACHE_SIZE:
+            _fragment_cache.popitem(last=False)
+    return fragment
+
 @marketplace_bp.route("/products", methods=["GET"])
 def products_html():
-    """Render the product list as an HTML page using Jinja2."""
-    return render_template("products.html", products=PRODUCTS)
+    """Stream one page of the product list as HTML, rendering each product from the fragment cache."""
+    page = max(request.args.get("page", 1, type=int), 1)
+    per_page = min(max(request.args.get("per_page", HTML_PAGE_SIZE, type=int), 1), HTML_MAX_PAGE_SIZE)
+    pages = max((len(PRODUCTS) + per_page - 1) // per_page, 1)
+    products = PRODUCTS.page((page - 1) * per_page, per_page)
+    return stream_template(
+        "products.html",
+        fragments=(render_product_fragment(product) for product in products),
+        page=page,
+        per_page=per_page,
+        pages=pages
+    )
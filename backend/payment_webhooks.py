@@ -0,0 +1,81 @@
+"""Provider-neutral parts of payment webhook handling.
+
+Signature checks, the mapping from a provider event to the order number
+and payment status it reports, and the forward-only order of payment
+statuses. Both the database-backed API (app.services.payment_events) and
+the standalone marketplace_api use these, so this module must not import
+from ``app``.
+"""
+import hashlib
+import hmac
+import time
+
+class InvalidSignatureError(Exception):
+    """Raised when a webhook's signature does not match the configured secret."""
+
+# Later statuses win over earlier ones
+PAYMENT_STATUS_RANK = {"pending": 0, "failed": 1, "paid": 2, "refunded": 3}
+
+STRIPE_EVENT_STATUSES = {
+    "checkout.session.completed": "paid",
+    "checkout.session.async_payment_succeeded": "paid",
+    "checkout.session.async_payment_failed": "failed",
+    "payment_intent.succeeded": "paid",
+    "payment_intent.payment_failed": "failed",
+    "charge.refunded": "refunded",
+}
+
+FLUTTERWAVE_STATUSES = {"successful": "paid", "failed": "failed", "cancelled": "failed"}
+
+def advances(current, status):
+    """Return whether ``status`` moves a payment on from ``current`` (None counts as pending)."""
+    return PAYMENT_STATUS_RANK[status] > PAYMENT_STATUS_RANK.get(current or "pending", 0)
+
+def verify_stripe_signature(payload, header, secret, tolerance, now=None):
+    """Check a ``Stripe-Signature`` header (t=..., v1=...) against the raw request body."""
+    if not secret or not header:
+        raise InvalidSignatureError("Missing signature")
+
+    timestamp, signatures = None, []
+    for part in header.split(","):
+        name, _, value = part.strip().partition("=")
+        if name == "t":
+            timestamp = value
+        elif name == "v1":
+            signatures.append(value)
+    if not timestamp or not timestamp.isdigit() or not signatures:
+        raise InvalidSignatureError("Malformed signature header")
+
+    expected = hmac.new(secret.encode(), timestamp.encode() + b"." + payload, hashlib.sha256).hexdigest()
+    if not any(hmac.compare_digest(expected, signature) for signature in signatures):
+        raise InvalidSignatureError("Signature mismatch")
+    if abs((now or time.time()) - int(timestamp)) > tolerance:
+        raise InvalidSignatureError("Timestamp outside the tolerance zone")
+
+def verify_flutterwave_signature(header, secret_hash):
+    """Check a ``verif-hash`` header against the secret hash set on the Flutterwave dashboard."""
+    if not secret_hash or not header or not hmac.compare_digest(header, secret_hash):
+        raise InvalidSignatureError("Signature mismatch")
+
+def event_outcome(provider, event_type, payload):
+    """Return the (order_number, payment status) an event reports, or (None, None) if it is not about a payment.
+
+    Stripe sessions carry the order number as client_reference_id, and
+    sessions, payment intents and their charges as metadata.order_number.
+    Flutterwave payments carry it as tx_ref.
+    """
+    if provider == "stripe":
+        status = STRIPE_EVENT_STATUSES.get(event_type)
+        payment = (payload.get("data") or {}).get("object") or {}
+        if event_type == "checkout.session.completed" and payment.get("payment_status") == "unpaid":
+            # Delayed payment methods report the outcome in a later async_payment event
+            status = None
+        reference = payment.get("client_reference_id") or (payment.get("metadata") or {}).get("order_number")
+    else:
+        payment = payload.get("data") or {}
+        status = FLUTTERWAVE_STATUSES.get(payment.get("status")) if event_type == "charge.completed" else None
+        reference = payment.get("tx_ref")
+
+    if not status or not reference:
+        return None, None
+    return reference, status
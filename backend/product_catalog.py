@@ -0,0 +1,138 @@
+import re
+import threading
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Longest substring indexed in the vocabulary's n-gram index
+GRAM_SIZE = 3
+
+def _tokens(text):
+    return TOKEN_PATTERN.findall(text.lower())
+
+def _grams(token):
+    """Every substring of ``token`` of one to GRAM_SIZE characters."""
+    return {
+        token[start:start + size]
+        for size in range(1, GRAM_SIZE + 1)
+        for start in range(len(token) - size + 1)
+    }
+
+class ProductCatalog:
+    """In-memory product catalog with lookups by id, type, category and search text.
+
+    Products are kept in insertion order and indexed as they are added:
+    a hash map by id, posting lists by type and lower-cased category, and an
+    inverted index from word tokens (name, description and category) to
+    product positions. The vocabulary is itself indexed by n-grams, so the
+    tokens containing a search word are found without scanning every token.
+    Writers hold a lock; readers take the lock only while collecting
+    positions, so lookups never see a half-indexed product.
+    """
+
+    def __init__(self, products=()):
+        self._lock = threading.Lock()
+        self._products = []
+        self._search_text = []
+        self._by_id = {}
+        self._by_type = {}
+        self._by_category = {}
+        self._by_token = {}
+        self._tokens_by_gram = {}
+        for product in products:
+            self.add(product)
+
+    def __len__(self):
+        return len(self._products)
+
+    def add(self, product):
+        """Add a product and index it."""
+        # Products posted as JSON may carry numbers or nulls in text fields
+        name = str(product["name"]).lower()
+        category = str(product["category"]).lower()
+        search_text = "\0".join((name, str(product.get("description") or "").lower(), category))
+        with self._lock:
+            position = len(self._products)
+            self._products.append(product)
+            self._search_text.append(search_text)
+            self._by_id[product["id"]] = position
+            self._by_type.setdefault(product.get("type"), []).append(position)
+            self._by_category.setdefault(category, []).append(position)
+            for token in set(_tokens(search_text)):
+                if token not in self._by_token:
+                    self._by_token[token] = []
+                    for gram in _grams(token):
+                        self._tokens_by_gram.setdefault(gram, set()).add(token)
+                self._by_token[token].append(position)
+        return product
+
+    def all(self):
+        """Return every product in insertion order."""
+        with self._lock:
+            return list(self._products)
+
+    def page(self, offset, limit):
+        """Return up to ``limit`` products starting at position ``offset``."""
+        with self._lock:
+            return self._products[offset:offset + limit]
+
+    def get(self, product_id):
+        """Return the product with the given id, or None."""
+        position = self._by_id.get(product_id)
+        return self._products[position] if position is not None else None
+
+    def _select(self, positions):
+        with self._lock:
+            return [self._products[position] for position in positions]
+
+    def by_type(self, product_type):
+        """Return the products of one type (physical, digital or service)."""
+        return self._select(self._by_type.get(product_type, ()))
+
+    def by_category(self, category):
+        """Return the products in a category, matched case-insensitively."""
+        return self._select(self._by_category.get(str(category).lower(), ()))
+
+    def _containing(self, word):
+        """Return the vocabulary tokens that contain ``word``; call with the lock held."""
+        if len(word) <= GRAM_SIZE:
+            return set(self._tokens_by_gram.get(word, ()))
+        grams = sorted(
+            (self._tokens_by_gram.get(word[start:start + GRAM_SIZE], set())
+             for start in range(len(word) - GRAM_SIZE + 1)),
+            key=len
+        )
+        return {token for token in grams[0].intersection(*grams[1:]) if word in token}
+
+    def search(self, query):
+        """Return the products whose name, description or category contains ``query``.
+
+        Matching is a case-insensitive substring test, as before the catalog
+        was indexed. Every word of the query must occur inside some word of a
+        matching product, so candidates are the intersection of the postings
+        of the vocabulary words containing each query word, found through the
+        n-gram index. Only the candidates are checked against the full text,
+        after the lock is released.
+        """
+        query = query.lower()
+        words = set(_tokens(query))
+        with self._lock:
+            # Posting lists only grow, so their current lengths pin a snapshot
+            postings = [
+                [(self._by_token[token], len(self._by_token[token])) for token in self._containing(word)]
+                for word in words
+            ]
+            size = len(self._products)
+        candidates = None
+        for lists in sorted(postings, key=lambda lists: sum(length for _, length in lists)):
+            positions = set()
+            for posting, length in lists:
+                positions.update(posting[:length])
+            candidates = positions if candidates is None else candidates & positions
+            if not candidates:
+                return []
+        if candidates is None:
+            candidates = range(size)
+        return [
+            self._products[position] for position in sorted(candidates)
+            if query in self._search_text[position]
+        ]
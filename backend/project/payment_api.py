@@ -1,6 +1,7 @@
 import os
 from flask import Blueprint, request, jsonify
 import stripe
+from stripe_client import create_payment_intent as create_stripe_payment_intent
 
 payment_bp = Blueprint('payment', __name__)
 
@@ -25,11 +26,9 @@ def create_payment_intent():
     try:
         amount = int(data.get('amount'))
         currency = data.get('currency', 'usd')
-        intent = stripe.PaymentIntent.create(
-            amount=amount,
-            currency=currency,
-            automatic_payment_methods={"enabled": True},
-        )
+        intent = create_stripe_payment_intent(STRIPE_SECRET_KEY, amount, currency)
         return jsonify({'clientSecret': intent.client_secret})
+    except stripe.APIConnectionError:
+        return jsonify({'error': 'Payment provider is unavailable, please try again'}), 503
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -5,6 +5,7 @@ A comprehensive multi-feature platform (Marketplace + Education + Entertainment)
 """
 
 import os
+import click
 from app import create_app, db
 from app.models import *  # Import all models
 
@@ -17,6 +18,159 @@ def create_db():
     db.create_all()
     print("Database tables created!")
 
+@app.cli.command()
+def rebuild_search_index():
+    """Create the product full-text index if missing and repopulate it"""
+    from app.services.product_search import rebuild_search_index as rebuild
+    rebuild()
+    print("Product search index rebuilt!")
+
+@app.cli.command()
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--seller', required=True, help='Username of the seller that will own the products')
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']), help='Defaults to the file extension')
+@click.option('--chunk-size', type=int, default=None, help='Rows per INSERT')
+def import_products(path, seller, fmt, chunk_size):
+    """Bulk import products from a CSV or NDJSON file"""
+    from app.models.user import User
+    from app.services.product_import import import_products as run_import
+    
+    user = User.query.filter_by(username=seller).first()
+    if not user or not user.is_seller():
+        raise click.ClickException(f'{seller} is not a seller')
+    
+    fmt = fmt or ('csv' if path.lower().endswith('.csv') else 'ndjson')
+    chunk_size = chunk_size or app.config['PRODUCT_IMPORT_CHUNK_SIZE']
+    
+    with open(path, 'rb') as stream:
+        result = run_import(stream, fmt, user.id, chunk_size=chunk_size)
+    
+    for error in result.errors:
+        print(f"Row {error['row']}: {error['error']}")
+    print(f"Imported {result.imported} products, {result.failed} rows failed")
+
+@app.cli.command()
+def release_expired_holds():
+    """Return stock held by carts whose holds have expired"""
+    from app.services.inventory import release_expired_holds as release
+    released = release()
+    db.session.commit()
+    print(f"Released {released} held units back to stock")
+
+@app.cli.command()
+@click.option('--watch', type=float, default=None, help='Keep polling the queue every WATCH seconds')
+def process_payment_events(watch):
+    """Apply queued payment webhook events to their orders"""
+    import time
+    from app.services.payment_events import process_payment_events as process
+    batch_size = app.config['PAYMENT_EVENT_BATCH_SIZE']
+    while True:
+        events = orders = 0
+        while True:
+            processed, updated = process(batch_size)
+            db.session.commit()
+            if not processed:
+                break
+            events += processed
+            orders += updated
+        if events or not watch:
+            print(f"Processed {events} payment events, updated {orders} orders")
+        if not watch:
+            break
+        time.sleep(watch)
+
+@app.cli.command()
+def record_related_products():
+    """Fold orders placed since the last run into the co-purchase model"""
+    from app.services.related_products import record_orders, refresh_stale_neighbors
+    top_k = app.config['RELATED_PRODUCTS_TOP_K']
+    total = refreshed = 0
+    while True:
+        recorded = record_orders(top_k)
+        db.session.commit()
+        if not recorded:
+            break
+        total += recorded
+    # Products whose counts were recorded at checkout
+    while True:
+        ranked = refresh_stale_neighbors(top_k)
+        db.session.commit()
+        if not ranked:
+            break
+        refreshed += ranked
+    print(f"Recorded {total} orders, re-ranked {refreshed} products")
+
+@app.cli.command()
+def rebuild_related_products():
+    """Recompute the co-purchase model from the full order history"""
+    from app.services.related_products import rebuild_related_products as rebuild
+    pairs = rebuild(app.config['RELATED_PRODUCTS_TOP_K'])
+    db.session.commit()
+    print(f"Related products rebuilt from {pairs} co-purchased pairs")
+
+@app.cli.command()
+def rebuild_sales_rollups():
+    """Recompute the seller daily sales rollups from the order history"""
+    from app.services.sales_rollups import rebuild_sales_rollups as rebuild
+    rows = rebuild()
+    db.session.commit()
+    print(f"Sales rollups rebuilt ({rows} rows)")
+
+@app.cli.command()
+def reconcile_counters():
+    """Recompute course enrollment counts, course ratings and quiz question counts from their rows"""
+    from app.services.counters import reconcile_counters as reconcile
+    corrected = reconcile()
+    db.session.commit()
+    for counter, rows in corrected.items():
+        print(f"{counter}: corrected {rows} rows")
+
+@app.cli.command()
+@click.argument('quiz_id', type=int)
+@click.option('--chunk-size', type=int, default=None, help='Attempts graded per batch')
+def regrade_quiz(quiz_id, chunk_size):
+    """Re-grade every attempt at a quiz against its current answer key"""
+    from app.models.education import Quiz, QuizAttempt
+    from app.services.quiz_regrade import regrade_quiz as regrade
+    
+    quiz = Quiz.query.get(quiz_id)
+    if not quiz:
+        raise click.ClickException(f'Quiz {quiz_id} not found')
+    
+    total = QuizAttempt.query.filter_by(quiz_id=quiz_id).count()
+    graded = changed = 0
+    for chunk_graded, chunk_changed in regrade(quiz, chunk_size or app.config['QUIZ_REGRADE_CHUNK_SIZE']):
+        db.session.commit()
+        graded += chunk_graded
+        changed += chunk_changed
+        print(f"{graded}/{total} attempts graded, {changed} changed")
+    db.session.commit()
+    print(f"Re-graded {graded} attempts at quiz {quiz_id}, {changed} changed")
+
+@app.cli.command()
+@click.option('--quiz', 'quiz_id', type=int, default=None, help='Refresh only this quiz')
+@click.option('--watch', type=float, default=None, help='Keep refreshing every WATCH seconds')
+def refresh_quiz_stats(quiz_id, watch):
+    """Fold new quiz attempts into the per-question item analysis"""
+    import time
+    from app.models.education import Quiz
+    from app.services.quiz_stats import refresh_quiz_stats as refresh, stale_quiz_ids
+    chunk_size = app.config['QUIZ_STATS_CHUNK_SIZE']
+    while True:
+        quizzes = attempts = 0
+        for stale_id in ([quiz_id] if quiz_id else stale_quiz_ids()):
+            quiz = Quiz.query.get(stale_id)
+            if not quiz:
+                raise click.ClickException(f'Quiz {stale_id} not found')
+            attempts += refresh(quiz, chunk_size)
+            db.session.commit()
+            quizzes += 1
+        if quizzes or not watch:
+            print(f"Refreshed statistics of {quizzes} quizzes with {attempts} new attempts")
+        if not watch:
+            break
+        time.sleep(watch)
+
 @app.cli.command()
 def seed_db():
     """Seed database with sample data"""
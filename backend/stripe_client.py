@@ -0,0 +1,95 @@
+import os
+import random
+import threading
+import requests
+import stripe
+from requests.adapters import HTTPAdapter
+
+# Point at the local stub (python stripe_stub.py) with STRIPE_API_BASE=http://127.0.0.1:12111
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE")
+STRIPE_CONNECT_TIMEOUT = float(os.environ.get("STRIPE_CONNECT_TIMEOUT", 3.05))
+STRIPE_READ_TIMEOUT = float(os.environ.get("STRIPE_READ_TIMEOUT", 10))
+STRIPE_MAX_RETRIES = int(os.environ.get("STRIPE_MAX_RETRIES", 2))
+STRIPE_RETRY_BASE_DELAY = float(os.environ.get("STRIPE_RETRY_BASE_DELAY", 0.25))
+STRIPE_RETRY_MAX_DELAY = float(os.environ.get("STRIPE_RETRY_MAX_DELAY", 2))
+STRIPE_POOL_SIZE = int(os.environ.get("STRIPE_POOL_SIZE", 20))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+class PooledRequestsClient(stripe.RequestsClient):
+    """Stripe HTTP client with a capped, fully jittered retry delay.
+
+    The library's own backoff waits at least 0.5 s and up to 5 s between
+    attempts; here each wait is drawn from [0, min(max delay, base * 2^n)]
+    so retries from many workers spread out and a request gives up quickly.
+    """
+
+    def _sleep_time_seconds(self, num_retries):
+        return random.uniform(0, min(STRIPE_RETRY_MAX_DELAY, STRIPE_RETRY_BASE_DELAY * 2 ** (num_retries - 1)))
+
+def _session():
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=STRIPE_POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def get_stripe_client(api_key):
+    """Return this process's Stripe client for ``api_key``.
+
+    The client keeps one keep-alive connection pool for every request
+    thread. Clients are created per process id so a pool opened before a
+    server forks its workers is never shared between them. Failed requests
+    are retried up to STRIPE_MAX_RETRIES times with an idempotency key, so
+    a retried create cannot charge twice.
+    """
+    key = (os.getpid(), api_key)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = stripe.StripeClient(
+                    api_key,
+                    base_addresses={"api": STRIPE_API_BASE} if STRIPE_API_BASE else None,
+                    max_network_retries=STRIPE_MAX_RETRIES,
+                    http_client=PooledRequestsClient(
+                        timeout=(STRIPE_CONNECT_TIMEOUT, STRIPE_READ_TIMEOUT),
+                        session=_session()
+                    )
+                )
+                _clients[key] = client
+    return client
+
+def create_checkout_session(api_key, line_items, success_url, cancel_url, order_number=None):
+    """Create a one-off payment checkout session for ``line_items``.
+
+    ``order_number`` is sent as the session's client_reference_id and as
+    metadata.order_number, which is how payment webhooks find the order.
+    It is also set on the payment intent the session creates, since
+    charge and refund events only carry the intent's metadata.
+    """
+    params = {
+        "payment_method_types": ["card"],
+        "line_items": line_items,
+        "mode": "payment",
+        "success_url": success_url,
+        "cancel_url": cancel_url,
+    }
+    if order_number:
+        params["client_reference_id"] = order_number
+        params["metadata"] = {"order_number": order_number}
+        params["payment_intent_data"] = {"metadata": {"order_number": order_number}}
+    return get_stripe_client(api_key).v1.checkout.sessions.create(params)
+
+def create_payment_intent(api_key, amount, currency, order_number=None):
+    """Create a payment intent with automatic payment methods, tagged with ``order_number``."""
+    params = {
+        "amount": amount,
+        "currency": currency,
+        "automatic_payment_methods": {"enabled": True},
+    }
+    if order_number:
+        params["metadata"] = {"order_number": order_number}
+    return get_stripe_client(api_key).v1.payment_intents.create(params)
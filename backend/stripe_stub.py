@@ -0,0 +1,138 @@
+"""Local stand-in for the parts of the Stripe API the payment code uses.
+
+Serves POST /v1/checkout/sessions and POST /v1/payment_intents with
+Stripe-shaped JSON, replays the stored response for a repeated
+Idempotency-Key like Stripe does, and can add latency and random 500s to
+exercise timeouts and retries:
+
+    python stripe_stub.py --port 12111 --latency 0.05 --error-rate 0.1
+    STRIPE_API_BASE=http://127.0.0.1:12111 python app.py
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+def _amount_total(params):
+    total = 0
+    index = 0
+    while f"line_items[{index}][quantity]" in params:
+        unit_amount = int(params.get(f"line_items[{index}][price_data][unit_amount]", 0))
+        total += unit_amount * int(params[f"line_items[{index}][quantity]"])
+        index += 1
+    return total
+
+def _metadata(params):
+    return {key[len("metadata["):-1]: value for key, value in params.items() if key.startswith("metadata[")}
+
+def checkout_session(params):
+    session_id = f"cs_test_{uuid.uuid4().hex}"
+    return {
+        "id": session_id,
+        "object": "checkout.session",
+        "amount_total": _amount_total(params),
+        "currency": params.get("line_items[0][price_data][currency]", "usd"),
+        "mode": params.get("mode"),
+        "payment_status": "unpaid",
+        "status": "open",
+        "success_url": params.get("success_url"),
+        "cancel_url": params.get("cancel_url"),
+        "client_reference_id": params.get("client_reference_id"),
+        "metadata": _metadata(params),
+        "url": f"https://checkout.stripe.com/c/pay/{session_id}",
+    }
+
+def payment_intent(params):
+    intent_id = f"pi_{uuid.uuid4().hex[:24]}"
+    return {
+        "id": intent_id,
+        "object": "payment_intent",
+        "amount": int(params.get("amount", 0)),
+        "currency": params.get("currency", "usd"),
+        "status": "requires_payment_method",
+        "metadata": _metadata(params),
+        "client_secret": f"{intent_id}_secret_{uuid.uuid4().hex[:24]}",
+    }
+
+ROUTES = {
+    "/v1/checkout/sessions": checkout_session,
+    "/v1/payment_intents": payment_intent,
+}
+
+class StripeStubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    latency = 0.0
+    error_rate = 0.0
+    idempotent_responses = {}
+    lock = threading.Lock()
+    requests_served = 0
+
+    def _send(self, status, body, headers=()):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        params = dict(parse_qsl(self.rfile.read(length).decode()))
+        with self.lock:
+            type(self).requests_served += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+        handler = ROUTES.get(self.path)
+        if handler is None:
+            self._send(404, {"error": {"type": "invalid_request_error", "message": f"Unrecognized request URL (POST: {self.path})"}})
+            return
+        if random.random() < self.error_rate:
+            self._send(500, {"error": {"type": "api_error", "message": "Simulated failure"}}, [("Stripe-Should-Retry", "true")])
+            return
+
+        idempotency_key = self.headers.get("Idempotency-Key")
+        with self.lock:
+            body = self.idempotent_responses.get(idempotency_key) if idempotency_key else None
+            if body is None:
+                body = handler(params)
+                if idempotency_key:
+                    self.idempotent_responses[idempotency_key] = body
+        self._send(200, body, [("Request-Id", f"req_{uuid.uuid4().hex[:14]}")])
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(host="127.0.0.1", port=12111, latency=0.0, error_rate=0.0):
+    """Start the stub in a background thread and return the server."""
+    handler = type("ConfiguredStripeStubHandler", (StripeStubHandler,), {
+        "latency": latency,
+        "error_rate": error_rate,
+        "idempotent_responses": {},
+        "lock": threading.Lock(),
+    })
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a local Stripe API stub.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=12111)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds to wait before answering")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with a 500")
+    args = parser.parse_args()
+    server = serve(args.host, args.port, args.latency, args.error_rate)
+    print(f"Stripe stub listening on http://{args.host}:{server.server_port}")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,36 @@
+from collections import OrderedDict
+import pytest
+from flask import Flask
+from app import create_app, db
+from config import TestingConfig
+
+@pytest.fixture
+def make_app():
+    """Build apps on fresh in-memory databases, with config overrides as keyword arguments"""
+    def make(**config):
+        app = create_app(type('TestConfig', (TestingConfig,), config))
+        with app.app_context():
+            db.create_all()
+        return app
+    return make
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def legacy_client(monkeypatch):
+    """Client of the standalone marketplace_api blueprint, on a fresh copy of its in-memory data"""
+    import marketplace_api
+    from product_catalog import ProductCatalog
+    monkeypatch.setattr(marketplace_api, 'PRODUCTS', ProductCatalog(marketplace_api.PRODUCTS.all()))
+    monkeypatch.setattr(marketplace_api, 'ORDERS', [])
+    monkeypatch.setattr(marketplace_api, 'ORDERS_BY_NUMBER', {})
+    monkeypatch.setattr(marketplace_api, '_fragment_cache', OrderedDict())
+    app = Flask('marketplace_api')
+    app.register_blueprint(marketplace_api.marketplace_bp)
+    return app.test_client()
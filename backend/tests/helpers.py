@@ -0,0 +1,43 @@
+"""
+Helpers shared by the tests.
+
+``count_queries`` records every statement the app sends to the database
+while its block runs, so tests can check that an endpoint's query count
+stays the same however many rows it returns.
+"""
+
+from contextlib import contextmanager
+from sqlalchemy import event
+from flask_jwt_extended import create_access_token
+from app import db
+from app.models.user import User
+
+@contextmanager
+def count_queries(app):
+    """Collect the SQL statements executed inside the block"""
+    with app.app_context():
+        engine = db.engine
+    statements = []
+    
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+    
+    event.listen(engine, 'before_cursor_execute', before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, 'before_cursor_execute', before_cursor_execute)
+
+def auth_headers(app, user_id):
+    with app.app_context():
+        return {'Authorization': f'Bearer {create_access_token(identity=str(user_id))}'}
+
+def make_users(count, prefix='user', **fields):
+    """Add ``count`` users in the current app context and return them"""
+    users = [
+        User(username=f'{prefix}{index}', email=f'{prefix}{index}@example.com', password_hash='x', **fields)
+        for index in range(count)
+    ]
+    db.session.add_all(users)
+    db.session.flush()
+    return users
@@ -0,0 +1,89 @@
+from decimal import Decimal
+from app import db
+from app.models.admin import AdminLog
+from app.models.marketplace import Product, Cart, CartItem, Order, OrderItem, SellerDailySales
+from app.services.sales_rollups import rebuild_sales_rollups
+from tests.helpers import count_queries, auth_headers, make_users
+
+def _seed(app, count):
+    """An admin, and ``count`` customers each with an order and a log entry about them"""
+    with app.app_context():
+        admin, = make_users(1, prefix='admin', role='admin')
+        customers = make_users(count, prefix='customer')
+        product = Product(name='Product', slug='product', price=Decimal('5.00'), category='c', seller_id=admin.id)
+        db.session.add(product)
+        db.session.flush()
+        for index, customer in enumerate(customers):
+            order = Order(order_number=f'ORD-{index}', customer_id=customer.id, total_amount=Decimal('5.00'))
+            db.session.add(order)
+            db.session.flush()
+            db.session.add(OrderItem(order_id=order.id, product_id=product.id, quantity=1, price=Decimal('5.00')))
+            db.session.add(AdminLog(admin_id=admin.id, action='update', target_type='user', target_id=customer.id))
+        db.session.commit()
+        return admin.id
+
+def _list_queries(make_app, count, url):
+    app = make_app()
+    admin_id = _seed(app, count)
+    with count_queries(app) as statements:
+        response = app.test_client().get(url, headers=auth_headers(app, admin_id))
+    assert response.status_code == 200
+    return len(statements)
+
+def test_admin_order_list_queries_do_not_grow_with_page_size(make_app):
+    url = '/api/admin/orders?per_page=100'
+    assert _list_queries(make_app, 2, url) == _list_queries(make_app, 20, url)
+
+def test_admin_user_list_queries_do_not_grow_with_page_size(make_app):
+    url = '/api/admin/users?per_page=100'
+    assert _list_queries(make_app, 2, url) == _list_queries(make_app, 20, url)
+
+def test_admin_log_list_queries_do_not_grow_with_page_size(make_app):
+    url = '/api/admin/logs?per_page=100'
+    assert _list_queries(make_app, 2, url) == _list_queries(make_app, 20, url)
+
+def test_order_status_changes_keep_sales_rollups_in_step(app, client):
+    with app.app_context():
+        admin, = make_users(1, prefix='admin', role='admin')
+        seller, = make_users(1, prefix='seller', role='seller')
+        customers = make_users(2, prefix='customer')
+        lamp = Product(name='Lamp', slug='lamp', price=Decimal('5.00'), category='c', seller_id=seller.id, quantity=10)
+        rug = Product(name='Rug', slug='rug', price=Decimal('2.50'), category='c', seller_id=seller.id, quantity=10)
+        db.session.add_all([lamp, rug])
+        db.session.flush()
+        for customer in customers:
+            cart = Cart(user_id=customer.id)
+            db.session.add(cart)
+            db.session.flush()
+            db.session.add_all([CartItem(cart_id=cart.id, product_id=lamp.id, quantity=1), CartItem(cart_id=cart.id, product_id=rug.id, quantity=2)])
+        db.session.commit()
+        admin_id, customer_ids, lamp_id, rug_id = admin.id, [customer.id for customer in customers], lamp.id, rug.id
+    
+    order_ids = [
+        client.post('/api/marketplace/orders', json={}, headers=auth_headers(app, customer_id)).get_json()['order']['id']
+        for customer_id in customer_ids
+    ]
+    
+    def rollups():
+        return {
+            row.product_id: (row.units, row.revenue)
+            for row in SellerDailySales.query.filter(SellerDailySales.units != 0)
+        }
+    
+    def set_status(status):
+        response = client.put(f'/api/admin/orders/{order_ids[0]}/status', json={'status': status}, headers=auth_headers(app, admin_id))
+        assert response.status_code == 200
+        with app.app_context():
+            incremental = rollups()
+            rebuild_sales_rollups()
+            assert rollups() == incremental
+            db.session.rollback()
+            return incremental
+    
+    with app.app_context():
+        assert rollups() == {lamp_id: (2, Decimal('10.00')), rug_id: (4, Decimal('10.00'))}
+    assert set_status('shipped') == {lamp_id: (2, Decimal('10.00')), rug_id: (4, Decimal('10.00'))}
+    assert set_status('cancelled') == {lamp_id: (1, Decimal('5.00')), rug_id: (2, Decimal('5.00'))}
+    # Cancelling twice subtracts once
+    assert set_status('cancelled') == {lamp_id: (1, Decimal('5.00')), rug_id: (2, Decimal('5.00'))}
+    assert set_status('confirmed') == {lamp_id: (2, Decimal('10.00')), rug_id: (4, Decimal('10.00'))}
@@ -0,0 +1,53 @@
+from decimal import Decimal
+from app import db
+from app.models.education import Course
+from app.models.marketplace import Product
+from app.models.user import User
+
+CATALOG_URLS = [
+    '/api/marketplace/products',
+    '/api/marketplace/products/1',
+    '/api/education/courses',
+    '/api/education/courses/1'
+]
+
+def _seed_catalog(app):
+    with app.app_context():
+        seller = User(username='seller', email='seller@example.com', role='seller')
+        seller.set_password('secret1')
+        db.session.add(seller)
+        db.session.flush()
+        db.session.add(Product(name='Lamp', slug='lamp', price=Decimal('10.00'), category='c', seller_id=seller.id))
+        db.session.add(Course(title='Course', instructor_id=seller.id, is_published=True))
+        db.session.commit()
+
+def test_cached_response_is_not_served_under_a_newer_etag(make_app, tmp_path):
+    # Two workers sharing one database, each with its own response cache
+    uri = f'sqlite:///{tmp_path / "shared.db"}'
+    reader, writer = make_app(SQLALCHEMY_DATABASE_URI=uri), make_app(SQLALCHEMY_DATABASE_URI=uri)
+    _seed_catalog(reader)
+    client = reader.test_client()
+    
+    for url in CATALOG_URLS[:2]:
+        etag = client.get(url).headers['ETag']
+        with writer.app_context():
+            db.session.get(Product, 1).name = f'Lamp {len(url)}'
+            db.session.commit()
+        
+        response = client.get(url, headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
+        assert f'Lamp {len(url)}' in response.get_data(as_text=True)
+        assert client.get(url, headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+def test_catalog_etags_survive_logins_but_not_renames(app, client):
+    _seed_catalog(app)
+    etags = [client.get(url).headers['ETag'] for url in CATALOG_URLS]
+    
+    assert client.post('/api/auth/login', json={'username_or_email': 'seller', 'password': 'secret1'}).status_code == 200
+    assert [client.get(url, headers={'If-None-Match': etag}).status_code for url, etag in zip(CATALOG_URLS, etags)] == [304] * 4
+    
+    with app.app_context():
+        db.session.get(User, 1).first_name = 'Renamed'
+        db.session.commit()
+    assert [client.get(url, headers={'If-None-Match': etag}).status_code for url, etag in zip(CATALOG_URLS, etags)] == [200] * 4
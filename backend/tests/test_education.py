@@ -0,0 +1,406 @@
+import random
+import pytest
+from sqlalchemy import func, insert
+from app import db
+from app.models.education import Course, CourseReview, Enrollment, Quiz, Question, Answer, QuizAttempt, QuizStats, QuestionStats, RATING_PRIOR_MEAN, RATING_PRIOR_WEIGHT
+from app.services.counters import reconcile_counters
+from app.services.progress_buffer import get_progress_buffer
+from app.services.quiz_grading import clear_answer_keys, grade_answers, load_answer_key
+from app.services.quiz_regrade import regrade_quiz
+from app.services.quiz_stats import refresh_quiz_stats, stale_quiz_ids
+from app.services.quiz_tree import clear_quiz_trees
+from tests.helpers import count_queries, auth_headers, make_users
+
+def _seed_courses(app, count):
+    """``count`` instructors with one published course each, all taken by one student"""
+    with app.app_context():
+        student, = make_users(1, prefix='student')
+        instructors = make_users(count, prefix='instructor', role='instructor')
+        for index, instructor in enumerate(instructors):
+            course = Course(title=f'Course {index}', instructor_id=instructor.id, is_published=True)
+            db.session.add(course)
+            db.session.flush()
+            db.session.add(Enrollment(student_id=student.id, course_id=course.id))
+        db.session.commit()
+        return student.id
+
+def _list_queries(make_app, count, url, authenticated=False):
+    app = make_app()
+    student_id = _seed_courses(app, count)
+    headers = auth_headers(app, student_id) if authenticated else None
+    with count_queries(app) as statements:
+        response = app.test_client().get(url, headers=headers)
+    assert response.status_code == 200
+    return len(statements)
+
+def test_course_list_queries_do_not_grow_with_page_size(make_app):
+    url = '/api/education/courses?per_page=100'
+    assert _list_queries(make_app, 2, url) == _list_queries(make_app, 20, url)
+
+def test_my_courses_queries_do_not_grow_with_enrollments(make_app):
+    url = '/api/education/my-courses'
+    assert _list_queries(make_app, 2, url, authenticated=True) == _list_queries(make_app, 20, url, authenticated=True)
+
+def _seed_quiz(app, questions):
+    """
+    A published quiz of ``questions`` one-point questions plus a student enrolled in its course.
+    
+    Every third question is multiple-answer with two correct options, and
+    the last one is free text. Returns (quiz id, student id, {question id: correct answer ids}).
+    """
+    with app.app_context():
+        instructor, = make_users(1, prefix='instructor', role='instructor')
+        student, = make_users(1, prefix='student')
+        course = Course(title='Course', instructor_id=instructor.id, is_published=True)
+        db.session.add(course)
+        db.session.flush()
+        quiz = Quiz(title='Quiz', course_id=course.id, is_published=True, max_attempts=10, passing_score=60)
+        db.session.add_all([quiz, Enrollment(student_id=student.id, course_id=course.id)])
+        db.session.flush()
+        
+        correct = {}
+        for index in range(questions):
+            question_type = 'text' if index == questions - 1 else 'multiple_choice'
+            question = Question(quiz_id=quiz.id, question_text=f'Question {index}', question_type=question_type, points=1)
+            db.session.add(question)
+            db.session.flush()
+            answers = [
+                Answer(question_id=question.id, answer_text=f'Answer {option}', is_correct=option == 0 or (index % 3 == 1 and option == 1))
+                for option in range(4)
+            ]
+            db.session.add_all(answers)
+            db.session.flush()
+            correct[question.id] = [answer.id for answer in answers if answer.is_correct]
+        db.session.commit()
+        return quiz.id, student.id, correct
+
+def _all_correct(correct):
+    answers = {}
+    for index, (question_id, answer_ids) in enumerate(correct.items()):
+        if index == len(correct) - 1:
+            answers[str(question_id)] = {'text': '  answer   0 '}
+        elif len(answer_ids) > 1:
+            answers[str(question_id)] = {'answer_ids': answer_ids}
+        else:
+            answers[str(question_id)] = {'answer_id': answer_ids[0]}
+    return answers
+
+def test_quiz_attempt_is_graded_against_the_answer_key(app, client):
+    clear_answer_keys()
+    quiz_id, student_id, correct = _seed_quiz(app, 4)
+    url = f'/api/education/quizzes/{quiz_id}/attempt'
+    headers = auth_headers(app, student_id)
+    
+    attempt = client.post(url, json={'answers': _all_correct(correct)}, headers=headers).get_json()['attempt']
+    assert (attempt['score'], attempt['max_score'], attempt['percentage'], attempt['passed']) == (4, 4, 100, True)
+    
+    # One of two correct options on the multiple-answer question, a wrong text answer
+    answers = _all_correct(correct)
+    multiple, text = list(correct)[1], list(correct)[-1]
+    answers[str(multiple)] = {'answer_ids': correct[multiple][:1]}
+    answers[str(text)] = {'text': 'answer 1'}
+    attempt = client.post(url, json={'answers': answers}, headers=headers).get_json()['attempt']
+    assert (attempt['score'], attempt['max_score'], attempt['passed']) == (2, 4, False)
+
+def test_quiz_attempt_queries_do_not_grow_with_questions(make_app):
+    clear_answer_keys()
+    counts = []
+    for questions in (3, 15):
+        app = make_app()
+        quiz_id, student_id, correct = _seed_quiz(app, questions)
+        client = app.test_client()
+        url = f'/api/education/quizzes/{quiz_id}/attempt'
+        headers = auth_headers(app, student_id)
+        # The first attempt loads the answer key; later ones are graded from memory
+        assert client.post(url, json={'answers': _all_correct(correct)}, headers=headers).status_code == 201
+        with count_queries(app) as statements:
+            assert client.post(url, json={'answers': _all_correct(correct)}, headers=headers).status_code == 201
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+def test_progress_reports_are_buffered_and_written_in_one_flush(make_app):
+    app = make_app(PROGRESS_FLUSH_INTERVAL=3600)
+    student_id = _seed_courses(app, 2)
+    client = app.test_client()
+    headers = auth_headers(app, student_id)
+    
+    # The enrollment is looked up once; after that reports never touch the database
+    with count_queries(app) as statements:
+        assert client.post('/api/education/courses/1/progress', json={'progress': 10}, headers=headers).status_code == 202
+    assert len(statements) == 1
+    with count_queries(app) as statements:
+        for progress in (20, 100):
+            assert client.post('/api/education/courses/1/progress', json={'progress': progress}, headers=headers).status_code == 202
+    assert statements == []
+    assert client.post('/api/education/courses/2/progress', json={'progress': 40}, headers=headers).status_code == 202
+    
+    with app.app_context():
+        buffer = get_progress_buffer()
+        assert buffer.pending() == 2
+        assert buffer.flush() == 2
+        enrollments = Enrollment.query.order_by(Enrollment.course_id).all()
+        assert [enrollment.progress for enrollment in enrollments] == [100, 40]
+        assert enrollments[0].completed_at is not None
+        assert enrollments[1].completed_at is None
+    
+    # Progress never goes backwards
+    assert client.post('/api/education/courses/1/progress', json={'progress': 50}, headers=headers).status_code == 202
+    with app.app_context():
+        assert get_progress_buffer().flush() == 0
+        assert db.session.get(Enrollment, 1).progress == 100
+
+def test_progress_from_students_not_enrolled_is_rejected(make_app):
+    app = make_app(PROGRESS_FLUSH_INTERVAL=3600)
+    _seed_courses(app, 1)
+    with app.app_context():
+        outsider, = make_users(1, prefix='outsider')
+        db.session.commit()
+        outsider_id = outsider.id
+    response = app.test_client().post('/api/education/courses/1/progress', json={'progress': 10}, headers=auth_headers(app, outsider_id))
+    assert response.status_code == 403
+
+def test_regrade_updates_only_attempts_whose_result_changed(app):
+    quiz_id, student_id, correct = _seed_quiz(app, 4)
+    first = list(correct)[0]
+    with app.app_context():
+        options = [answer.id for answer in Answer.query.filter_by(question_id=first).order_by(Answer.id)]
+        # Attempts picking each option of the first question, all else right
+        for option in options:
+            answers = _all_correct(correct)
+            answers[str(first)] = {'answer_id': option}
+            attempt = QuizAttempt(user_id=student_id, quiz_id=quiz_id, answers=answers)
+            attempt.score, attempt.max_score, attempt.percentage = attempt.calculate_score()
+            attempt.passed = attempt.percentage >= 60
+            db.session.add(attempt)
+        db.session.commit()
+        
+        assert list(regrade_quiz(db.session.get(Quiz, quiz_id), chunk_size=3)) == [(3, 0), (1, 0)]
+        
+        # The key was wrong: the second option is the right answer
+        Answer.query.filter_by(id=options[0]).update({'is_correct': False})
+        Answer.query.filter_by(id=options[1]).update({'is_correct': True})
+        db.session.commit()
+        assert list(regrade_quiz(db.session.get(Quiz, quiz_id), chunk_size=3)) == [(3, 2), (1, 0)]
+        db.session.commit()
+        
+        key = load_answer_key(quiz_id)
+        for attempt in QuizAttempt.query.order_by(QuizAttempt.id):
+            score, max_score, percentage = grade_answers(key, attempt.answers)
+            assert (attempt.score, attempt.max_score, attempt.percentage, attempt.passed) == (score, max_score, percentage, percentage >= 60)
+        assert [attempt.score for attempt in QuizAttempt.query.order_by(QuizAttempt.id)] == [3, 4, 3, 3]
+
+def test_quiz_view_is_cached_until_a_question_changes(app, client):
+    clear_quiz_trees()
+    quiz_id, student_id, correct = _seed_quiz(app, 3)
+    url = f'/api/education/quizzes/{quiz_id}'
+    headers = auth_headers(app, student_id)
+    
+    def questions():
+        return client.get(url, headers=headers).get_json()['quiz']['questions']
+    
+    first = questions()
+    assert [question['question_text'] for question in first] == ['Question 0', 'Question 1', 'Question 2']
+    assert all('is_correct' not in answer for question in first for answer in question['answers'])
+    # Served from the cache: only the quiz and the enrollment are read
+    with count_queries(app) as statements:
+        assert questions() == first
+    assert len(statements) == 2
+    
+    first_question, second_question, _ = correct
+    with app.app_context():
+        db.session.get(Answer, correct[first_question][0]).answer_text = 'Edited answer'
+        db.session.commit()
+    assert questions()[0]['answers'][0]['answer_text'] == 'Edited answer'
+    
+    with app.app_context():
+        db.session.get(Question, first_question).question_text = 'Edited question'
+        db.session.delete(db.session.get(Question, second_question))
+        db.session.commit()
+    assert [question['question_text'] for question in questions()] == ['Edited question', 'Question 2']
+
+def test_enrollment_and_question_counters_follow_inserts_and_deletes(app, client):
+    quiz_id, _, correct = _seed_quiz(app, 3)
+    with app.app_context():
+        course_id = db.session.get(Quiz, quiz_id).course_id
+        students = make_users(4, prefix='learner')
+        db.session.commit()
+        student_ids = [student.id for student in students]
+    
+    for student_id in student_ids:
+        assert client.post(f'/api/education/courses/{course_id}/enroll', headers=auth_headers(app, student_id)).status_code == 201
+    # Enrolling twice is refused and not counted
+    assert client.post(f'/api/education/courses/{course_id}/enroll', headers=auth_headers(app, student_ids[0])).status_code == 400
+    
+    def counts():
+        course = client.get(f'/api/education/courses/{course_id}').get_json()['course']
+        quizzes = client.get(f'/api/education/courses/{course_id}/quizzes', headers=auth_headers(app, student_ids[1])).get_json()['quizzes']
+        return course['enrollment_count'], quizzes[0]['question_count']
+    
+    # The seeded student plus four
+    assert counts() == (5, 3)
+    with app.app_context():
+        db.session.delete(Enrollment.query.filter_by(student_id=student_ids[0]).one())
+        db.session.delete(db.session.get(Question, list(correct)[0]))
+        db.session.add(Question(quiz_id=quiz_id, question_text='New', question_type='multiple_choice', points=1))
+        db.session.add(Question(quiz_id=quiz_id, question_text='Newer', question_type='multiple_choice', points=1))
+        db.session.commit()
+    assert counts() == (4, 4)
+    
+    # Core inserts bypass the listeners until reconciled
+    with app.app_context():
+        db.session.execute(insert(Enrollment), [{'student_id': student_ids[0], 'course_id': course_id}])
+        db.session.commit()
+        assert reconcile_counters()['courses.enrollment_count'] == 1
+        db.session.commit()
+        assert set(reconcile_counters().values()) == {0}
+    assert counts()[0] == 5
+
+def test_course_ratings_follow_reviews_and_rank_courses(app, client):
+    _seed_courses(app, 3)
+    with app.app_context():
+        students = make_users(5, prefix='reviewer')
+        db.session.add_all([Enrollment(student_id=student.id, course_id=course_id) for student in students for course_id in (1, 2, 3)])
+        db.session.commit()
+        student_ids = [student.id for student in students]
+    
+    def rate(course_id, student_id, rating):
+        return client.post(f'/api/education/courses/{course_id}/reviews', json={'rating': rating}, headers=auth_headers(app, student_id))
+    
+    for student_id, ratings in zip(student_ids, [(5, 2, 4), (5, 3, 4), (4, 1, 4), (5, 2, 4), (4, 2, 5)]):
+        for course_id, rating in zip((1, 2, 3), ratings):
+            assert rate(course_id, student_id, rating).status_code == 201
+    # A new rating replaces the student's earlier one
+    response = rate(1, student_ids[0], 1)
+    assert response.status_code == 200
+    assert rate(1, student_ids[0], 6).status_code == 400
+    with app.app_context():
+        db.session.delete(CourseReview.query.filter_by(course_id=2, student_id=student_ids[1]).one())
+        db.session.commit()
+    
+    with app.app_context():
+        for course in Course.query:
+            count, total, average = db.session.query(
+                func.count(CourseReview.id), func.coalesce(func.sum(CourseReview.rating), 0), func.avg(CourseReview.rating)
+            ).filter(CourseReview.course_id == course.id).one()
+            assert (course.rating_count, course.rating_total) == (count, total)
+            assert abs(course.average_rating - average) < 1e-9
+            expected_score = (RATING_PRIOR_WEIGHT * RATING_PRIOR_MEAN + total) / (RATING_PRIOR_WEIGHT + count)
+            assert abs(course.rating_score - expected_score) < 1e-9
+        by_score = [course.id for course in Course.query.order_by(Course.rating_score.desc(), Course.id.desc())]
+    
+    def listed(query=''):
+        response = client.get(f'/api/education/courses{query}')
+        assert response.status_code == 200
+        return [course['id'] for course in response.get_json()['courses']]
+    
+    assert listed('?sort_by=rating') == by_score == [3, 1, 2]
+    assert listed('?sort_by=rating&cursor=') == by_score
+    # Unknown orders fall back to newest first
+    assert listed('?sort_by=popularity') == listed() == [3, 2, 1]
+
+def _random_answers(options, correct, rng):
+    """Answers to a random subset of the questions: single and multiple choices, and free text"""
+    answers = {}
+    for index, (question_id, answer_ids) in enumerate(options.items()):
+        if rng.random() < 0.2:
+            continue
+        if index == len(options) - 1:
+            answers[str(question_id)] = {'text': rng.choice(['answer 0', 'answer 1'])}
+        elif len(correct[question_id]) > 1:
+            answers[str(question_id)] = {'answer_ids': rng.sample(answer_ids, rng.randint(1, 3))}
+        else:
+            answers[str(question_id)] = {'answer_id': rng.choice(answer_ids)}
+    return answers
+
+def _direct_item_analysis(key, options, attempts):
+    """Difficulty, discrimination and picks per question, one attempt and one question at a time"""
+    import numpy as np
+    
+    results = {}
+    percentages = [grade_answers(key, answers)[2] for answers in attempts]
+    for question_id, answer_ids in options.items():
+        x, y, picks = [], [], dict.fromkeys(map(str, answer_ids), 0)
+        for answers, percentage in zip(attempts, percentages):
+            answer = answers.get(str(question_id))
+            if answer is None:
+                continue
+            score, max_score, _ = grade_answers(key, {str(question_id): answer})
+            x.append(float(score == max_score))
+            y.append(percentage)
+            for answer_id in set(answer.get('answer_ids', [answer.get('answer_id')])):
+                if str(answer_id) in picks:
+                    picks[str(answer_id)] += 1
+        results[question_id] = (len(x), sum(x) / len(x), np.corrcoef(x, y)[0, 1], picks)
+    return results, sum(percentages) / len(percentages)
+
+def test_quiz_stats_match_a_direct_computation_and_refresh_incrementally(app, client):
+    quiz_id, student_id, correct = _seed_quiz(app, 6)
+    rng = random.Random(7)
+    with app.app_context():
+        options = {
+            question_id: [answer.id for answer in Answer.query.filter_by(question_id=question_id).order_by(Answer.id)]
+            for question_id in correct
+        }
+        attempts = [_random_answers(options, correct, rng) for _ in range(90)]
+        
+        def add(batch):
+            db.session.add_all([QuizAttempt(user_id=student_id, quiz_id=quiz_id, answers=answers) for answers in batch])
+            db.session.commit()
+        
+        def stored():
+            return {
+                row.question_id: (row.responses, row.difficulty, row.discrimination, row.answer_counts)
+                for row in QuestionStats.query.filter_by(quiz_id=quiz_id)
+            }, db.session.get(QuizStats, quiz_id).mean_percentage
+        
+        def assert_matches(batch):
+            expected, mean = _direct_item_analysis(load_answer_key(quiz_id), options, batch)
+            rows, stored_mean = stored()
+            assert stored_mean == pytest.approx(mean)
+            assert set(rows) == set(expected)
+            for question_id, (responses, difficulty, discrimination, picks) in expected.items():
+                assert rows[question_id][0] == responses
+                assert rows[question_id][1] == pytest.approx(difficulty)
+                assert rows[question_id][2] == pytest.approx(discrimination)
+                assert rows[question_id][3] == picks
+        
+        add(attempts[:60])
+        assert stale_quiz_ids() == [quiz_id]
+        assert refresh_quiz_stats(db.session.get(Quiz, quiz_id), chunk_size=7) == 60
+        db.session.commit()
+        assert stale_quiz_ids() == []
+        assert_matches(attempts[:60])
+        
+        # Only the new attempts are read, and the sums come out as a full recompute's
+        add(attempts[60:])
+        assert refresh_quiz_stats(db.session.get(Quiz, quiz_id), chunk_size=7) == 30
+        db.session.commit()
+        assert_matches(attempts)
+        incremental = stored()
+        db.session.get(QuizStats, quiz_id).quiz_version = None
+        assert refresh_quiz_stats(db.session.get(Quiz, quiz_id), chunk_size=1000) == 90
+        db.session.commit()
+        rows, mean = stored()
+        assert mean == pytest.approx(incremental[1])
+        for question_id, (responses, difficulty, discrimination, picks) in incremental[0].items():
+            assert rows[question_id] == (responses, pytest.approx(difficulty), pytest.approx(discrimination), picks)
+        
+        # Fixing the key makes the quiz stale and the next refresh starts over
+        first = list(correct)[0]
+        Answer.query.filter_by(id=options[first][0]).update({'is_correct': False})
+        Answer.query.filter_by(id=options[first][1]).update({'is_correct': True})
+        db.session.get(Quiz, quiz_id).updated_at = func.now()
+        db.session.commit()
+        assert stale_quiz_ids() == [quiz_id]
+        assert refresh_quiz_stats(db.session.get(Quiz, quiz_id), chunk_size=7) == 90
+        db.session.commit()
+        assert_matches(attempts)
+        instructor_id = db.session.get(Quiz, quiz_id).course.instructor_id
+        answer_counts = {question_id: row[3] for question_id, row in stored()[0].items()}
+    
+    # The endpoint serves the stored rows to the instructor only
+    url = f'/api/education/quizzes/{quiz_id}/analytics'
+    assert client.get(url, headers=auth_headers(app, student_id)).status_code == 403
+    analytics = client.get(url, headers=auth_headers(app, instructor_id)).get_json()
+    assert analytics['up_to_date'] and analytics['stats']['attempt_count'] == 90
+    assert {question['question_id']: question['answer_counts'] for question in analytics['questions']} == answer_counts
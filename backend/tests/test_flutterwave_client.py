@@ -0,0 +1,88 @@
+import threading
+import pytest
+from flask import Flask
+import flutterwave_client
+import flutterwave_stub
+import payment_api
+from flutterwave_client import FlutterwaveVerifier, VerificationError, payment_status
+
+@pytest.fixture
+def stub():
+    servers = []
+    
+    def start(**options):
+        server = flutterwave_stub.serve(port=0, **options)
+        servers.append(server)
+        return server
+    
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def _verifier(server, **options):
+    return FlutterwaveVerifier('FLWSECK_TEST', api_base=f'http://127.0.0.1:{server.server_port}', **options)
+
+def _served(server):
+    return server.RequestHandlerClass.requests_served
+
+def test_terminal_results_are_cached(stub):
+    server = stub()
+    verifier = _verifier(server)
+    for _ in range(10):
+        assert payment_status(verifier.verify('ok-1')) == 'successful'
+        assert payment_status(verifier.verify('fail-1')) == 'failed'
+    assert _served(server) == 2
+
+def test_cached_results_expire(stub):
+    server = stub()
+    verifier = _verifier(server, cache_ttl=0)
+    verifier.verify('ok-1')
+    verifier.verify('ok-1')
+    assert _served(server) == 2
+
+def test_pending_results_are_checked_again(stub):
+    server = stub()
+    verifier = _verifier(server)
+    assert payment_status(verifier.verify('pend-1')) == 'pending'
+    assert payment_status(verifier.verify('pend-1')) == 'pending'
+    flutterwave_stub.set_status(server, 'pend-1', 'successful')
+    assert payment_status(verifier.verify('pend-1')) == 'successful'
+    assert payment_status(verifier.verify('pend-1')) == 'successful'
+    assert _served(server) == 3
+
+def test_concurrent_verifications_share_one_request(stub):
+    server = stub(latency=0.2)
+    verifier = _verifier(server)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(payment_status(verifier.verify('ok-1')))) for _ in range(20)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ['successful'] * 20
+    assert _served(server) == 1
+
+def test_errors_are_raised_and_not_cached(stub, monkeypatch):
+    server = stub()
+    verifier = _verifier(server)
+    for _ in range(2):
+        with pytest.raises(VerificationError):
+            verifier.verify('unknown-1')
+    assert _served(server) == 2
+    
+    monkeypatch.setattr(flutterwave_client, 'FLUTTERWAVE_READ_TIMEOUT', 0.1)
+    monkeypatch.setattr(flutterwave_client, 'FLUTTERWAVE_MAX_RETRIES', 0)
+    slow = _verifier(stub(latency=1.0))
+    with pytest.raises(VerificationError):
+        slow.verify('ok-1')
+
+def test_verify_payment_route(stub, monkeypatch):
+    monkeypatch.setattr(payment_api, 'verifier', _verifier(stub()))
+    app = Flask('payment_api')
+    app.register_blueprint(payment_api.payment_bp)
+    client = app.test_client()
+    assert client.post('/api/verify-payment', json={'tx_ref': 'ok-1'}).get_json()['success'] is True
+    assert client.post('/api/verify-payment', json={'tx_ref': 'pend-1'}).status_code == 400
+    assert client.post('/api/verify-payment', json={'tx_ref': 'unknown-1'}).status_code == 500
+    assert client.post('/api/verify-payment', json={}).status_code == 400
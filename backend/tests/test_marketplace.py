@@ -0,0 +1,441 @@
+from datetime import datetime, timedelta
+from decimal import Decimal
+from sqlalchemy import text
+from app import db
+from app.models.marketplace import Product, Cart, CartItem, StockReservation, Order, OrderItem, ProductNeighbor, ProductNeighborRefresh
+from app.services.inventory import release_expired_holds
+from app.services.product_search import rebuild_search_index
+from app.services.related_products import rebuild_related_products, record_orders, refresh_stale_neighbors
+from tests.helpers import count_queries, auth_headers, make_users
+
+def _seed_orders(app, count):
+    """``count`` sellers with one product each, and a customer with one order per product"""
+    with app.app_context():
+        customer, = make_users(1, prefix='customer')
+        sellers = make_users(count, prefix='seller', role='seller')
+        for index, seller in enumerate(sellers):
+            product = Product(name=f'Product {index}', slug=f'product-{index}', price=Decimal('9.99'), category='c', seller_id=seller.id)
+            order = Order(order_number=f'ORD-{index}', customer_id=customer.id, total_amount=Decimal('9.99'))
+            db.session.add_all([product, order])
+            db.session.flush()
+            db.session.add(OrderItem(order_id=order.id, product_id=product.id, quantity=1, price=Decimal('9.99')))
+        db.session.commit()
+        return customer.id
+
+def _list_queries(make_app, count, url, authenticated=False):
+    app = make_app()
+    customer_id = _seed_orders(app, count)
+    headers = auth_headers(app, customer_id) if authenticated else None
+    with count_queries(app) as statements:
+        response = app.test_client().get(url, headers=headers)
+    assert response.status_code == 200
+    return len(statements)
+
+def test_product_list_queries_do_not_grow_with_page_size(make_app):
+    url = '/api/marketplace/products?per_page=100'
+    assert _list_queries(make_app, 2, url) == _list_queries(make_app, 20, url)
+
+def test_product_cursor_page_queries_do_not_grow_with_page_size(make_app):
+    url = '/api/marketplace/products?per_page=100&cursor='
+    assert _list_queries(make_app, 2, url) == _list_queries(make_app, 20, url)
+
+def test_order_list_queries_do_not_grow_with_page_size(make_app):
+    url = '/api/marketplace/orders?per_page=100'
+    assert _list_queries(make_app, 2, url, authenticated=True) == _list_queries(make_app, 20, url, authenticated=True)
+
+def test_cursor_pagination_rejects_relevance_sort(client):
+    response = client.get('/api/marketplace/products?search=phone&sort_by=relevance&cursor=')
+    assert response.status_code == 400
+
+def _seed_search(app, count):
+    with app.app_context():
+        seller, = make_users(1, prefix='seller', role='seller')
+        db.session.add_all([
+            Product(name=f'Phone case {index}', slug=f'phone-case-{index}', description='Fits most phones', price=Decimal('5.00'), category='c', seller_id=seller.id)
+            for index in range(count)
+        ] + [
+            Product(name='iPhone 15 Pro', slug='iphone-15-pro', description='Apple phone', price=Decimal('999.00'), category='c', seller_id=seller.id),
+            Product(name='Running shoes', slug='running-shoes', description='Light trainers with a phone pocket', price=Decimal('80.00'), category='c', seller_id=seller.id),
+            Product(name='Laptop stand', slug='laptop-stand', description='Aluminium', price=Decimal('30.00'), category='c', seller_id=seller.id)
+        ])
+        db.session.commit()
+
+def test_search_matches_word_prefixes_and_ranks_by_relevance(app, client):
+    _seed_search(app, 1)
+    response = client.get('/api/marketplace/products?search=phon&sort_by=relevance')
+    names = [product['name'] for product in response.get_json()['products']]
+    assert response.status_code == 200
+    assert 'Laptop stand' not in names
+    assert names[-1] == 'Running shoes'
+    assert set(names) == {'Phone case 0', 'iPhone 15 Pro', 'Running shoes'}
+
+def test_search_sees_products_added_after_startup(app, client):
+    _seed_search(app, 1)
+    with app.app_context():
+        product = Product.query.filter_by(slug='laptop-stand').first()
+        product.name = 'Phone stand'
+        db.session.commit()
+    names = [product['name'] for product in client.get('/api/marketplace/products?search=stand').get_json()['products']]
+    assert names == ['Phone stand']
+
+def test_search_queries_do_not_grow_with_matches(make_app):
+    counts = []
+    for count in (2, 20):
+        app = make_app()
+        _seed_search(app, count)
+        with count_queries(app) as statements:
+            response = app.test_client().get('/api/marketplace/products?search=phone&sort_by=relevance&per_page=100')
+        assert response.status_code == 200
+        assert response.get_json()['pagination']['total'] == count + 2
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+def _seed_carts(app, products, carts=1, stock=10):
+    """``carts`` customers, each with one unit of every one of ``products`` products in the cart and no stock hold"""
+    with app.app_context():
+        seller, = make_users(1, prefix='seller', role='seller')
+        customers = make_users(carts, prefix='customer')
+        items = [
+            Product(name=f'Product {index}', slug=f'product-{index}', price=Decimal('2.50'), category='c', seller_id=seller.id, quantity=stock)
+            for index in range(products)
+        ]
+        db.session.add_all(items)
+        db.session.flush()
+        for customer in customers:
+            cart = Cart(user_id=customer.id)
+            db.session.add(cart)
+            db.session.flush()
+            db.session.add_all([CartItem(cart_id=cart.id, product_id=product.id, quantity=1) for product in items])
+        db.session.commit()
+        return [customer.id for customer in customers], [product.id for product in items]
+
+def test_checkout_statements_do_not_grow_with_cart_size(make_app):
+    counts = []
+    for products in (2, 10):
+        app = make_app()
+        (customer_id,), product_ids = _seed_carts(app, products)
+        with count_queries(app) as statements:
+            response = app.test_client().post('/api/marketplace/orders', json={}, headers=auth_headers(app, customer_id))
+        assert response.status_code == 201
+        assert response.get_json()['order']['total_amount'] == 2.5 * products
+        counts.append(len(statements))
+        with app.app_context():
+            assert [db.session.get(Product, product_id).quantity for product_id in product_ids] == [9] * products
+            assert CartItem.query.count() == 0
+    assert counts[0] == counts[1]
+
+def test_checkout_does_not_oversell(app, client):
+    customer_ids, (product_id,) = _seed_carts(app, 1, carts=2, stock=1)
+    statuses = [
+        client.post('/api/marketplace/orders', json={}, headers=auth_headers(app, customer_id)).status_code
+        for customer_id in customer_ids
+    ]
+    assert statuses == [201, 409]
+    with app.app_context():
+        assert db.session.get(Product, product_id).quantity == 0
+        assert Order.query.count() == 1
+
+def _add_to_cart(app, client, customer_id, product_id, quantity=1):
+    return client.post(
+        '/api/marketplace/cart/add',
+        json={'product_id': product_id, 'quantity': quantity},
+        headers=auth_headers(app, customer_id)
+    )
+
+def test_add_to_cart_holds_stock_until_released(app, client):
+    customer_ids, (product_id,) = _seed_carts(app, 1, carts=2, stock=3)
+    with app.app_context():
+        CartItem.query.delete()
+        db.session.commit()
+    
+    assert _add_to_cart(app, client, customer_ids[0], product_id, 2).status_code == 200
+    response = _add_to_cart(app, client, customer_ids[1], product_id, 2)
+    assert response.status_code == 409
+    assert response.get_json()['product_ids'] == [product_id]
+    with app.app_context():
+        assert db.session.get(Product, product_id).quantity == 1
+        assert StockReservation.query.count() == 1
+    
+    # Expired holds go back to stock
+    with app.app_context():
+        assert release_expired_holds(now=datetime.utcnow() + timedelta(days=1)) == 2
+        db.session.commit()
+        assert db.session.get(Product, product_id).quantity == 3
+    assert _add_to_cart(app, client, customer_ids[1], product_id, 2).status_code == 200
+    
+    # Removing the line returns its hold
+    with app.app_context():
+        item_id = CartItem.query.join(Cart).filter(Cart.user_id == customer_ids[1]).first().id
+    assert client.delete(f'/api/marketplace/cart/remove/{item_id}', headers=auth_headers(app, customer_ids[1])).status_code == 200
+    with app.app_context():
+        assert db.session.get(Product, product_id).quantity == 3
+        assert StockReservation.query.count() == 0
+
+def test_checkout_consumes_held_stock_once(app, client):
+    (customer_id,), (product_id,) = _seed_carts(app, 1, stock=5)
+    with app.app_context():
+        CartItem.query.delete()
+        db.session.commit()
+    assert _add_to_cart(app, client, customer_id, product_id, 2).status_code == 200
+    assert client.post('/api/marketplace/orders', json={}, headers=auth_headers(app, customer_id)).status_code == 201
+    with app.app_context():
+        assert db.session.get(Product, product_id).quantity == 3
+        assert StockReservation.query.count() == 0
+
+def test_add_to_cart_queries_do_not_grow_with_cart_size(make_app):
+    counts = []
+    for products in (2, 10):
+        app = make_app()
+        (customer_id,), product_ids = _seed_carts(app, products + 1)
+        client = app.test_client()
+        for product_id in product_ids[:-1]:
+            assert _add_to_cart(app, client, customer_id, product_id).status_code == 200
+        with count_queries(app) as statements:
+            assert _add_to_cart(app, client, customer_id, product_ids[-1]).status_code == 200
+        counts.append(len(statements))
+    assert counts[0] == counts[1]
+
+def test_search_falls_back_to_ilike_until_the_index_is_built(app, client):
+    with app.app_context():
+        # A database created before the search index existed
+        for statement in ['DROP TRIGGER products_fts_ai', 'DROP TRIGGER products_fts_ad', 'DROP TRIGGER products_fts_au', 'DROP TABLE products_fts']:
+            db.session.execute(text(statement))
+        db.session.commit()
+    _seed_search(app, 1)
+    
+    response = client.get('/api/marketplace/products?search=phone&sort_by=relevance')
+    assert response.status_code == 200
+    assert {product['name'] for product in response.get_json()['products']} == {'Phone case 0', 'iPhone 15 Pro', 'Running shoes'}
+    
+    with app.app_context():
+        rebuild_search_index()
+    names = [product['name'] for product in client.get('/api/marketplace/products?search=phon&sort_by=relevance').get_json()['products']]
+    assert set(names) == {'Phone case 0', 'iPhone 15 Pro', 'Running shoes'}
+    assert names[-1] == 'Running shoes'
+
+def test_cart_totals_follow_items_and_price_changes(app, client):
+    (customer_id,), product_ids = _seed_carts(app, 2)
+    with app.app_context():
+        CartItem.query.delete()
+        db.session.commit()
+    headers = auth_headers(app, customer_id)
+    
+    _add_to_cart(app, client, customer_id, product_ids[0], 2)
+    cart = _add_to_cart(app, client, customer_id, product_ids[1], 1).get_json()['cart']
+    assert (cart['item_count'], cart['total']) == (3, 7.5)
+    
+    with app.app_context():
+        db.session.get(Product, product_ids[0]).price = Decimal('4.00')
+        db.session.commit()
+    cart = client.get('/api/marketplace/cart', headers=headers).get_json()['cart']
+    assert (cart['item_count'], cart['total']) == (3, 10.5)
+    
+    item_id = next(item['id'] for item in cart['items'] if item['product_id'] == product_ids[0])
+    assert client.delete(f'/api/marketplace/cart/remove/{item_id}', headers=headers).status_code == 200
+    cart = client.get('/api/marketplace/cart', headers=headers).get_json()['cart']
+    assert (cart['item_count'], cart['total']) == (1, 2.5)
+
+def test_fields_limit_the_response_and_the_columns_read(app, client):
+    customer_id = _seed_orders(app, 2)
+    with count_queries(app) as statements:
+        response = client.get('/api/marketplace/products?fields=id,name')
+    assert response.status_code == 200
+    assert [set(product) for product in response.get_json()['products']] == [{'id', 'name'}] * 2
+    page, = [statement for statement in statements if 'LIMIT' in statement]
+    assert 'products.description' not in page
+    
+    response = client.get('/api/marketplace/orders?fields=order_number,items.quantity,items.product.name', headers=auth_headers(app, customer_id))
+    order = response.get_json()['orders'][0]
+    assert set(order) == {'order_number', 'items'}
+    assert order['items'] == [{'quantity': 1, 'product': {'name': order['items'][0]['product']['name']}}]
+
+def test_unknown_fields_are_rejected(app, client):
+    customer_id = _seed_orders(app, 1)
+    assert client.get('/api/marketplace/products?fields=id,colour').status_code == 400
+    assert client.get('/api/marketplace/products/1?fields=nope').status_code == 400
+    response = client.get('/api/marketplace/orders?fields=items.product.nope', headers=auth_headers(app, customer_id))
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'Unknown field: nope'
+
+def _import(app, client, seller_id, body, fmt='csv', chunk_size=2):
+    return client.post(
+        f'/api/marketplace/products/import?format={fmt}&chunk_size={chunk_size}',
+        data=body,
+        headers=auth_headers(app, seller_id)
+    )
+
+def _seed_seller(app):
+    with app.app_context():
+        seller, = make_users(1, prefix='seller', role='seller')
+        db.session.commit()
+        return seller.id
+
+def test_import_reports_bad_rows_and_keeps_the_good_ones(app, client):
+    seller_id = _seed_seller(app)
+    body = (
+        'name,price,category,quantity\n'
+        'Lamp,10.50,Home,3\n'
+        'Bad price,NaN,Home,1\n'
+        'Huge,1e999999999,Home,1\n'
+        ',5,Home,1\n'
+        'Mug,4.999,Kitchen,\n'
+        'Negative,-1,Home,1\n'
+        'Rug,30,Home,lots\n'
+        'Chair,45,Home,2\n'
+    ).encode()
+    response = _import(app, client, seller_id, body)
+    assert response.status_code == 200
+    result = response.get_json()
+    assert (result['imported'], result['failed']) == (3, 5)
+    assert result['errors'] == [
+        {'row': 2, 'error': 'price must be a number'},
+        {'row': 3, 'error': 'price must be at most 99999999.99'},
+        {'row': 4, 'error': 'name is required'},
+        {'row': 6, 'error': 'price must not be negative'},
+        {'row': 7, 'error': 'quantity must be an integer'}
+    ]
+    with app.app_context():
+        assert {product.name: product.price for product in Product.query} == {
+            'Lamp': Decimal('10.50'), 'Mug': Decimal('5.00'), 'Chair': Decimal('45.00')
+        }
+
+def test_import_failing_part_way_still_reports_what_was_imported(app, client):
+    seller_id = _seed_seller(app)
+    body = b'{"name": "Lamp", "price": 10, "category": "Home"}\n' * 3 + b'\xff\xfe\n'
+    response = _import(app, client, seller_id, body, fmt='ndjson', chunk_size=2)
+    assert response.status_code == 400
+    assert response.get_json()['imported'] == 2
+    with app.app_context():
+        assert Product.query.count() == 2
+
+def _seed_facets(app):
+    with app.app_context():
+        seller, = make_users(1, prefix='seller', role='seller')
+        prices = ['5.00', '24.99', '25.00', '60.00', '99.99', '300.00', '1500.00']
+        db.session.add_all([
+            Product(
+                name=f'Product {index}', slug=f'product-{index}', price=Decimal(prices[index % len(prices)]),
+                category=['books', 'games', 'home'][index % 3], seller_id=seller.id, is_active=index % 5 != 0
+            )
+            for index in range(40)
+        ])
+        db.session.commit()
+
+def test_facet_counts_match_per_category_counts(app, client):
+    _seed_facets(app)
+    response = client.get('/api/marketplace/products?facets=category,price&category=games&min_price=20&max_price=200')
+    assert response.status_code == 200
+    facets = response.get_json()['facets']
+    
+    with app.app_context():
+        active = Product.query.filter_by(is_active=True)
+        # Category counts keep the price range but not the selected category
+        expected_categories = {
+            category: active.filter(Product.category == category, Product.price >= 20, Product.price <= 200).count()
+            for category in ('books', 'games', 'home')
+        }
+        # The histogram keeps the category but not the price range
+        edges = app.config['PRODUCT_PRICE_BUCKETS']
+        games = active.filter(Product.category == 'games')
+        expected_buckets = [
+            games.filter(Product.price >= low, *([Product.price < high] if high is not None else [])).count()
+            for low, high in zip(edges, edges[1:] + [None])
+        ]
+        listed = active.filter(Product.category == 'games', Product.price >= 20, Product.price <= 200).count()
+    
+    assert {facet['value']: facet['count'] for facet in facets['category']} == expected_categories
+    assert [bucket['count'] for bucket in facets['price']] == expected_buckets
+    assert response.get_json()['pagination']['total'] == listed
+    assert expected_categories['games'] == listed
+
+def test_unknown_facets_are_rejected(client):
+    response = client.get('/api/marketplace/products?facets=category,colour')
+    assert response.status_code == 400
+
+def test_stock_holds_do_not_expire_cached_listings(app, client):
+    customer_ids, (product_id,) = _seed_carts(app, 1, carts=2, stock=5)
+    with app.app_context():
+        CartItem.query.delete()
+        db.session.commit()
+    url = '/api/marketplace/products'
+    etag = client.get(url).headers['ETag']
+    
+    assert _add_to_cart(app, client, customer_ids[0], product_id, 2).status_code == 200
+    with app.app_context():
+        release_expired_holds(now=datetime.utcnow() + timedelta(days=1))
+        db.session.commit()
+    assert _add_to_cart(app, client, customer_ids[1], product_id).status_code == 200
+    
+    assert client.get(url, headers={'If-None-Match': etag}).status_code == 304
+    response = client.get(url)
+    assert response.headers['ETag'] == etag
+    assert response.headers['X-Cache'] == 'HIT'
+    
+    # Catalog edits still do
+    with app.app_context():
+        db.session.get(Product, product_id).name = 'Renamed'
+        db.session.commit()
+    response = client.get(url)
+    assert response.headers['ETag'] != etag
+    assert response.headers['X-Cache'] == 'MISS'
+
+def _related(client, product_id):
+    return [
+        (item['product']['id'], item['copurchases'])
+        for item in client.get(f'/api/marketplace/products/{product_id}/related').get_json()['related']
+    ]
+
+def test_checkout_records_pairs_and_leaves_ranking_to_the_job(app, client):
+    customer_ids, product_ids = _seed_carts(app, 3, carts=2)
+    with app.app_context():
+        cart = Cart.query.filter_by(user_id=customer_ids[1]).one()
+        CartItem.query.filter_by(cart_id=cart.id, product_id=product_ids[2]).delete()
+        db.session.commit()
+    for customer_id in customer_ids:
+        assert client.post('/api/marketplace/orders', json={}, headers=auth_headers(app, customer_id)).status_code == 201
+    
+    with app.app_context():
+        assert ProductNeighbor.query.count() == 0
+        assert sorted(refresh.product_id for refresh in ProductNeighborRefresh.query) == product_ids
+    assert _related(client, product_ids[0]) == []
+    
+    with app.app_context():
+        assert refresh_stale_neighbors(app.config['RELATED_PRODUCTS_TOP_K']) == 3
+        db.session.commit()
+        assert ProductNeighborRefresh.query.count() == 0
+    first, second, third = product_ids
+    assert _related(client, first) == [(second, 2), (third, 1)]
+    assert _related(client, third) == [(first, 1), (second, 1)]
+
+def test_incremental_neighbors_match_a_rebuild(make_app):
+    app = make_app(RELATED_PRODUCTS_TOP_K=2)
+    customer_ids, product_ids = _seed_carts(app, 6)
+    baskets = [[0, 1], [0, 1, 2], [2, 3, 4], [1, 3], [0, 5], [4, 5, 0], [1, 2], [3, 4, 5, 0]]
+    
+    def neighbors():
+        return [
+            (row.product_id, row.rank, row.related_id, row.score)
+            for row in ProductNeighbor.query.order_by(ProductNeighbor.product_id, ProductNeighbor.rank)
+        ]
+    
+    with app.app_context():
+        for number, basket in enumerate(baskets):
+            order = Order(order_number=f'ORD-{number}', customer_id=customer_ids[0], total_amount=Decimal('5.00'))
+            db.session.add(order)
+            db.session.flush()
+            db.session.add_all([
+                OrderItem(order_id=order.id, product_id=product_ids[index], quantity=1, price=Decimal('2.50'))
+                for index in basket
+            ])
+            db.session.commit()
+            # Alternate between ranking straight away and through the queue
+            record_orders(2, order_ids=[order.id], rerank=number % 2 == 0)
+            db.session.commit()
+        refresh_stale_neighbors(2)
+        db.session.commit()
+        incremental = neighbors()
+        
+        rebuild_related_products(2)
+        db.session.commit()
+        assert incremental == neighbors()
+        assert len(incremental) == 2 * len(product_ids)
@@ -0,0 +1,105 @@
+import hashlib
+import hmac
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+import marketplace_api
+import stripe_client
+
+def _titles(html):
+    return re.findall(r'<div class="product-title">(.*?)</div>', html)
+
+def _page(client, url):
+    # The listing is streamed, so read it before the next request
+    return client.get(url).get_data(as_text=True)
+
+def test_html_listing_pages_through_the_catalog(legacy_client):
+    names = [product['name'] for product in marketplace_api.PRODUCTS.all()]
+    pages = [_page(legacy_client, f'/products?page={page}&per_page=10') for page in (1, 2, 3)]
+    assert [_titles(html) for html in pages] == [names[:10], names[10:20], names[20:30]]
+    assert f'Page 3 of {(len(names) + 9) // 10}' in pages[-1]
+    assert 'Next' not in pages[-1]
+    # Out-of-range values are clamped
+    assert _titles(_page(legacy_client, '/products?page=0&per_page=0')) == names[:1]
+    assert _titles(_page(legacy_client, '/products?per_page=100000')) == names[:marketplace_api.HTML_MAX_PAGE_SIZE]
+
+def test_html_fragments_are_rendered_once_per_product_version(legacy_client, monkeypatch):
+    rendered = []
+    render_template = marketplace_api.render_template
+    
+    def counting_render_template(name, **context):
+        if name == 'product_fragment.html':
+            rendered.append(context['product']['id'])
+        return render_template(name, **context)
+    
+    monkeypatch.setattr(marketplace_api, 'render_template', counting_render_template)
+    first = _page(legacy_client, '/products?per_page=5')
+    assert len(rendered) == 5
+    assert _page(legacy_client, '/products?per_page=5') == first
+    assert len(rendered) == 5
+    
+    # A changed product gets a fresh fragment
+    product = marketplace_api.PRODUCTS.all()[0]
+    product['price'] = 1.5
+    assert '$1.50' in _page(legacy_client, '/products?per_page=5')
+    assert rendered[5:] == [product['id']]
+
+def test_html_fragment_cache_is_bounded(legacy_client, monkeypatch):
+    monkeypatch.setattr(marketplace_api, 'FRAGMENT_CACHE_SIZE', 3)
+    _page(legacy_client, '/products?per_page=10')
+    assert [product_id for product_id, _ in marketplace_api._fragment_cache] == [
+        product['id'] for product in marketplace_api.PRODUCTS.all()[7:10]
+    ]
+
+def _signed(event_id, event_type, payment, secret='whsec_test'):
+    body = json.dumps({'id': event_id, 'type': event_type, 'data': {'object': payment}}).encode()
+    timestamp = str(int(time.time()))
+    signature = hmac.new(secret.encode(), timestamp.encode() + b'.' + body, hashlib.sha256).hexdigest()
+    return {'data': body, 'headers': {'Stripe-Signature': f't={timestamp},v1={signature}'}}
+
+def test_stripe_webhooks_settle_legacy_orders(legacy_client, monkeypatch):
+    monkeypatch.setattr(marketplace_api, 'STRIPE_WEBHOOK_SECRET', 'whsec_test')
+    sessions = []
+    
+    def create_checkout_session(api_key, line_items, success_url, cancel_url, order_number=None):
+        sessions.append({'line_items': line_items, 'order_number': order_number})
+        return SimpleNamespace(id='cs_test_1', url='https://checkout.stripe.com/c/pay/cs_test_1')
+    
+    monkeypatch.setattr(stripe_client, 'create_checkout_session', create_checkout_session)
+    products = marketplace_api.PRODUCTS.all()
+    response = legacy_client.post('/api/create-checkout-session', json={
+        'items': [{'product_id': products[0]['id'], 'quantity': 2}, {'product_id': products[1]['id']}],
+        'success_url': 'https://example.com/ok',
+        'cancel_url': 'https://example.com/cancel'
+    })
+    order_number = response.get_json()['order_number']
+    assert sessions[0]['order_number'] == order_number
+    assert [line['quantity'] for line in sessions[0]['line_items']] == [2, 1]
+    
+    def status():
+        return legacy_client.get('/api/orders').get_json()[0]['status']
+    
+    paid = _signed('evt_1', 'checkout.session.completed', {'payment_status': 'paid', 'client_reference_id': order_number})
+    assert legacy_client.post('/api/stripe-webhook', **paid).status_code == 200
+    assert status() == 'paid'
+    # Refunds are charge events, matched through the payment intent's metadata
+    refunded = _signed('evt_2', 'charge.refunded', {'object': 'charge', 'metadata': {'order_number': order_number}})
+    assert legacy_client.post('/api/stripe-webhook', **refunded).status_code == 200
+    assert status() == 'refunded'
+    assert legacy_client.post('/api/stripe-webhook', **paid).status_code == 200
+    assert status() == 'refunded'
+    
+    forged = _signed('evt_3', 'charge.refunded', {'metadata': {'order_number': order_number}}, secret='whsec_other')
+    assert legacy_client.post('/api/stripe-webhook', **forged).status_code == 400
+
+def test_legacy_api_does_not_import_the_app_package():
+    code = 'import sys, marketplace_api; print(any(name == "app" or name.startswith("app.") for name in sys.modules))'
+    result = subprocess.run(
+        [sys.executable, '-c', code], capture_output=True, text=True, check=True,
+        cwd=os.path.dirname(marketplace_api.__file__)
+    )
+    assert result.stdout.strip() == 'False'
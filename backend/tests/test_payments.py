@@ -0,0 +1,110 @@
+import hashlib
+import hmac
+import json
+import time
+from decimal import Decimal
+from types import SimpleNamespace
+import stripe_client
+from app import db
+from app.models.marketplace import Order
+from app.services.payment_events import process_payment_events
+from tests.helpers import auth_headers, make_users
+
+WEBHOOK_SECRET = 'whsec_test'
+
+def _seed_order(app):
+    with app.app_context():
+        customer, = make_users(1, prefix='customer')
+        order = Order(order_number='ORD-20260101-abcd1234', customer_id=customer.id, total_amount=Decimal('12.34'))
+        db.session.add(order)
+        db.session.commit()
+        return customer.id, order.id
+
+def _stripe_event(event_id, event_type, payment):
+    body = json.dumps({'id': event_id, 'type': event_type, 'data': {'object': payment}}).encode()
+    timestamp = str(int(time.time()))
+    signature = hmac.new(WEBHOOK_SECRET.encode(), timestamp.encode() + b'.' + body, hashlib.sha256).hexdigest()
+    return body, {'Stripe-Signature': f't={timestamp},v1={signature}'}
+
+def test_stripe_checkout_carries_the_order_number_to_the_webhook(make_app, monkeypatch):
+    app = make_app(STRIPE_SECRET_KEY='sk_test', STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+    customer_id, order_id = _seed_order(app)
+    client = app.test_client()
+    
+    sessions = []
+    def create_checkout_session(api_key, line_items, success_url, cancel_url, order_number=None):
+        sessions.append({'line_items': line_items, 'order_number': order_number})
+        return SimpleNamespace(id='cs_test_1', url='https://checkout.stripe.com/c/pay/cs_test_1')
+    monkeypatch.setattr(stripe_client, 'create_checkout_session', create_checkout_session)
+    
+    response = client.post(
+        f'/api/marketplace/orders/{order_id}/payment',
+        json={'provider': 'stripe', 'success_url': 'https://example.com/ok', 'cancel_url': 'https://example.com/cancel'},
+        headers=auth_headers(app, customer_id)
+    )
+    assert response.status_code == 201
+    assert sessions[0]['order_number'] == 'ORD-20260101-abcd1234'
+    assert sessions[0]['line_items'][0]['price_data']['unit_amount'] == 1234
+    
+    body, headers = _stripe_event('evt_1', 'checkout.session.completed', {
+        'payment_status': 'paid',
+        'client_reference_id': sessions[0]['order_number']
+    })
+    assert client.post('/api/webhooks/stripe', data=body, headers=headers).status_code == 200
+    assert client.post('/api/webhooks/stripe', data=body, headers=headers).get_json()['duplicate'] is True
+    with app.app_context():
+        assert process_payment_events() == (1, 1)
+        db.session.commit()
+        assert db.session.get(Order, order_id).payment_status == 'paid'
+    
+    response = client.post(f'/api/marketplace/orders/{order_id}/payment', json={'provider': 'stripe'}, headers=auth_headers(app, customer_id))
+    assert response.status_code == 409
+
+def test_flutterwave_payments_use_the_order_number_as_tx_ref(app, client):
+    customer_id, order_id = _seed_order(app)
+    response = client.post(f'/api/marketplace/orders/{order_id}/payment', json={'provider': 'flutterwave'}, headers=auth_headers(app, customer_id))
+    assert response.status_code == 200
+    assert response.get_json()['tx_ref'] == 'ORD-20260101-abcd1234'
+    
+    with app.app_context():
+        outsider, = make_users(1, prefix='outsider')
+        db.session.commit()
+        outsider_id = outsider.id
+    response = client.post(f'/api/marketplace/orders/{order_id}/payment', json={'provider': 'flutterwave'}, headers=auth_headers(app, outsider_id))
+    assert response.status_code == 404
+
+def test_stripe_refunds_find_the_order_through_the_payment_intent(make_app, monkeypatch):
+    app = make_app(STRIPE_SECRET_KEY='sk_test', STRIPE_WEBHOOK_SECRET=WEBHOOK_SECRET)
+    customer_id, order_id = _seed_order(app)
+    client = app.test_client()
+    
+    sessions = []
+    def create(params):
+        sessions.append(params)
+        return SimpleNamespace(id='cs_test_1', url='https://checkout.stripe.com/c/pay/cs_test_1')
+    stub_client = SimpleNamespace(v1=SimpleNamespace(checkout=SimpleNamespace(sessions=SimpleNamespace(create=create))))
+    monkeypatch.setattr(stripe_client, 'get_stripe_client', lambda api_key: stub_client)
+    
+    response = client.post(
+        f'/api/marketplace/orders/{order_id}/payment',
+        json={'provider': 'stripe', 'success_url': 'https://example.com/ok', 'cancel_url': 'https://example.com/cancel'},
+        headers=auth_headers(app, customer_id)
+    )
+    assert response.status_code == 201
+    # Stripe copies the intent's metadata onto its charges
+    intent_metadata = sessions[0]['payment_intent_data']['metadata']
+    assert intent_metadata == {'order_number': 'ORD-20260101-abcd1234'}
+    
+    for event_id, event_type, payment in [
+        ('evt_1', 'payment_intent.succeeded', {'object': 'payment_intent', 'metadata': intent_metadata}),
+        ('evt_2', 'charge.refunded', {'object': 'charge', 'refunded': True, 'metadata': intent_metadata}),
+        # A late success does not undo the refund
+        ('evt_3', 'checkout.session.completed', {'payment_status': 'paid', 'client_reference_id': 'ORD-20260101-abcd1234'})
+    ]:
+        body, headers = _stripe_event(event_id, event_type, payment)
+        assert client.post('/api/webhooks/stripe', data=body, headers=headers).status_code == 200
+    
+    with app.app_context():
+        assert process_payment_events() == (3, 1)
+        db.session.commit()
+        assert db.session.get(Order, order_id).payment_status == 'refunded'
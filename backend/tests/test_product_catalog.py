@@ -0,0 +1,67 @@
+import random
+import threading
+from product_catalog import ProductCatalog
+
+WORDS = ['phone', 'iphone', 'case', 'leather', 'wallet', 'lamp', 'desk', 'coffee', 'beans', 'organic', 'audio', 'studio']
+
+def _product(index, rng):
+    return {
+        'id': f'p{index}',
+        'name': ' '.join(rng.sample(WORDS, 2)).title(),
+        'description': ' '.join(rng.sample(WORDS, 3)),
+        'category': rng.choice(['Electronics', 'Home', 'Groceries']),
+        'type': rng.choice(['physical', 'digital', 'service'])
+    }
+
+def _scan(products, query):
+    """The list comprehension the catalog replaced"""
+    query = query.lower()
+    return [
+        product for product in products
+        if query in product['name'].lower() or query in product['description'].lower() or query in product['category'].lower()
+    ]
+
+QUERIES = ['phone', 'PHONE', 'hon', 'e', 'ud', 'leather wallet', 'wallet leather', 'cof', 'home', 'studio lamp', 'zzz', '-', 'ne ca']
+
+def test_search_matches_a_substring_scan():
+    rng = random.Random(1)
+    products = [_product(index, rng) for index in range(500)]
+    catalog = ProductCatalog(products)
+    for query in QUERIES:
+        assert catalog.search(query) == _scan(products, query), query
+
+def test_indexes_stay_consistent_while_products_are_added():
+    rng = random.Random(2)
+    catalog = ProductCatalog()
+    batches = [[_product(writer * 1000 + index, rng) for index in range(300)] for writer in range(4)]
+    
+    def write(batch):
+        for product in batch:
+            catalog.add(product)
+    
+    def read():
+        # Every result is a real match, whatever has been added so far
+        for query in QUERIES * 5:
+            for product in catalog.search(query):
+                assert product in _scan([product], query)
+    
+    threads = [threading.Thread(target=write, args=(batch,)) for batch in batches] + [threading.Thread(target=read) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    
+    products = catalog.all()
+    assert len(products) == 1200
+    for query in QUERIES:
+        assert catalog.search(query) == _scan(products, query), query
+    for product in products:
+        assert catalog.get(product['id']) is product
+    assert sorted(map(id, catalog.by_category('home'))) == sorted(id(product) for product in products if product['category'] == 'Home')
+    assert sum(len(catalog.by_type(product_type)) for product_type in ('physical', 'digital', 'service')) == 1200
+
+def test_products_with_non_text_fields_can_be_added(legacy_client):
+    response = legacy_client.post('/api/products', json={'name': 'Gift box', 'category': 5, 'price': 10, 'description': None})
+    assert response.status_code == 201
+    assert legacy_client.get('/api/products/by-category?category=5').get_json() == [response.get_json()]
+    assert legacy_client.get('/api/products/search?query=gift box').get_json() == [response.get_json()]
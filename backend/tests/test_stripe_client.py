@@ -0,0 +1,81 @@
+import time
+import pytest
+import stripe
+import stripe_client
+import stripe_stub
+
+LINE_ITEMS = [
+    {'price_data': {'currency': 'usd', 'product_data': {'name': 'Lamp'}, 'unit_amount': 1250}, 'quantity': 2},
+    {'price_data': {'currency': 'usd', 'product_data': {'name': 'Rug'}, 'unit_amount': 999}, 'quantity': 1}
+]
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Start a Stripe stub and point fresh clients at it; pass options to serve()"""
+    servers = []
+    
+    def start(**options):
+        server = stripe_stub.serve(port=0, **options)
+        servers.append(server)
+        # One entry per accepted TCP connection
+        server.connections = []
+        process_request = server.process_request
+        
+        def counting_process_request(request, client_address):
+            server.connections.append(client_address)
+            process_request(request, client_address)
+        
+        server.process_request = counting_process_request
+        monkeypatch.setattr(stripe_client, 'STRIPE_API_BASE', f'http://127.0.0.1:{server.server_port}')
+        monkeypatch.setattr(stripe_client, 'STRIPE_RETRY_BASE_DELAY', 0.01)
+        monkeypatch.setattr(stripe_client, '_clients', {})
+        return server
+    
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+def test_checkout_session_covers_every_cart_line(stub):
+    stub()
+    session = stripe_client.create_checkout_session(
+        'sk_test_stub', LINE_ITEMS, 'https://example.com/ok', 'https://example.com/cancel', order_number='ORD-1'
+    )
+    assert session.amount_total == 2 * 1250 + 999
+    assert session.client_reference_id == 'ORD-1'
+    assert session.metadata['order_number'] == 'ORD-1'
+
+def test_checkout_session_tags_its_payment_intent(stub, monkeypatch):
+    stub()
+    received = []
+    
+    def checkout_session(params):
+        received.append(params)
+        return stripe_stub.checkout_session(params)
+    
+    monkeypatch.setitem(stripe_stub.ROUTES, '/v1/checkout/sessions', checkout_session)
+    stripe_client.create_checkout_session('sk_test_stub', LINE_ITEMS, 'https://example.com/ok', 'https://example.com/cancel', order_number='ORD-1')
+    assert received[0]['payment_intent_data[metadata][order_number]'] == 'ORD-1'
+
+def test_requests_reuse_one_pooled_connection(stub):
+    server = stub()
+    for _ in range(5):
+        stripe_client.create_payment_intent('sk_test_stub', 1000, 'usd', order_number='ORD-1')
+    assert server.RequestHandlerClass.requests_served == 5
+    assert len(server.connections) == 1
+
+def test_failed_requests_are_retried_a_bounded_number_of_times(stub, monkeypatch):
+    monkeypatch.setattr(stripe_client, 'STRIPE_MAX_RETRIES', 2)
+    server = stub(error_rate=1.0)
+    with pytest.raises(stripe.APIError):
+        stripe_client.create_payment_intent('sk_test_stub', 1000, 'usd')
+    assert server.RequestHandlerClass.requests_served == 3
+
+def test_slow_responses_time_out(stub, monkeypatch):
+    monkeypatch.setattr(stripe_client, 'STRIPE_READ_TIMEOUT', 0.1)
+    monkeypatch.setattr(stripe_client, 'STRIPE_MAX_RETRIES', 0)
+    stub(latency=1.0)
+    start = time.perf_counter()
+    with pytest.raises(stripe.APIConnectionError):
+        stripe_client.create_payment_intent('sk_test_stub', 1000, 'usd')
+    assert time.perf_counter() - start < 0.9